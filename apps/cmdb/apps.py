@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CmdbConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.cmdb"
+
+    def ready(self):
+        from apps.cmdb.utils.model_cache import ModelMetaCache
+
+        ModelMetaCache.check_backend()
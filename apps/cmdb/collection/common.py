@@ -5,6 +5,8 @@ from dotenv import load_dotenv
 
 from apps.cmdb.constants import INSTANCE, INSTANCE_ASSOCIATION
 from apps.cmdb.graph.neo4j import Neo4jClient
+from apps.cmdb.graph.unique import UniqueAttrIndex
+from apps.cmdb.services.instance_count import InstanceCountManage
 from apps.cmdb.services.model import ModelManage
 
 load_dotenv()
@@ -38,17 +40,7 @@ class Management:
         self.check_attr_map = self.get_check_attr_map()
 
     def get_check_attr_map(self):
-        attrs = ModelManage.search_model_attr(self.model_id)
-        check_attr_map = dict(is_only={}, is_required={}, editable={})
-        for attr in attrs:
-            if attr["is_only"]:
-                check_attr_map["is_only"][attr["attr_id"]] = attr["attr_name"]
-            if attr["is_required"]:
-                check_attr_map["is_required"][attr["attr_id"]] = attr["attr_name"]
-            if attr["editable"]:
-                check_attr_map["editable"][attr["attr_id"]] = attr["attr_name"]
-
-        return check_attr_map
+        return ModelManage.get_check_attr_map(self.model_id)
 
     def format_data(self):
         """数据格式化"""
@@ -82,7 +74,15 @@ class Management:
 
         result = {"success": [], "failed": []}
         with Neo4jClient() as ag:
-            exist_items, _ = ag.query_entity(INSTANCE, [{"field": "model_id", "type": "str=", "value": self.model_id}])
+            exist_items = UniqueAttrIndex(
+                self.check_attr_map["is_only"],
+                ag.query_unique_collisions(
+                    INSTANCE,
+                    [{"field": "model_id", "type": "str=", "value": self.model_id}],
+                    self.check_attr_map["is_only"],
+                    inst_list,
+                ),
+            )
             for instance_info in inst_list:
                 try:
                     instance_info.update(
@@ -96,10 +96,11 @@ class Management:
                     entity = ag.create_entity(INSTANCE, instance_info, self.check_attr_map, exist_items)
                     # 创建关联
                     assos_result = self.setting_assos(entity, assos)
-                    exist_items.append(entity)
+                    exist_items.add(entity)
                     result["success"].append(dict(inst_info=entity, assos_result=assos_result))
                 except Exception as e:
                     result["failed"].append({"instance_info": instance_info, "error": getattr(e, "message", e)})
+        InstanceCountManage.change(added=[i["inst_info"] for i in result["success"]])
         return result
 
     def update_inst(self, inst_list):
@@ -109,7 +110,14 @@ class Management:
 
         result = {"success": [], "failed": []}
         with Neo4jClient() as ag:
-            exist_items, _ = ag.query_entity(INSTANCE, [{"field": "model_id", "type": "str=", "value": self.model_id}])
+            exist_list = ag.query_unique_collisions(
+                INSTANCE,
+                [{"field": "model_id", "type": "str=", "value": self.model_id}],
+                self.check_attr_map["is_only"],
+                inst_list,
+            )
+            exist_map = {i["_id"]: i for i in exist_list}
+            exist_items = UniqueAttrIndex(self.check_attr_map["is_only"], exist_list)
             for instance_info in inst_list:
                 try:
                     instance_info.update(
@@ -120,16 +128,21 @@ class Management:
                         collect_time=self.collect_time,
                     )
                     assos = instance_info.pop("assos", [])
-                    exist_items = [i for i in exist_items if i["_id"] != instance_info["_id"]]
                     entity = ag.set_entity_properties(
                         INSTANCE, [instance_info["_id"]], instance_info, self.check_attr_map, exist_items
                     )
                     # 更新关联
                     assos_result = self.setting_assos(dict(model_id=self.model_id, _id=entity[0]["_id"]), assos)
-                    exist_items.append(entity[0])
+                    # 用更新后的值替换索引中的旧值
+                    if entity[0]["_id"] in exist_map:
+                        exist_items.remove(exist_map[entity[0]["_id"]])
+                    exist_map[entity[0]["_id"]] = entity[0]
+                    exist_items.add(entity[0])
                     result["success"].append(dict(inst_info=entity[0], assos_result=assos_result))
                 except Exception as e:
                     result["failed"].append({"instance_info": instance_info, "error": getattr(e, "message", e)})
+        # old_data为更新前的实例，所属组织变化时迁移实例计数
+        InstanceCountManage.update_organization(self.old_data, [i["inst_info"] for i in result["success"]])
         return result
 
     def delete_inst(self, inst_list):
@@ -145,6 +158,7 @@ class Management:
                     result["success"].append(instance_info)
                 except Exception as e:
                     result["failed"].append({"instance_info": instance_info, "error": getattr(e, "message", e)})
+        InstanceCountManage.change(removed=result["success"])
         return result
 
     def setting_assos(self, src_info, dst_list):
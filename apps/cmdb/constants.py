@@ -13,6 +13,21 @@ MODEL_ASSOCIATION = "model_association"
 # 实例关联标签
 INSTANCE_ASSOCIATION = "instance_association"
 
+# 组织节点标签，实例通过 instance_organization 关系指向所属组织，用于按组织索引过滤实例权限
+ORGANIZATION_NODE = "organization_node"
+
+# 实例所属组织关系标签
+INSTANCE_ORGANIZATION = "instance_organization"
+
+# 数据回填完成标记节点标签，节点的name为回填任务名称
+BACKFILL_MARKER = "backfill_marker"
+# 实例与组织节点关系的回填任务名称，完成前组织权限按实例的organization属性过滤
+ORGANIZATION_MEMBERSHIP_BACKFILL = "instance_organization"
+# 回填完成状态的缓存key前缀
+BACKFILL_MARKER_CACHE_KEY = "cmdb_backfill_marker"
+# 回填未完成时状态的缓存时间(秒)，完成后永久缓存
+BACKFILL_PENDING_CACHE_TTL = 60
+
 # 模型间的关联类型
 ASSOCIATION_TYPE = [
     {"asst_id": "belong", "asst_name": "属于", "is_pre": True},
@@ -101,3 +116,82 @@ SUBORDINATE_MODEL = "subordinate_model"
 
 # 加密的属性列表
 ENCRYPTED_KEY = {"password", "secret_key", "encryption_key"}
+
+# 图数据库批量写入时每批(UNWIND)的数据量
+BATCH_WRITE_CHUNK_SIZE = 1000
+
+# 图数据库分批读取(如导出)时每批的数据量
+BATCH_READ_CHUNK_SIZE = 1000
+
+# 导出文件流式下载时每块的字节数
+EXPORT_STREAM_BLOCK_SIZE = 64 * 1024
+
+# 由模型属性元数据自动维护的图数据库索引/约束名称前缀
+GRAPH_SCHEMA_PREFIX = "cmdb"
+# 图数据库索引与约束全量同步周期任务，补偿模型属性变更后异步同步任务的丢失或失败
+GRAPH_SCHEMA_SYNC_TASK = "cmdb_sync_graph_schema"
+# 图数据库索引与约束全量同步间隔(秒)
+GRAPH_SCHEMA_SYNC_INTERVAL = 60 * 60
+
+# 节点的热点查询字段，建立单属性索引
+NODE_INDEX_FIELDS = {
+    INSTANCE: ["model_id", "inst_name", "collect_task", "organization"],
+    MODEL: ["model_id"],
+    CLASSIFICATION: ["classification_id"],
+    CREDENTIAL: ["credential_type", "_creator"],
+}
+
+# 关系的热点查询字段，建立关系属性索引
+EDGE_INDEX_FIELDS = {
+    INSTANCE_ASSOCIATION: ["src_inst_id", "dst_inst_id", "model_asst_id"],
+    MODEL_ASSOCIATION: ["model_asst_id"],
+    CREDENTIAL_ASSOCIATION: ["credential_id", "instance_id"],
+}
+
+# 拓扑查询的默认最大层级
+TOPO_MAX_DEPTH = 10
+# 拓扑中每个节点最多展示的子节点数量
+TOPO_MAX_CHILDREN = 200
+# 增量拓扑查询默认返回的层级
+TOPO_LAZY_DEPTH = 2
+# 增量拓扑查询每个节点每种关联每页返回的子节点数量
+TOPO_PAGE_SIZE = 50
+# 增量拓扑查询每页子节点数量的上限
+TOPO_MAX_PAGE_SIZE = 500
+
+# 实例全文索引名称
+FULLTEXT_INDEX_NAME = f"{GRAPH_SCHEMA_PREFIX}_fulltext_{INSTANCE}"
+# 纳入全文索引的属性类型(全文索引只支持字符串属性)
+FULLTEXT_ATTR_TYPES = {"str"}
+# 全文检索默认每页数量
+FULLTEXT_PAGE_SIZE = 20
+
+# 实例计数校准周期任务
+INSTANCE_COUNT_RECONCILE_TASK = "cmdb_reconcile_instance_count"
+# 实例计数校准间隔(秒)
+INSTANCE_COUNT_RECONCILE_INTERVAL = 60 * 60
+
+# 变更记录磁盘补写周期任务
+CHANGE_RECORD_REPLAY_TASK = "cmdb_replay_change_record"
+# 变更记录磁盘补写间隔(秒)
+CHANGE_RECORD_REPLAY_INTERVAL = 60
+# 实例修改记录每隔多少条保存一次完整快照，其余只保存变化的属性
+CHANGE_RECORD_SNAPSHOT_INTERVAL = 20
+# 实例距上次完整快照的修改次数的缓存key前缀
+CHANGE_RECORD_SEQ_CACHE_KEY = "cmdb_change_record_seq"
+# 修改次数缓存时间(秒)，缓存丢失时下一条修改记录保存完整快照
+CHANGE_RECORD_SEQ_CACHE_TTL = 60 * 60 * 24 * 7
+# 按模型回放变更记录时每次读取的记录数
+CHANGE_RECORD_REPLAY_CHUNK_SIZE = 2000
+
+# 变更记录分区维护周期任务(创建后续月份分区、归档并删除过期分区)
+CHANGE_RECORD_PARTITION_TASK = "cmdb_maintain_change_record_partition"
+# 变更记录分区维护间隔(秒)
+CHANGE_RECORD_PARTITION_INTERVAL = 60 * 60 * 24
+# 预先创建的后续月份分区数
+CHANGE_RECORD_PARTITION_PREMAKE_MONTHS = 3
+
+# 模型元数据缓存时间(秒)，元数据变更时通过版本号立即失效
+MODEL_CACHE_TTL = 60 * 60 * 24
+# 缓存后端不在多个worker间共享(未配置redis)时的模型元数据缓存时间(秒)，即其他worker的变更最长延迟生效时间
+MODEL_CACHE_LOCAL_TTL = 60
@@ -0,0 +1,75 @@
+import os
+import threading
+
+from dotenv import load_dotenv
+from neo4j import GraphDatabase
+
+load_dotenv()
+
+# 连接池配置
+NEO4J_MAX_CONNECTION_POOL_SIZE = int(os.getenv("NEO4J_MAX_CONNECTION_POOL_SIZE", 50))
+# 连接最大存活时间(秒)，需小于服务端/负载均衡的空闲断开时间
+NEO4J_MAX_CONNECTION_LIFETIME = int(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", 3600))
+# 连接空闲超过该时间(秒)后，借出前先做存活检测
+NEO4J_LIVENESS_CHECK_TIMEOUT = int(os.getenv("NEO4J_LIVENESS_CHECK_TIMEOUT", 60))
+# 从连接池获取连接的超时时间(秒)
+NEO4J_CONNECTION_ACQUISITION_TIMEOUT = int(os.getenv("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", 60))
+
+
+class DriverRegistry:
+    """
+    进程级Neo4j驱动注册表
+    每个工作进程按 (uri, user) 共享一个带连接池的驱动，fork出的子进程不复用父进程的驱动
+    """
+
+    _lock = threading.Lock()
+    _drivers = {}
+    _pid = os.getpid()
+
+    @classmethod
+    def _reset_after_fork(cls):
+        """fork后子进程丢弃继承的驱动(不关闭，避免影响父进程的socket)"""
+        cls._lock = threading.Lock()
+        cls._drivers = {}
+        cls._pid = os.getpid()
+
+    @classmethod
+    def get_driver(cls, uri: str = None, user: str = None, password: str = None):
+        """获取驱动，不存在则创建"""
+        uri = uri or os.getenv("NEO4J_URI")
+        user = user or os.getenv("NEO4J_USER")
+        password = password or os.getenv("NEO4J_PASSWORD")
+
+        if cls._pid != os.getpid():
+            cls._reset_after_fork()
+
+        key = (uri, user)
+        driver = cls._drivers.get(key)
+        if driver is not None:
+            return driver
+
+        with cls._lock:
+            driver = cls._drivers.get(key)
+            if driver is None:
+                driver = GraphDatabase.driver(
+                    uri,
+                    auth=(user, password),
+                    max_connection_pool_size=NEO4J_MAX_CONNECTION_POOL_SIZE,
+                    max_connection_lifetime=NEO4J_MAX_CONNECTION_LIFETIME,
+                    liveness_check_timeout=NEO4J_LIVENESS_CHECK_TIMEOUT,
+                    connection_acquisition_timeout=NEO4J_CONNECTION_ACQUISITION_TIMEOUT,
+                )
+                cls._drivers[key] = driver
+        return driver
+
+    @classmethod
+    def close_all(cls):
+        """关闭当前进程的所有驱动"""
+        with cls._lock:
+            drivers, cls._drivers = list(cls._drivers.values()), {}
+        for driver in drivers:
+            driver.close()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=DriverRegistry._reset_after_fork)
@@ -1,98 +1,82 @@
-def format_bool(param):
-    field = param["field"]
-    value = param["value"]
+"""
+查询条件格式化
+每个格式化函数只拼接字段与参数占位符(如 $p0)，参数值由调用方绑定到参数字典中，
+从而使相同形状的查询生成相同的Cypher语句，复用Neo4j服务端的执行计划缓存
+"""
+
+from functools import lru_cache
+
+from apps.cmdb.constants import INSTANCE_ORGANIZATION, ORGANIZATION_NODE
+
+
+def format_bool(field, value):
     return f"n.{field} = {value}"
 
 
-def format_time(param):
-    field = param["field"]
-    start = param["start"]
-    end = param["end"]
-    return f"n.{field} >= '{start}' AND n.{field} <= '{end}'"
+def format_time(field, start, end):
+    return f"n.{field} >= {start} AND n.{field} <= {end}"
 
 
-def format_str_eq(param):
-    field = param["field"]
-    value = param["value"]
-    return f"n.{field} = '{value}'"
+def format_str_eq(field, value):
+    return f"n.{field} = {value}"
 
 
-def format_str_neq(param):
-    field = param["field"]
-    value = param["value"]
-    return f"n.{field} <> '{value}'"
+def format_str_neq(field, value):
+    return f"n.{field} <> {value}"
 
 
-def format_str_contains(param):
-    field = param["field"]
-    value = param["value"]
-    return f"n.{field} =~ '.*{value}.*'"
+def format_str_contains(field, value):
+    return f"n.{field} =~ ('.*' + {value} + '.*')"
 
 
-def format_str_in(param):
-    field = param["field"]
-    value = param["value"]
+def format_str_in(field, value):
     return f"n.{field} IN {value}"
 
 
-def format_int_eq(param):
-    field = param["field"]
-    value = param["value"]
+def format_int_eq(field, value):
     return f"n.{field} = {value}"
 
 
-def format_int_gt(param):
-    field = param["field"]
-    value = param["value"]
+def format_int_gt(field, value):
     return f"n.{field} > {value}"
 
 
-def format_int_lt(param):
-    field = param["field"]
-    value = param["value"]
+def format_int_lt(field, value):
     return f"n.{field} < {value}"
 
 
-def format_int_neq(param):
-    field = param["field"]
-    value = param["value"]
+def format_int_neq(field, value):
     return f"n.{field} <> {value}"
 
 
-def format_int_in(param):
-    field = param["field"]
-    value = param["value"]
+def format_int_in(field, value):
     return f"n.{field} IN {value}"
 
 
-def format_list_in(param):
-    field = param["field"]
-    value = param["value"]
+def format_list_in(field, value):
     return f"ANY(x IN {value} WHERE x IN n.{field})"
 
 
-def id_in(param):
-    value = param["value"]
+def id_in(field, value):
     return f"id(n) IN {value}"
 
 
-def id_eq(param):
-    value = param["value"]
+def id_eq(field, value):
     return f"id(n) = {value}"
 
 
-def user_in(param):
-    field = param["field"]
-    value = param["value"]
+def user_in(field, value):
     return f"n.{field} IN {value}"
 
 
-def user_eq(param):
-    field = param["field"]
-    value = param["value"]
+def user_eq(field, value):
     return f"n.{field} = {value}"
 
 
+def org_in(field, value):
+    return f"EXISTS {{ MATCH (n)-[:{INSTANCE_ORGANIZATION}]->(org:{ORGANIZATION_NODE}) WHERE org.id IN {value} }}"
+
+
 # 映射参数类型和对应的转换函数
 FORMAT_TYPE = {
     "bool": format_bool,
@@ -111,4 +95,31 @@ FORMAT_TYPE = {
     "id[]": id_in,
     "user[]": user_in,
     "user=": user_eq,
+    "org[]": org_in,
 }
+
+
+def get_param_values(param):
+    """取出查询条件中需要绑定的参数值，顺序与格式化函数的占位符一致"""
+    if param["type"] == "time":
+        return [param["start"], param["end"]]
+    return [param["value"]]
+
+
+@lru_cache(maxsize=1024)
+def compile_params_template(shape: tuple, param_type: str = "AND", start: int = 0):
+    """
+    按条件形状编译查询模板并缓存
+    shape: ((field, type), ...)，start: 占位符起始序号
+    返回带占位符的条件语句，例如 (n.model_id = $p0 AND n.inst_name = $p1)
+    """
+    params_str_list, index = [], start
+    for field, _type in shape:
+        placeholder_count = 2 if _type == "time" else 1
+        placeholders = [f"$p{index + i}" for i in range(placeholder_count)]
+        index += placeholder_count
+        params_str_list.append(FORMAT_TYPE[_type](field, *placeholders))
+
+    if not params_str_list:
+        return ""
+    return f"({f' {param_type} '.join(params_str_list)})"
@@ -1,30 +1,38 @@
-import os
-
-from dotenv import load_dotenv
-from neo4j import GraphDatabase
-from neo4j.graph import Path
-
-from apps.cmdb.constants import INSTANCE
-from apps.cmdb.graph.format_type import FORMAT_TYPE
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from apps.cmdb.constants import (
+    BACKFILL_MARKER,
+    BATCH_READ_CHUNK_SIZE,
+    BATCH_WRITE_CHUNK_SIZE,
+    FULLTEXT_INDEX_NAME,
+    INSTANCE,
+    INSTANCE_ORGANIZATION,
+    ORGANIZATION,
+    ORGANIZATION_NODE,
+    TOPO_LAZY_DEPTH,
+    TOPO_MAX_DEPTH,
+    TOPO_PAGE_SIZE,
+)
+from apps.cmdb.graph.driver import DriverRegistry
+from apps.cmdb.graph.format_type import FORMAT_TYPE, compile_params_template, get_param_values
+from apps.cmdb.graph.topo import TopoBuilder
+from apps.cmdb.graph.unique import UniqueAttrIndex
+from apps.cmdb.utils.cursor import Cursor
 from apps.core.exceptions.base_app_exception import BaseAppException
 
-load_dotenv()
-
 
 class Neo4jClient:
     def __init__(self):
-        self.driver = GraphDatabase.driver(
-            os.getenv("NEO4J_URI"),
-            auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD")),
-        )
+        # 驱动由进程级注册表共享，客户端只负责借出与归还会话
+        self.driver = DriverRegistry.get_driver()
         self.session = None
 
     def close(self):
-        """关闭连接"""
+        """归还会话连接，驱动保持复用"""
         if self.session:
             self.session.close()
-        if self.driver:
-            self.driver.close()
+            self.session = None
 
     def __enter__(self):
         self.session = self.driver.session()
@@ -58,16 +66,8 @@ class Neo4jClient:
         return dict(_id=data[0].id, _label=data[0].type, **data[0]._properties)
 
     def format_properties(self, properties: dict):
-        """将属性格式化为sql中的字符串格式"""
-        properties_str = "{"
-        for key, value in properties.items():
-            if type(value) == str:
-                properties_str += f"{key}:'{value}',"
-            else:
-                properties_str += f"{key}:{value},"
-        properties_str = properties_str[:-1]
-        properties_str += "}"
-        return properties_str
+        """将属性格式化为查询参数，语句中以 $properties 引用"""
+        return dict(properties=properties)
 
     def create_entity(
         self,
@@ -83,25 +83,47 @@ class Neo4jClient:
         result = self._create_entity(label, properties, check_attr_map, exist_items, operator)
         return result
 
-    def check_unique_attr(self, item, check_attr_map, exist_items, is_update=False):
-        """校验唯一属性"""
-        not_only_attr = set()
-
-        check_attrs = [i for i in check_attr_map.keys() if i in item] if is_update else check_attr_map.keys()
-
-        for exist_item in exist_items:
-            for attr in check_attrs:
-                if exist_item[attr] == item[attr]:
-                    not_only_attr.add(attr)
+    def check_unique_attr(self, item, check_attr_map, exist_items, is_update=False, exclude_ids=()):
+        """
+        校验唯一属性
+        exist_items: 已存在的实体列表或UniqueAttrIndex，通常由query_unique_collisions查出，只包含可能冲突的实体
+        """
+        if isinstance(exist_items, UniqueAttrIndex):
+            unique_index = exist_items
+        else:
+            unique_index = UniqueAttrIndex(check_attr_map, exist_items)
+        unique_index.check(item, is_update=is_update, exclude_ids=exclude_ids)
 
-        if not not_only_attr:
-            return
+    def query_unique_collisions(
+        self, label: str, params: list, check_attr_map: dict, items: list, exclude_ids: list = None
+    ):
+        """
+        查询与待写入数据的唯一属性值冲突的实体
+        只向图数据库查询 is_only 属性值命中的实体，而不是加载整个模型的实例
+        """
+        values_map = {}
+        for attr in check_attr_map:
+            values = {UniqueAttrIndex.hashable(item[attr]) for item in items if item.get(attr) is not None}
+            if values:
+                values_map[attr] = [list(i) if isinstance(i, tuple) else i for i in values]
 
-        message = ""
-        for attr in not_only_attr:
-            message += f"{check_attr_map[attr]} exist；"
+        if not values_map:
+            return []
 
-        raise BaseAppException(message)
+        label_str = f":{label}" if label else ""
+        params_str, params_map = self.format_search_params(params)
+        unique_str_list = []
+        for index, (attr, values) in enumerate(values_map.items()):
+            unique_str_list.append(f"n.{attr} IN $unique_{index}")
+            params_map[f"unique_{index}"] = values
+        conditions = [params_str] if params_str else []
+        conditions.append(f"({' OR '.join(unique_str_list)})")
+        if exclude_ids:
+            conditions.append("NOT id(n) IN $exclude_ids")
+            params_map["exclude_ids"] = exclude_ids
+
+        objs = self.session.run(f"MATCH (n{label_str}) WHERE {' AND '.join(conditions)} RETURN n", params_map)
+        return self.entity_to_list(objs)
 
     def check_required_attr(self, item, check_attr_map, is_update=False):
         """校验必填属性"""
@@ -150,10 +172,13 @@ class Neo4jClient:
             properties.update(_creator=operator)
 
         # 创建实体
-        properties_str = self.format_properties(properties)
-        entity = self.session.run(f"CREATE (n:{label} {properties_str}) RETURN n").single()
+        properties_map = self.format_properties(properties)
+        entity = self.session.run(f"CREATE (n:{label} $properties) RETURN n", properties_map).single()
+        entity = self.entity_to_dict(entity)
+        if label == INSTANCE:
+            self.sync_organization_membership([entity])
 
-        return self.entity_to_dict(entity)
+        return entity
 
     def create_edge(
         self,
@@ -164,11 +189,13 @@ class Neo4jClient:
         b_label: str,
         properties: dict,
         check_asst_key: str,
+        return_entity: bool = False,
     ):
         """
         快速创建一条边
+        return_entity: 是否同时返回两端实体，结构与 query_edge_by_id(return_entity=True) 一致
         """
-        result = self._create_edge(label, a_id, a_label, b_id, b_label, properties, check_asst_key)
+        result = self._create_edge(label, a_id, a_label, b_id, b_label, properties, check_asst_key, return_entity)
         return result
 
     def _create_edge(
@@ -180,6 +207,7 @@ class Neo4jClient:
         b_label: str,
         properties: dict,
         check_asst_key: str = "model_asst_id",
+        return_entity: bool = False,
     ):
         # 校验必填项标签非空
         if not label:
@@ -188,19 +216,29 @@ class Neo4jClient:
         # 校验边是否已经存在
         check_asst_val = properties.get(check_asst_key)
         edge_count = self.session.run(
-            f"MATCH (a:{a_label})-[e]-(b:{b_label}) WHERE id(a) = {a_id} AND id(b) = {b_id} AND e.{check_asst_key} = '{check_asst_val}' RETURN COUNT(e) AS count"  # noqa
+            f"MATCH (a:{a_label})-[e]-(b:{b_label}) WHERE id(a) = $a_id AND id(b) = $b_id AND e.{check_asst_key} = $check_asst_val RETURN COUNT(e) AS count",  # noqa
+            a_id=a_id,
+            b_id=b_id,
+            check_asst_val=check_asst_val,
         ).single()["count"]
         if edge_count > 0:
             raise BaseAppException("edge already exists")
 
         # 创建边
-        properties_str = self.format_properties(properties)
         edge = self.session.run(
-            # f"MATCH (a:{a_label}), (b:{b_label}) WHERE id(a) = {a_id} AND id(b) = {b_id} CREATE (a)-[e:{label} {properties_str}]->(b) RETURN e"  # noqa
-            f"MATCH (a:{a_label}) WHERE id(a) = {a_id} WITH a MATCH (b:{b_label}) WHERE id(b) = {b_id} CREATE (a)-[e:{label} {properties_str}]->(b) RETURN e"  # noqa
+            f"MATCH (a:{a_label}) WHERE id(a) = $a_id WITH a MATCH (b:{b_label}) WHERE id(b) = $b_id CREATE (a)-[e:{label} $properties]->(b) RETURN e, a, b",  # noqa
+            a_id=a_id,
+            b_id=b_id,
+            **self.format_properties(properties),
         ).single()
 
-        return self.edge_to_dict(edge)
+        if not return_entity:
+            return self.edge_to_dict((edge["e"],))
+        return {
+            "src": self.entity_to_dict((edge["a"],)),
+            "edge": self.edge_to_dict((edge["e"],)),
+            "dst": self.entity_to_dict((edge["b"],)),
+        }
 
     def batch_create_entity(
         self,
@@ -209,19 +247,60 @@ class Neo4jClient:
         check_attr_map: dict,
         exist_items: list,
         operator: str = None,
+        index_offset: int = 0,
     ):
-        """批量创建实体"""
-        results = []
+        """
+        批量创建实体
+        先在内存中校验整批数据，再将校验通过的数据按批次以 UNWIND 写入，所有批次在同一个事务中提交
+        index_offset: 本批数据在整体数据中的起始序号，用于错误信息中的行号
+        """
+        if not label:
+            raise BaseAppException("label is empty")
+
+        results = [{} for _ in properties_list]
+        rows = []
+        unique_index = UniqueAttrIndex(check_attr_map.get("is_only", {}), exist_items)
         for index, properties in enumerate(properties_list):
-            result = {}
             try:
-                entity = self._create_entity(label, properties, check_attr_map, exist_items, operator)
-                result.update(data=entity, success=True)
-                exist_items.append(entity)
+                # 校验唯一属性
+                self.check_unique_attr(properties, check_attr_map.get("is_only", {}), unique_index)
+                # 校验必填项
+                self.check_required_attr(properties, check_attr_map.get("is_required", {}))
             except Exception as e:
-                message = f"article {index + 1} data, {e}"
-                result.update(message=message, success=False)
-            results.append(result)
+                results[index].update(message=f"article {index_offset + index + 1} data, {e}", success=False)
+                continue
+
+            # 补充创建人
+            if operator:
+                properties.update(_creator=operator)
+            rows.append(dict(index=index, properties=properties))
+            # 本批次内的数据也参与后续的唯一性校验
+            unique_index.add(properties)
+
+        if not rows:
+            return results
+
+        try:
+            with self.session.begin_transaction() as tx:
+                for start in range(0, len(rows), BATCH_WRITE_CHUNK_SIZE):
+                    objs = tx.run(
+                        f"UNWIND $rows AS row CREATE (n:{label}) SET n = row.properties RETURN row.index AS index, n",
+                        rows=rows[start : start + BATCH_WRITE_CHUNK_SIZE],
+                    )
+                    entities = []
+                    for obj in objs:
+                        entity = self.entity_to_dict((obj["n"],))
+                        entities.append(entity)
+                        results[obj["index"]].update(data=entity, success=True)
+                    if label == INSTANCE:
+                        self.sync_organization_membership(entities, tx)
+                tx.commit()
+        except Exception as e:
+            # 事务整体回滚，本次校验通过的数据均视为失败
+            for row in rows:
+                message = f"article {index_offset + row['index'] + 1} data, {e}"
+                results[row["index"]] = dict(message=message, success=False)
+
         return results
 
     def batch_create_edge(
@@ -232,67 +311,151 @@ class Neo4jClient:
         edge_list: list,
         check_asst_key: str,
     ):
-        """批量创建边"""
-        results = []
+        """
+        批量创建边
+        edge_list: [{"src_id": 1, "dst_id": 2, **properties}, ...]
+        同一事务内先以 UNWIND ... OPTIONAL MATCH 一次性检查整批边的端点与重复情况，再只创建缺失的边
+        """
+        if not label:
+            raise BaseAppException("label is empty")
+
+        results = [{} for _ in edge_list]
+        rows, batch_keys = [], set()
         for index, edge_info in enumerate(edge_list):
-            result = {}
             try:
-                a_id = edge_info["src_id"]
-                b_id = edge_info["dst_id"]
-                edge = self._create_edge(label, a_id, a_label, b_id, b_label, edge_info, check_asst_key)
-                result.update(data=edge, success=True)
+                key = (edge_info["src_id"], edge_info["dst_id"], edge_info.get(check_asst_key))
             except Exception as e:
-                message = f"article {index + 1} data, {e}"
-                result.update(message=message, success=False)
-            results.append(result)
+                results[index].update(message=f"article {index + 1} data, {e}", success=False)
+                continue
+            # 批次内重复的边
+            if key in batch_keys:
+                results[index].update(message=f"article {index + 1} data, edge already exists", success=False)
+                continue
+            batch_keys.add(key)
+            rows.append(
+                dict(
+                    index=index,
+                    src_id=edge_info["src_id"],
+                    dst_id=edge_info["dst_id"],
+                    check_asst_val=edge_info.get(check_asst_key),
+                    properties=edge_info,
+                )
+            )
+
+        if not rows:
+            return results
+
+        try:
+            with self.session.begin_transaction() as tx:
+                create_rows = []
+                for start in range(0, len(rows), BATCH_WRITE_CHUNK_SIZE):
+                    chunk = rows[start : start + BATCH_WRITE_CHUNK_SIZE]
+                    check_objs = tx.run(
+                        f"UNWIND $rows AS row "
+                        f"OPTIONAL MATCH (a:{a_label}) WHERE id(a) = row.src_id "
+                        f"OPTIONAL MATCH (b:{b_label}) WHERE id(b) = row.dst_id "
+                        f"OPTIONAL MATCH (a)-[e]-(b) WHERE e.{check_asst_key} = row.check_asst_val "
+                        f"RETURN row.index AS index, a IS NOT NULL AS src_exist, b IS NOT NULL AS dst_exist, "
+                        f"COUNT(e) AS edge_count",
+                        rows=[{k: v for k, v in row.items() if k != "properties"} for row in chunk],
+                    )
+                    check_map = {obj["index"]: obj for obj in check_objs}
+                    for row in chunk:
+                        check_info = check_map[row["index"]]
+                        if not check_info["src_exist"] or not check_info["dst_exist"]:
+                            message = f"article {row['index'] + 1} data, entity not found"
+                        elif check_info["edge_count"] > 0:
+                            message = f"article {row['index'] + 1} data, edge already exists"
+                        else:
+                            create_rows.append(row)
+                            continue
+                        results[row["index"]].update(message=message, success=False)
+
+                for start in range(0, len(create_rows), BATCH_WRITE_CHUNK_SIZE):
+                    edge_objs = tx.run(
+                        f"UNWIND $rows AS row "
+                        f"MATCH (a:{a_label}) WHERE id(a) = row.src_id "
+                        f"MATCH (b:{b_label}) WHERE id(b) = row.dst_id "
+                        f"CREATE (a)-[e:{label}]->(b) SET e = row.properties "
+                        f"RETURN row.index AS index, e",
+                        rows=create_rows[start : start + BATCH_WRITE_CHUNK_SIZE],
+                    )
+                    for obj in edge_objs:
+                        results[obj["index"]].update(data=self.edge_to_dict((obj["e"],)), success=True)
+                tx.commit()
+        except Exception as e:
+            # 事务整体回滚，本次待写入的数据均视为失败
+            for row in rows:
+                results[row["index"]] = dict(message=f"article {row['index'] + 1} data, {e}", success=False)
+
         return results
 
-    def format_search_params(self, params: list, param_type: str = "AND"):
+    def format_search_params(self, params: list, param_type: str = "AND", start: int = 0):
         """
-        查询参数格式化:
-        bool: {"field": "is_host", "type": "bool", "value": True} -> "n.is_host = True"
+        查询参数格式化, 返回带占位符的条件语句与参数字典:
+        bool: {"field": "is_host", "type": "bool", "value": True} -> "n.is_host = $p0"
 
-        time: {"field": "create_time", "type": "time", "start": "", "end": ""} -> "n.time >= '2022-01-01 08:00:00' AND n.time <= '2022-01-02 08:00:00'"     # noqa
+        time: {"field": "create_time", "type": "time", "start": "", "end": ""} -> "n.create_time >= $p0 AND n.create_time <= $p1"     # noqa
 
-        str=: {"field": "name", "type": "str=", "value": "host"} -> "n.name = 'host'"
-        str<>: {"field": "name", "type": "str<>", "value": "host"} -> "n.name <> 'host'"
-        str*: {"field": "name", "type": "str*", "value": "host"} -> "n.name =~ '.*host.*'"
-        str[]: {"field": "name", "type": "str[]", "value": ["host"]} -> "n.name IN ["host"]"
+        str=: {"field": "name", "type": "str=", "value": "host"} -> "n.name = $p0"
+        str<>: {"field": "name", "type": "str<>", "value": "host"} -> "n.name <> $p0"
+        str*: {"field": "name", "type": "str*", "value": "host"} -> "n.name =~ ('.*' + $p0 + '.*')"
+        str[]: {"field": "name", "type": "str[]", "value": ["host"]} -> "n.name IN $p0"
 
-        int=: {"field": "mem", "type": "int=", "value": 200} -> "n.mem = 200"
-        int>: {"field": "mem", "type": "int>", "value": 200} -> "n.mem > 200"
-        int<: {"field": "mem", "type": "int<", "value": 200} -> "n.mem < 200"
-        int<>: {"field": "mem", "type": "int<>", "value": 200} -> "n.mem <> 200"
-        int[]: {"field": "mem", "type": "int[]", "value": [200]} -> "n.mem IN [200]"
+        int=: {"field": "mem", "type": "int=", "value": 200} -> "n.mem = $p0"
+        int>: {"field": "mem", "type": "int>", "value": 200} -> "n.mem > $p0"
+        int<: {"field": "mem", "type": "int<", "value": 200} -> "n.mem < $p0"
+        int<>: {"field": "mem", "type": "int<>", "value": 200} -> "n.mem <> $p0"
+        int[]: {"field": "mem", "type": "int[]", "value": [200]} -> "n.mem IN $p0"
 
-        id=: {"field": "id", "type": "id=", "value": 115} -> "n(id) = 115"
-        id[]: {"field": "id", "type": "id[]", "value": [115,116]} -> "n(id) IN [115,116]"
+        id=: {"field": "id", "type": "id=", "value": 115} -> "id(n) = $p0"
+        id[]: {"field": "id", "type": "id[]", "value": [115,116]} -> "id(n) IN $p0"
 
-        list[]: {"field": "test", "type": "list[]", "value": [1,2]} -> "ANY(x IN value WHERE x IN n.test)"
-        """
-
-        params_str = ""
-        param_type = f" {param_type} "
-        for param in params:
-            method = FORMAT_TYPE.get(param["type"])
-            if not method:
-                continue
+        list[]: {"field": "test", "type": "list[]", "value": [1,2]} -> "ANY(x IN $p0 WHERE x IN n.test)"
 
-            params_str += method(param)
-            params_str += param_type
-
-        return f"({params_str[:-len(param_type)]})" if params_str else params_str
+        相同形状(字段与类型)的条件命中同一个编译模板，参数值单独绑定
+        """
+        params = [param for param in params if param["type"] in FORMAT_TYPE]
+        shape = tuple((param["field"], param["type"]) for param in params)
+        params_str = compile_params_template(shape, param_type, start)
+
+        values = [value for param in params for value in get_param_values(param)]
+        return params_str, {f"p{start + index}": value for index, value in enumerate(values)}
+
+    def format_final_params(self, search_params: list, search_param_type: str = "AND", permission_params=None):
+        """合并查询条件与权限条件，权限条件为查询参数列表，与查询条件以AND连接"""
+        search_params_str, search_params_map = self.format_search_params(search_params, search_param_type)
+        permission_params_str, permission_params_map = self.format_search_params(
+            permission_params or [], start=len(search_params_map)
+        )
 
-    def format_final_params(self, search_params: list, search_param_type: str = "AND", permission_params=""):
-        search_params_str = self.format_search_params(search_params, search_param_type)
+        params_map = {**search_params_map, **permission_params_map}
 
         if not search_params_str:
-            return permission_params
+            return permission_params_str, params_map
 
-        if not permission_params:
-            return search_params_str
+        if not permission_params_str:
+            return search_params_str, params_map
 
-        return f"{search_params_str} AND {permission_params}"
+        return f"{search_params_str} AND {permission_params_str}", params_map
+
+    def format_match(self, label: str, permission_params: list = None):
+        """
+        生成MATCH子句，权限条件中的组织条件(org[])改为从组织节点出发匹配，可以走组织ID的索引
+        返回 (MATCH子句, 剩余的权限条件, 参数字典)，MATCH子句之后可直接拼接 WHERE 条件
+        """
+        label_str = f":{label}" if label else ""
+        permission_params = permission_params or []
+        org_params = [i for i in permission_params if i["type"] == "org[]"]
+        other_params = [i for i in permission_params if i["type"] != "org[]"]
+        if len(org_params) != 1:
+            return f"MATCH (n{label_str})", permission_params, {}
+
+        match_str = (
+            f"MATCH (org:{ORGANIZATION_NODE})<-[:{INSTANCE_ORGANIZATION}]-(n{label_str}) "
+            "WHERE org.id IN $org_ids WITH DISTINCT n"
+        )
+        return match_str, other_params, dict(org_ids=org_params[0]["value"])
 
     def query_entity(
         self,
@@ -301,34 +464,133 @@ class Neo4jClient:
         page: dict = None,
         order: str = None,
         param_type="AND",
-        permission_params: str = "",
+        permission_params: list = None,
     ):
         """
         查询实体
         """
-        label_str = f":{label}" if label else ""
-        params_str = self.format_final_params(params, search_param_type=param_type, permission_params=permission_params)
+        match_str, permission_params, match_map = self.format_match(label, permission_params)
+        params_str, params_map = self.format_final_params(
+            params, search_param_type=param_type, permission_params=permission_params
+        )
         params_str = f"WHERE {params_str}" if params_str else params_str
+        params_map.update(match_map)
 
-        sql_str = f"MATCH (n{label_str}) {params_str} RETURN n"
+        sql_str = f"{match_str} {params_str} RETURN n"
 
         # order by
         sql_str += f" ORDER BY n.{order}" if order else " ORDER BY ID(n)"
 
-        count_str = f"MATCH (n{label_str}) {params_str} RETURN COUNT(n) AS count"
+        count_str = f"{match_str} {params_str} RETURN COUNT(n) AS count"
         count = None
         if page:
-            count = self.session.run(count_str).single()["count"]
-            sql_str += f" SKIP {page['skip']} LIMIT {page['limit']}"
+            count = self.session.run(count_str, params_map).single()["count"]
+            sql_str += " SKIP $skip LIMIT $limit"
+            params_map = dict(params_map, skip=page["skip"], limit=page["limit"])
 
-        objs = self.session.run(sql_str)
+        objs = self.session.run(sql_str, params_map)
         return self.entity_to_list(objs), count
 
+    def query_entity_by_cursor(
+        self,
+        label: str,
+        params: list,
+        limit: int,
+        cursor: str = None,
+        order: str = None,
+        param_type="AND",
+        permission_params: list = None,
+        with_count: bool = False,
+    ):
+        """
+        游标(keyset)分页查询实体
+        以 (排序字段, ID) 作为定位条件，任意页的代价与首页相同
+        order: 排序字段，倒序时为 "field DESC"
+        返回 (实体列表, 下一页游标, 总数)，没有下一页时游标为None，未要求统计时总数为None
+        """
+        match_str, permission_params, match_map = self.format_match(label, permission_params)
+        params_str, params_map = self.format_final_params(
+            params, search_param_type=param_type, permission_params=permission_params
+        )
+        params_map.update(match_map)
+
+        count = None
+        if with_count:
+            count_where = f"WHERE {params_str}" if params_str else ""
+            count = self.session.run(f"{match_str} {count_where} RETURN COUNT(n) AS count", params_map).single()[
+                "count"
+            ]
+
+        order_field, is_desc = None, False
+        if order:
+            order_field, _, direction = order.partition(" ")
+            is_desc = direction.strip().upper() == "DESC"
+        op = "<" if is_desc else ">"
+
+        seek_str = ""
+        if cursor:
+            cursor_value, cursor_id = Cursor.decode(cursor)
+            params_map = dict(params_map, cursor_value=cursor_value, cursor_id=cursor_id)
+            if not order_field:
+                seek_str = "id(n) > $cursor_id"
+            elif cursor_value is None:
+                # 空值在正序时排在最后、倒序时排在最前
+                seek_str = f"n.{order_field} IS NULL AND id(n) {op} $cursor_id"
+                if is_desc:
+                    seek_str = f"({seek_str}) OR n.{order_field} IS NOT NULL"
+            else:
+                seek_str = (
+                    f"n.{order_field} {op} $cursor_value "
+                    f"OR (n.{order_field} = $cursor_value AND id(n) {op} $cursor_id)"
+                )
+                if not is_desc:
+                    seek_str += f" OR n.{order_field} IS NULL"
+
+        conditions = [i for i in (params_str, f"({seek_str})" if seek_str else "") if i]
+        where_str = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        if order_field:
+            direction_str = " DESC" if is_desc else ""
+            order_str = f"ORDER BY n.{order_field}{direction_str}, id(n){direction_str}"
+        else:
+            order_str = "ORDER BY id(n)"
+
+        # 多取一条判断是否存在下一页
+        objs = self.session.run(
+            f"{match_str} {where_str} RETURN n {order_str} LIMIT $limit",
+            dict(params_map, limit=limit + 1),
+        )
+        entities = self.entity_to_list(objs)
+
+        next_cursor = None
+        if len(entities) > limit:
+            entities = entities[:limit]
+            last = entities[-1]
+            next_cursor = Cursor.encode(last.get(order_field) if order_field else None, last["_id"])
+
+        return entities, next_cursor, count
+
+    def iter_entity(self, label: str, params: list, chunk_size: int = BATCH_READ_CHUNK_SIZE, permission_params=None):
+        """按ID游标分批读取实体的生成器，每次只在内存中保留一批数据"""
+        cursor = None
+        while True:
+            entities, cursor, _ = self.query_entity_by_cursor(
+                label, params, chunk_size, cursor=cursor, permission_params=permission_params
+            )
+            yield from entities
+            if cursor is None:
+                break
+
+    def iter_entity_by_ids(self, ids: list, chunk_size: int = BATCH_READ_CHUNK_SIZE):
+        """按ID列表分批读取实体的生成器"""
+        for start in range(0, len(ids), chunk_size):
+            yield from self.query_entity_by_ids(ids[start : start + chunk_size])
+
     def query_entity_by_id(self, id: int):
         """
         查询实体详情
         """
-        obj = self.session.run(f"MATCH (n) WHERE id(n) = {id} RETURN n").single()
+        obj = self.session.run("MATCH (n) WHERE id(n) = $id RETURN n", id=id).single()
         if not obj:
             return {}
         return self.entity_to_dict(obj)
@@ -337,7 +599,7 @@ class Neo4jClient:
         """
         查询实体列表
         """
-        objs = self.session.run(f"MATCH (n) WHERE id(n) IN {ids} RETURN n")
+        objs = self.session.run("MATCH (n) WHERE id(n) IN $ids RETURN n", ids=ids)
         if not objs:
             return []
         return self.entity_to_list(objs)
@@ -353,10 +615,10 @@ class Neo4jClient:
         查询边
         """
         label_str = f":{label}" if label else ""
-        params_str = self.format_search_params(params, param_type)
+        params_str, params_map = self.format_search_params(params, param_type)
         params_str = f"WHERE {params_str}" if params_str else params_str
 
-        objs = self.session.run(f"MATCH p=((a)-[n{label_str}]->(b)) {params_str} RETURN p")
+        objs = self.session.run(f"MATCH p=((a)-[n{label_str}]->(b)) {params_str} RETURN p", params_map)
 
         return self.edge_to_list(objs, return_entity)
 
@@ -364,19 +626,13 @@ class Neo4jClient:
         """
         查询边详情
         """
-        objs = self.session.run(f"MATCH p=((a)-[n]->(b)) WHERE id(n) = {id} RETURN p")
+        objs = self.session.run("MATCH p=((a)-[n]->(b)) WHERE id(n) = $id RETURN p", id=id)
         edges = self.edge_to_list(objs, return_entity)
         return edges[0]
 
     def format_properties_set(self, properties: dict):
-        """格式化properties的set数据"""
-        properties_str = ""
-        for key, value in properties.items():
-            if type(value) == str:
-                properties_str += f"n.{key}='{value}',"
-            else:
-                properties_str += f"n.{key}={value},"
-        return properties_str if properties_str == "" else properties_str[:-1]
+        """格式化properties的set数据，语句中以 n += $properties 合并"""
+        return "n += $properties" if properties else ""
 
     def set_entity_properties(
         self,
@@ -397,6 +653,7 @@ class Neo4jClient:
                 check_attr_map.get("is_only", {}),
                 exist_items,
                 is_update=True,
+                exclude_ids=entity_ids,
             )
 
             # 校验必填项
@@ -409,8 +666,51 @@ class Neo4jClient:
         properties_str = self.format_properties_set(properties)
         if not properties_str:
             raise BaseAppException("properties is empty")
-        entitys = self.session.run(f"MATCH (n{label_str}) WHERE id(n) IN {entity_ids} SET {properties_str} RETURN n")
-        return self.entity_to_list(entitys)
+        entitys = self.session.run(
+            f"MATCH (n{label_str}) WHERE id(n) IN $entity_ids SET {properties_str} RETURN n",
+            entity_ids=entity_ids,
+            properties=properties,
+        )
+        entitys = self.entity_to_list(entitys)
+        if label == INSTANCE and ORGANIZATION in properties:
+            self.sync_organization_membership(entitys)
+        return entitys
+
+    def sync_organization_membership(self, entities: list, tx=None):
+        """
+        按实例的organization属性重建实例到组织节点的关系
+        组织节点的id有唯一约束(即索引)，权限过滤时从组织节点出发匹配实例
+        """
+        rows = []
+        for entity in entities:
+            organization = entity.get(ORGANIZATION)
+            if organization is None:
+                organization = []
+            elif not isinstance(organization, list):
+                organization = [organization]
+            rows.append(dict(id=entity["_id"], organization=organization))
+        if not rows:
+            return
+
+        runner = tx or self.session
+        for start in range(0, len(rows), BATCH_WRITE_CHUNK_SIZE):
+            runner.run(
+                f"UNWIND $rows AS row MATCH (n:{INSTANCE}) WHERE id(n) = row.id "
+                f"OPTIONAL MATCH (n)-[r:{INSTANCE_ORGANIZATION}]->(:{ORGANIZATION_NODE}) DELETE r "
+                "WITH DISTINCT n, row UNWIND row.organization AS org_id "
+                f"MERGE (org:{ORGANIZATION_NODE} {{id: org_id}}) "
+                f"MERGE (n)-[:{INSTANCE_ORGANIZATION}]->(org)",
+                rows=rows[start : start + BATCH_WRITE_CHUNK_SIZE],
+            )
+
+    def set_backfill_marker(self, name: str):
+        """标记回填任务已完成"""
+        self.session.run(f"MERGE (m:{BACKFILL_MARKER} {{name: $name}}) SET m.finished_at = datetime()", name=name)
+
+    def has_backfill_marker(self, name: str):
+        """回填任务是否已完成"""
+        objs = self.session.run(f"MATCH (m:{BACKFILL_MARKER} {{name: $name}}) RETURN COUNT(m) AS count", name=name)
+        return objs.single()["count"] > 0
 
     def format_properties_remove(self, attrs: list):
         """格式化properties的remove数据"""
@@ -420,144 +720,383 @@ class Neo4jClient:
         return properties_str if properties_str == "" else properties_str[:-1]
 
     def remove_entitys_properties(self, label: str, params: list, attrs: list):
-        """移除某些实体的某些属性"""
+        """移除某些实体的某些属性，移除实例的所属组织时同时删除实例到组织节点的关系"""
         label_str = f":{label}" if label else ""
         properties_str = self.format_properties_remove(attrs)
-        params_str = self.format_search_params(params)
+        params_str, params_map = self.format_search_params(params)
         params_str = f"WHERE {params_str}" if params_str else params_str
 
-        self.session.run(f"MATCH (n{label_str}) {params_str} REMOVE {properties_str} RETURN n")
+        if label == INSTANCE and ORGANIZATION in attrs:
+            self.session.run(
+                f"MATCH (n{label_str}) {params_str} REMOVE {properties_str} "
+                f"WITH n OPTIONAL MATCH (n)-[r:{INSTANCE_ORGANIZATION}]->(:{ORGANIZATION_NODE}) DELETE r",
+                params_map,
+            )
+            return
+
+        self.session.run(f"MATCH (n{label_str}) {params_str} REMOVE {properties_str} RETURN n", params_map)
 
     def batch_delete_entity(self, label: str, entity_ids: list):
         """批量删除实体"""
         label_str = f":{label}" if label else ""
-        self.session.run(f"MATCH (n{label_str}) WHERE id(n) IN {entity_ids} DETACH DELETE n")
+        self.session.run(f"MATCH (n{label_str}) WHERE id(n) IN $entity_ids DETACH DELETE n", entity_ids=entity_ids)
 
     def detach_delete_entity(self, label: str, id: int):
         """删除实体，以及实体的关联关系"""
         label_str = f":{label}" if label else ""
-        self.session.run(f"MATCH (n{label_str}) WHERE id(n) = {id} DETACH DELETE n")
+        self.session.run(f"MATCH (n{label_str}) WHERE id(n) = $id DETACH DELETE n", id=id)
 
     def delete_edge(self, edge_id: int):
         """删除边"""
-        self.session.run(f"MATCH ()-[n]->() WHERE id(n) = {edge_id} DELETE n")
+        self.session.run("MATCH ()-[n]->() WHERE id(n) = $edge_id DELETE n", edge_id=edge_id)
 
-    def entity_objs(self, label: str, params: list, permission_params: str = ""):
+    def entity_objs(self, label: str, params: list, permission_params: list = None):
         """实体对象查询"""
 
-        label_str = f":{label}" if label else ""
-        params_str = self.format_final_params(params, permission_params=permission_params)
+        match_str, permission_params, match_map = self.format_match(label, permission_params)
+        params_str, params_map = self.format_final_params(params, permission_params=permission_params)
         params_str = f"WHERE {params_str}" if params_str else params_str
+        params_map.update(match_map)
 
-        sql_str = f"MATCH (n{label_str}) {params_str} RETURN n"
+        sql_str = f"{match_str} {params_str} RETURN n"
 
-        inst_objs = self.session.run(sql_str)
+        inst_objs = self.session.run(sql_str, params_map)
         return inst_objs
 
-    def query_topo(self, label: str, inst_id: int):
-        """查询实例拓扑"""
+    def query_topo(self, label: str, inst_id: int, max_depth: int = TOPO_MAX_DEPTH, max_children: int = None):
+        """
+        查询实例拓扑
+        从起始实例按层扩展(每层一次查询)，每个实体与关系只返回一次，上游与下游并发查询
+        """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            src_future = executor.submit(self.expand_topo, label, inst_id, max_depth, True)
+            dst_future = executor.submit(self.expand_topo, label, inst_id, max_depth, False)
+            src_entities, src_edges, src_more = src_future.result()
+            dst_entities, dst_edges, dst_more = dst_future.result()
+
+        # 没有关联关系时与原有返回保持一致
+        src_result, dst_result = {}, {}
+        if src_edges:
+            src_result = TopoBuilder(src_entities, src_edges, True, max_depth, max_children, src_more).build(inst_id)
+        if dst_edges:
+            dst_result = TopoBuilder(dst_entities, dst_edges, False, max_depth, max_children, dst_more).build(inst_id)
+        return dict(src_result=src_result, dst_result=dst_result)
+
+    def expand_topo(self, label: str, inst_id: int, max_depth: int, entity_is_src: bool = True):
+        """
+        按层扩展拓扑，entity_is_src为True时沿出边(下游)扩展，否则沿入边(上游)扩展
+        每个并发的扩展使用独立的会话(会话不是线程安全的)
+        返回 (实体列表, 关系列表, 超出层级仍有子节点的实体ID集合)
+        """
+        label_str = f":{label}" if label else ""
+        pattern = self.topo_pattern(label, entity_is_src)
+
+        with self.driver.session() as session:
+            start = session.run(f"MATCH (n{label_str}) WHERE id(n) = $id RETURN n", id=inst_id).single()
+            if not start:
+                return [], [], set()
+
+            entity_map = {inst_id: self.entity_to_dict(start)}
+            edge_map = {}
+            frontier = [inst_id]
+            for _ in range(max_depth):
+                objs = session.run(f"MATCH {pattern} WHERE id(n) IN $frontier RETURN r, m", frontier=frontier)
+                next_frontier = []
+                for obj in objs:
+                    edge = obj["r"]
+                    if edge.id not in edge_map:
+                        edge_map[edge.id] = self.edge_to_dict((edge,))
+                    entity = obj["m"]
+                    if entity.id not in entity_map:
+                        entity_map[entity.id] = self.entity_to_dict((entity,))
+                        next_frontier.append(entity.id)
+                frontier = next_frontier
+                if not frontier:
+                    break
+
+            has_more = set()
+            if frontier:
+                objs = session.run(
+                    f"MATCH {pattern} WHERE id(n) IN $frontier RETURN DISTINCT id(n) AS id", frontier=frontier
+                )
+                has_more = {i["id"] for i in objs}
+
+        return list(entity_map.values()), list(edge_map.values()), has_more
+
+    @staticmethod
+    def topo_pattern(label: str, entity_is_src: bool = True):
+        """拓扑扩展的匹配模式，n为已知实体，m为待扩展的子节点"""
+        label_str = f":{label}" if label else ""
+        return f"(n{label_str})-[r]->(m{label_str})" if entity_is_src else f"(n{label_str})<-[r]-(m{label_str})"
 
+    def query_topo_lazy(self, label: str, inst_id: int, depth: int = TOPO_LAZY_DEPTH, page_size: int = TOPO_PAGE_SIZE):
+        """
+        增量拓扑查询
+        只返回前depth层，每个节点的每种关联最多返回page_size个子节点，
+        并附带每种关联的子节点数量与继续展开的游标，上游与下游并发查询
+        """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            src_future = executor.submit(self.expand_topo_lazy, label, inst_id, depth, page_size, True)
+            dst_future = executor.submit(self.expand_topo_lazy, label, inst_id, depth, page_size, False)
+            return dict(src_result=src_future.result(), dst_result=dst_future.result())
+
+    def expand_topo_lazy(self, label: str, inst_id: int, depth: int, page_size: int, entity_is_src: bool = True):
+        """按层扩展拓扑，每层一次查询，每个实体只展开一次"""
         label_str = f":{label}" if label else ""
-        params_str = self.format_search_params([{"field": "id", "type": "id=", "value": inst_id}])
-        if params_str:
-            params_str = f"AND {params_str}"
-        src_objs = self.session.run(
-            f"MATCH p=(n{label_str})-[*]->(m{label_str}) WHERE NOT (m)-->() {params_str} RETURN p"
-        )
-        dst_objs = self.session.run(
-            f"MATCH p=(m{label_str})-[*]->(n{label_str}) WHERE NOT (m)<--() {params_str} RETURN p"
+        with self.driver.session() as session:
+            start = session.run(f"MATCH (n{label_str}) WHERE id(n) = $id RETURN n", id=inst_id).single()
+            if not start:
+                return {}
+
+            root = TopoBuilder.create_node(self.entity_to_dict(start))
+            nodes, frontier, visited = [root], {inst_id: root}, {inst_id}
+            # (实体ID, 关联ID) -> 已返回的最后一条关系ID
+            last_edge_ids = {}
+            for _ in range(depth):
+                if not frontier:
+                    break
+                next_frontier = {}
+                groups = self.topo_children_page(label, list(frontier), entity_is_src, page_size, session=session)
+                for _id, model_asst_id, rows in groups:
+                    parent = frontier[_id]
+                    for edge, entity in rows:
+                        child = self.format_topo_child(edge, entity)
+                        parent["children"].append(child)
+                        nodes.append(child)
+                        last_edge_ids[(_id, model_asst_id)] = edge["_id"]
+                        if entity["_id"] in visited:
+                            continue
+                        visited.add(entity["_id"])
+                        next_frontier[entity["_id"]] = child
+                frontier = next_frontier
+
+            self.set_topo_child_counts(label, nodes, entity_is_src, last_edge_ids, session=session)
+
+        return root
+
+    def topo_children(
+        self,
+        label: str,
+        inst_id: int,
+        model_asst_id: str,
+        entity_is_src: bool = True,
+        page_size: int = TOPO_PAGE_SIZE,
+        cursor: str = None,
+    ):
+        """
+        展开单个节点某种关联的子节点，按关系ID游标分页
+        返回 (子节点列表, 下一页游标)
+        """
+        after_id = -1
+        if cursor:
+            cursor_asst_id, after_id = Cursor.decode(cursor)
+            if cursor_asst_id != model_asst_id:
+                raise BaseAppException("invalid cursor")
+
+        objs = self.session.run(
+            f"MATCH {self.topo_pattern(label, entity_is_src)} "
+            "WHERE id(n) = $id AND id(m) <> id(n) AND r.model_asst_id = $model_asst_id AND id(r) > $after_id "
+            "RETURN r, m ORDER BY id(r) LIMIT $limit",
+            id=inst_id,
+            model_asst_id=model_asst_id,
+            after_id=after_id,
+            limit=page_size + 1,
         )
+        rows = [(self.edge_to_dict((i["r"],)), self.entity_to_dict((i["m"],))) for i in objs]
 
-        return dict(
-            src_result=self.format_topo(inst_id, src_objs, True), dst_result=self.format_topo(inst_id, dst_objs, False)
-        )
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = Cursor.encode(model_asst_id, rows[-1][0]["_id"])
 
-    def format_topo(self, start_id, objs, entity_is_src=True):
-        """格式化拓扑数据"""
+        children = [self.format_topo_child(edge, entity) for edge, entity in rows]
+        self.set_topo_child_counts(label, children, entity_is_src)
+        return children, next_cursor
 
-        if objs.peek() is None:
-            return {}
+    def topo_children_page(
+        self, label: str, ids: list, entity_is_src: bool = True, limit: int = TOPO_PAGE_SIZE, session=None
+    ):
+        """批量查询实体的子节点，每个实体的每种关联取关系ID最小的limit个"""
+        session = session or self.session
+        objs = session.run(
+            f"MATCH {self.topo_pattern(label, entity_is_src)} WHERE id(n) IN $ids AND id(m) <> id(n) "
+            "WITH n, r, m ORDER BY id(r) "
+            "WITH id(n) AS id, r.model_asst_id AS model_asst_id, collect([r, m])[..$limit] AS rows "
+            "RETURN id, model_asst_id, rows",
+            ids=ids,
+            limit=limit,
+        )
+        return [
+            (
+                i["id"],
+                i["model_asst_id"],
+                [(self.edge_to_dict((edge,)), self.entity_to_dict((entity,))) for edge, entity in i["rows"]],
+            )
+            for i in objs
+        ]
 
-        edge_map = {}
-        entity_map = {}
+    def set_topo_child_counts(self, label: str, nodes: list, entity_is_src=True, last_edge_ids=None, session=None):
+        """
+        为节点补充每种关联的子节点数量(child_counts)，
+        以及未完全返回的关联的继续展开游标(next_cursors)
+        """
+        if not nodes:
+            return
+        session = session or self.session
+        last_edge_ids = last_edge_ids or {}
+
+        objs = session.run(
+            f"MATCH {self.topo_pattern(label, entity_is_src)} WHERE id(n) IN $ids AND id(m) <> id(n) "
+            "RETURN id(n) AS id, r.model_asst_id AS model_asst_id, count(r) AS count",
+            ids=list({i["_id"] for i in nodes}),
+        )
+        child_counts = {}
         for obj in objs:
-            for element in obj:
-                if not isinstance(element, Path):
+            child_counts.setdefault(obj["id"], {})[obj["model_asst_id"]] = obj["count"]
+
+        for node in nodes:
+            counts = child_counts.get(node["_id"], {})
+            node["child_counts"] = counts
+            node["next_cursors"] = {}
+            # 重复出现的实体只在首次出现处展开，其余位置从头分页
+            is_expanded = bool(node["children"])
+            for model_asst_id, count in counts.items():
+                loaded = len([i for i in node["children"] if i["model_asst_id"] == model_asst_id])
+                if loaded >= count:
                     continue
-                # 分离出路径中的点和线
-                nodes = element.nodes  # 获取所有节点
-                relationships = element.relationships  # 获取所有关系
-                for node in nodes:
-                    entity_map[node.id] = dict(_id=node.id, _label=list(node.labels)[0], **node._properties)
-                for relationship in relationships:
-                    edge_map[relationship.id] = dict(
-                        _id=relationship.id, _label=relationship.type, **relationship._properties
-                    )
-
-        edges = list(edge_map.values())
-        # 去除自己指向自己的边
-        edges = [edge for edge in edges if edge["src_inst_id"] != edge["dst_inst_id"]]
-        entities = list(entity_map.values())
+                last_edge_id = last_edge_ids.get((node["_id"], model_asst_id), -1) if is_expanded else -1
+                node["next_cursors"][model_asst_id] = Cursor.encode(model_asst_id, last_edge_id)
+
+    @staticmethod
+    def format_topo_child(edge: dict, entity: dict):
+        """拓扑子节点"""
+        child = TopoBuilder.create_node(entity)
+        child["model_asst_id"] = edge["model_asst_id"]
+        child["asst_id"] = edge["asst_id"]
+        return child
+
+    def entity_count(self, label: str, group_by_attr: str, params: list, permission_params: list = None):
+        """实体数量"""
 
-        result = self.create_node(entity_map[start_id], edges, entities, entity_is_src)
-        return result
+        match_str, permission_params, match_map = self.format_match(label, permission_params)
+        params_str, params_map = self.format_final_params(params, permission_params=permission_params)
+        params_str = f"WHERE {params_str}" if params_str else params_str
+        params_map.update(match_map)
 
-    def create_node(self, entity, edges, entities, entity_is_src=True):
-        """entity作为目标"""
-        node = {
-            "_id": entity["_id"],
-            "model_id": entity["model_id"],
-            "inst_name": entity["inst_name"],
-            "children": [],
-        }
+        data = self.session.run(
+            f"{match_str} {params_str} RETURN n.{group_by_attr} AS {group_by_attr}, COUNT(n) AS count",
+            params_map,
+        )
 
-        if entity_is_src:
-            entity_key, child_entity_key = "src", "dst"
-        else:
-            entity_key, child_entity_key = "dst", "src"
-
-        for edge in edges:
-            if edge[f"{entity_key}_inst_id"] == entity["_id"]:
-                child_entity = self.find_entity_by_id(edge[f"{child_entity_key}_inst_id"], entities)
-                if child_entity:
-                    child_node = self.create_node(child_entity, edges, entities, entity_is_src)
-                    child_node["model_asst_id"] = edge["model_asst_id"]
-                    child_node["asst_id"] = edge["asst_id"]
-                    node["children"].append(child_node)
-        return node
-
-    def find_entity_by_id(self, entity_id, entities):
-        """根据ID找实体"""
-        for entity in entities:
-            if entity["_id"] == entity_id:
-                return entity
-        return None
+        return {i[group_by_attr]: i["count"] for i in data}
 
-    def entity_count(self, label: str, group_by_attr: str, params: list, permission_params: str = ""):
-        """实体数量"""
+    def entity_group_count(self, label: str, group_by_attrs: list, params: list = None):
+        """按多个属性分组统计实体数量"""
 
         label_str = f":{label}" if label else ""
-        params_str = self.format_final_params(params, permission_params=permission_params)
+        params_str, params_map = self.format_search_params(params or [])
         params_str = f"WHERE {params_str}" if params_str else params_str
+        return_str = ", ".join(f"n.{i} AS {i}" for i in group_by_attrs)
 
-        data = self.session.run(
-            f"MATCH (n{label_str}) {params_str} RETURN n.{group_by_attr} AS {group_by_attr}, COUNT(n) AS count"
-        )
+        data = self.session.run(f"MATCH (n{label_str}) {params_str} RETURN {return_str}, COUNT(n) AS count", params_map)
+        return [dict(i) for i in data]
 
-        return {i[group_by_attr]: i["count"] for i in data}
+    @staticmethod
+    def format_fulltext_query(search: str):
+        """
+        将检索内容转换为Lucene查询语句
+        转义特殊字符后按空白分词，完整匹配的词权重更高，同时以通配符兼容包含匹配
+        """
+        terms = [re.sub(r'([+\-&|!(){}\[\]^"~*?:\\/])', r"\\\1", i.lower()) for i in search.split()]
+        if not terms:
+            return ""
+        exact = " AND ".join(terms)
+        contains = " AND ".join(f"*{i}*" for i in terms)
+        return f"({exact})^2 OR ({contains})"
+
+    def full_text_search(
+        self,
+        search: str,
+        model_id: str = None,
+        page: dict = None,
+        permission_params: list = None,
+        index_name: str = FULLTEXT_INDEX_NAME,
+    ):
+        """
+        基于全文索引检索实例，按相关度排序并分页
+        返回 (实例列表(带_score), 总数, 各模型命中数)
+        """
+        query = self.format_fulltext_query(search)
+        if not query:
+            return [], 0, {}
+        if not self.index_online(index_name):
+            raise BaseAppException("全文索引不存在或未就绪，请同步图数据库索引(graph_schema --sync)后重试")
+
+        params = [{"field": "model_id", "type": "str=", "value": model_id}] if model_id else []
+        params_str, params_map = self.format_final_params(params, permission_params=permission_params)
+        params_str = f"WHERE {params_str}" if params_str else params_str
+        params_map = dict(params_map, index_name=index_name, query=query)
+        call_str = "CALL db.index.fulltext.queryNodes($index_name, $query) YIELD node AS n, score"
 
-    def full_text(self, search: str, permission_params: str = ""):
-        """全文检索, 无实例权限"""
+        model_counts = {}
+        if not model_id:
+            objs = self.session.run(
+                f"{call_str} {params_str} RETURN n.model_id AS model_id, COUNT(n) AS count", params_map
+            )
+            model_counts = {i["model_id"]: i["count"] for i in objs}
+        else:
+            objs = self.session.run(f"{call_str} {params_str} RETURN COUNT(n) AS count", params_map)
+            model_counts = {model_id: objs.single()["count"]}
 
-        params = f"{permission_params} AND" if permission_params else ""
+        sql_str = f"{call_str} {params_str} RETURN n, score ORDER BY score DESC, id(n)"
+        if page:
+            sql_str += " SKIP $skip LIMIT $limit"
+            params_map = dict(params_map, skip=page["skip"], limit=page["limit"])
+
+        objs = self.session.run(sql_str, params_map)
+        items = [dict(self.entity_to_dict(i), _score=i["score"]) for i in objs]
+        return items, sum(model_counts.values()), model_counts
+
+    def create_fulltext_index(self, name: str, label: str, properties: list):
+        """创建全文索引"""
+        properties_str = ", ".join(f"n.{i}" for i in properties)
+        self.session.run(f"CREATE FULLTEXT INDEX `{name}` IF NOT EXISTS FOR (n:{label}) ON EACH [{properties_str}]")
+
+    def show_indexes(self):
+        """查询索引列表"""
+        objs = self.session.run(
+            "SHOW INDEXES YIELD name, type, entityType, labelsOrTypes, properties, owningConstraint, state"
+        )
+        return [dict(i) for i in objs]
+
+    def index_online(self, name: str):
+        """索引是否存在且已可用(创建中的索引状态为POPULATING)"""
+        objs = self.session.run("SHOW INDEXES YIELD name, state WHERE name = $name RETURN state", dict(name=name))
+        record = objs.single()
+        return record is not None and record["state"] == "ONLINE"
+
+    def show_constraints(self):
+        """查询约束列表"""
+        objs = self.session.run("SHOW CONSTRAINTS YIELD name, type, entityType, labelsOrTypes, properties")
+        return [dict(i) for i in objs]
+
+    def create_index(self, name: str, label: str, properties: list, is_edge: bool = False):
+        """创建属性索引，多个属性时为复合索引"""
+        pattern = f"()-[n:{label}]-()" if is_edge else f"(n:{label})"
+        properties_str = ", ".join(f"n.{i}" for i in properties)
+        self.session.run(f"CREATE INDEX `{name}` IF NOT EXISTS FOR {pattern} ON ({properties_str})")
+
+    def create_unique_constraint(self, name: str, label: str, properties: list):
+        """创建唯一性约束"""
+        properties_str = ", ".join(f"n.{i}" for i in properties)
+        self.session.run(
+            f"CREATE CONSTRAINT `{name}` IF NOT EXISTS FOR (n:{label}) REQUIRE ({properties_str}) IS UNIQUE"
+        )
 
-        # query = f"""
-        #         MATCH (n:{INSTANCE})
-        #         WHERE {params} AND
-        #             ANY(key IN keys(n) WHERE (NOT n[key] IS NULL AND toString(n[key]) CONTAINS '{search}'))
-        #         RETURN n
-        #         """
+    def drop_index(self, name: str):
+        """删除索引"""
+        self.session.run(f"DROP INDEX `{name}` IF EXISTS")
 
-        query = f"""MATCH (n:{INSTANCE}) WHERE {params} ANY(key IN keys(n) WHERE (NOT n[key] IS NULL AND ANY(value IN n[key] WHERE toString(value) CONTAINS '{search}'))) RETURN n"""  # noqa
-        objs = self.session.run(query)
-        return self.entity_to_list(objs)
+    def drop_constraint(self, name: str):
+        """删除约束"""
+        self.session.run(f"DROP CONSTRAINT `{name}` IF EXISTS")
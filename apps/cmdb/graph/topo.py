@@ -0,0 +1,88 @@
+from collections import deque
+
+from apps.cmdb.constants import TOPO_MAX_CHILDREN, TOPO_MAX_DEPTH
+
+
+class TopoBuilder:
+    """
+    拓扑树构建
+    先一次性建立 实体 -> 子边 的邻接表，再按层迭代组装树，每个实体只展开一次(避免环路与重复展开)，
+    并限制最大深度与每个节点的子节点数量
+    """
+
+    def __init__(
+        self,
+        entities: list,
+        edges: list,
+        entity_is_src=True,
+        max_depth=TOPO_MAX_DEPTH,
+        max_children=None,
+        has_more_ids=(),
+    ):
+        self.entity_map = {entity["_id"]: entity for entity in entities}
+        self.entity_is_src = entity_is_src
+        self.max_depth = max_depth
+        self.max_children = max_children or TOPO_MAX_CHILDREN
+        self.adjacency = self.build_adjacency(edges)
+        # 查询层级之外仍有子节点的实体
+        self.has_more_ids = set(has_more_ids)
+
+    def build_adjacency(self, edges: list):
+        """建立邻接表: 作为源时 src -> [边]，作为目标时 dst -> [边]"""
+        entity_key = "src_inst_id" if self.entity_is_src else "dst_inst_id"
+        adjacency = {}
+        for edge in edges:
+            # 去除自己指向自己的边
+            if edge["src_inst_id"] == edge["dst_inst_id"]:
+                continue
+            adjacency.setdefault(edge[entity_key], []).append(edge)
+        return adjacency
+
+    @staticmethod
+    def create_node(entity):
+        return {
+            "_id": entity["_id"],
+            "model_id": entity["model_id"],
+            "inst_name": entity["inst_name"],
+            "children": [],
+        }
+
+    def build(self, start_id):
+        """从start_id开始组装拓扑树"""
+        if start_id not in self.entity_map:
+            return {}
+
+        child_key = "dst_inst_id" if self.entity_is_src else "src_inst_id"
+        root = self.create_node(self.entity_map[start_id])
+        visited = {start_id}
+        queue = deque([(root, 0)])
+
+        while queue:
+            node, depth = queue.popleft()
+            child_edges = [i for i in self.adjacency.get(node["_id"], []) if i[child_key] in self.entity_map]
+            if not child_edges:
+                if node["_id"] in self.has_more_ids:
+                    node["truncated"] = True
+                continue
+
+            if depth >= self.max_depth:
+                node["truncated"] = True
+                continue
+
+            if len(child_edges) > self.max_children:
+                child_edges = child_edges[: self.max_children]
+                node["truncated"] = True
+
+            for edge in child_edges:
+                child_id = edge[child_key]
+                child_node = self.create_node(self.entity_map[child_id])
+                child_node["model_asst_id"] = edge["model_asst_id"]
+                child_node["asst_id"] = edge["asst_id"]
+                node["children"].append(child_node)
+                # 已展开过的实体不再展开其子节点
+                if child_id in visited:
+                    continue
+                visited.add(child_id)
+                queue.append((child_node, depth + 1))
+
+        return root
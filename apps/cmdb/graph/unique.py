@@ -0,0 +1,68 @@
+import json
+
+from apps.core.exceptions.base_app_exception import BaseAppException
+
+
+class UniqueAttrIndex:
+    """
+    唯一属性校验索引
+    按属性维护 属性值 -> 持有该值的实体ID集合 的哈希表，批量写入时随写入的数据增长
+    """
+
+    def __init__(self, check_attr_map: dict, exist_items: list = ()):
+        self.check_attr_map = check_attr_map
+        self.values = {attr: {} for attr in check_attr_map}
+        for item in exist_items:
+            self.add(item)
+
+    @staticmethod
+    def hashable(value):
+        """将属性值转换为可哈希的类型"""
+        if isinstance(value, list):
+            return tuple(UniqueAttrIndex.hashable(i) for i in value)
+        if isinstance(value, dict):
+            return json.dumps(value, sort_keys=True)
+        return value
+
+    @staticmethod
+    def owner(item):
+        """实体标识，未落库的数据以对象本身区分"""
+        return item.get("_id", id(item))
+
+    def add(self, item: dict):
+        """登记实体的唯一属性值"""
+        for attr, value_map in self.values.items():
+            if item.get(attr) is None:
+                continue
+            value_map.setdefault(self.hashable(item[attr]), set()).add(self.owner(item))
+
+    def remove(self, item: dict):
+        """移除实体的唯一属性值"""
+        for attr, value_map in self.values.items():
+            if item.get(attr) is None:
+                continue
+            owners = value_map.get(self.hashable(item[attr]))
+            if owners:
+                owners.discard(self.owner(item))
+
+    def check(self, item: dict, is_update: bool = False, exclude_ids=()):
+        """校验唯一属性，exclude_ids为本次被更新的实体ID"""
+        not_only_attr = set()
+
+        check_attrs = [i for i in self.check_attr_map.keys() if i in item] if is_update else self.check_attr_map.keys()
+
+        for attr in check_attrs:
+            if item.get(attr) is None:
+                continue
+            owners = self.values[attr].get(self.hashable(item[attr]), set())
+            if owners - set(exclude_ids):
+                not_only_attr.add(attr)
+
+        if not not_only_attr:
+            return
+
+        message = ""
+        for attr in not_only_attr:
+            message += f"{self.check_attr_map[attr]} exist；"
+
+        raise BaseAppException(message)
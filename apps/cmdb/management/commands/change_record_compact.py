@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+
+from apps.cmdb.utils.change_record import compact_change_records
+
+
+class Command(BaseCommand):
+    help = "将历史的实例修改记录按批次转换为只保存变化属性的记录，并保留周期性的完整快照"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="每批处理的记录数")
+
+    def handle(self, *args, **options):
+        count = compact_change_records(options["batch_size"])
+        self.stdout.write(f"converted {count} change records")
@@ -0,0 +1,19 @@
+import json
+
+from django.core.management import BaseCommand
+
+from apps.cmdb.services.model import ModelManage
+
+
+class Command(BaseCommand):
+    help = "查看或同步图数据库索引与约束"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sync", action="store_true", help="根据模型属性同步索引与约束")
+
+    def handle(self, *args, **options):
+        if options["sync"]:
+            result = ModelManage.sync_graph_schema()
+        else:
+            result = ModelManage.graph_schema_status()
+        self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2, default=str))
@@ -0,0 +1,13 @@
+import json
+
+from django.core.management import BaseCommand
+
+from apps.cmdb.services.instance_count import InstanceCountManage
+
+
+class Command(BaseCommand):
+    help = "以图数据库为准校准模型实例计数"
+
+    def handle(self, *args, **options):
+        result = InstanceCountManage.reconcile()
+        self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2))
@@ -2,7 +2,23 @@ import logging
 
 from django.core.management import BaseCommand
 
+from apps.cmdb.constants import (
+    CHANGE_RECORD_PARTITION_INTERVAL,
+    CHANGE_RECORD_PARTITION_TASK,
+    CHANGE_RECORD_REPLAY_INTERVAL,
+    CHANGE_RECORD_REPLAY_TASK,
+    GRAPH_SCHEMA_SYNC_INTERVAL,
+    GRAPH_SCHEMA_SYNC_TASK,
+    INSTANCE_COUNT_RECONCILE_INTERVAL,
+    INSTANCE_COUNT_RECONCILE_TASK,
+)
 from apps.cmdb.model_migrate.migrete_service import ModelMigrate
+from apps.cmdb.services.instance import InstanceManage
+from apps.cmdb.services.instance_count import InstanceCountManage
+from apps.cmdb.services.model import ModelManage
+from apps.cmdb.utils.model_cache import ModelMetaCache
+from apps.core.utils.celery_utils import CeleryUtils
+from config.default import ORGANIZATION_CACHE_TTL
 
 
 class Command(BaseCommand):
@@ -16,3 +32,55 @@ class Command(BaseCommand):
         result = ModelMigrate().main()
         logger.info("初始化模型完成！结果如下：")
         logger.info(result)
+
+        # 模型已直接写入图数据库，使模型元数据缓存失效
+        ModelMetaCache.bump_version()
+
+        # 根据模型属性同步索引与约束
+        logger.info("同步图数据库索引与约束！")
+        schema_result = ModelManage.sync_graph_schema()
+        logger.info("同步图数据库索引与约束完成！结果如下：")
+        logger.info(schema_result)
+
+        # 注册索引与约束的周期全量同步任务，补偿模型属性变更后异步同步任务的丢失或失败
+        CeleryUtils.create_or_update_periodic_task(
+            name=GRAPH_SCHEMA_SYNC_TASK,
+            interval=GRAPH_SCHEMA_SYNC_INTERVAL,
+            task="apps.cmdb.tasks.graph_schema_task.sync_graph_schema",
+        )
+
+        # 回填实例与组织节点的关系，用于组织权限过滤
+        logger.info("回填实例组织关系！")
+        membership_count = InstanceManage.sync_organization_membership()
+        logger.info(f"回填实例组织关系完成！共处理{membership_count}个实例")
+
+        # 初始化实例计数，并注册定期校准任务
+        logger.info("初始化实例计数！")
+        count_result = InstanceCountManage.reconcile()
+        logger.info(f"初始化实例计数完成！共修正{len(count_result)}项")
+        CeleryUtils.create_or_update_periodic_task(
+            name=INSTANCE_COUNT_RECONCILE_TASK,
+            interval=INSTANCE_COUNT_RECONCILE_INTERVAL,
+            task="apps.cmdb.tasks.instance_count_task.reconcile_instance_count",
+        )
+
+        # 注册组织层级闭包的定期刷新任务，在缓存过期前刷新
+        CeleryUtils.create_or_update_periodic_task(
+            name="core_refresh_organization_closure",
+            interval=max(ORGANIZATION_CACHE_TTL // 2, 1),
+            task="apps.core.tasks.organization_task.refresh_organization_closure",
+        )
+
+        # 注册变更记录磁盘补写任务，写入已退出进程遗留在磁盘上的变更记录
+        CeleryUtils.create_or_update_periodic_task(
+            name=CHANGE_RECORD_REPLAY_TASK,
+            interval=CHANGE_RECORD_REPLAY_INTERVAL,
+            task="apps.cmdb.tasks.change_record_task.replay_change_record",
+        )
+
+        # 注册变更记录分区维护任务，提前创建月份分区并清理过期分区
+        CeleryUtils.create_or_update_periodic_task(
+            name=CHANGE_RECORD_PARTITION_TASK,
+            interval=CHANGE_RECORD_PARTITION_INTERVAL,
+            task="apps.cmdb.tasks.change_record_task.maintain_change_record_partition",
+        )
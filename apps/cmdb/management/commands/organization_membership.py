@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+
+from apps.cmdb.services.instance import InstanceManage
+
+
+class Command(BaseCommand):
+    help = "按实例的所属组织回填实例与组织节点的关系，用于组织权限过滤"
+
+    def handle(self, *args, **options):
+        count = InstanceManage.sync_organization_membership()
+        self.stdout.write(f"synced {count} instances")
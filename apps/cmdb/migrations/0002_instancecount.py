@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cmdb", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InstanceCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model_id", models.CharField(max_length=100, verbose_name="模型ID")),
+                ("organization", models.CharField(max_length=1000, verbose_name="所属组织")),
+                ("count", models.BigIntegerField(default=0, verbose_name="实例数量")),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="更新时间")),
+            ],
+            options={
+                "unique_together": {("model_id", "organization")},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cmdb", "0002_instancecount"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="changerecord",
+            name="created_at",
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name="创建时间"),
+        ),
+    ]
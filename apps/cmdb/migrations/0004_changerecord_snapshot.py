@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cmdb", "0003_alter_changerecord_created_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="changerecord",
+            name="snapshot",
+            field=models.BooleanField(default=True, verbose_name="是否完整快照"),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cmdb", "0004_changerecord_snapshot"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="changerecord",
+            index=models.Index(fields=["inst_id", "created_at"], name="cmdb_change_inst_created_idx"),
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:00
+
+from django.db import migrations, models
+from django.utils import timezone
+
+TABLE = "cmdb_changerecord"
+LEGACY_TABLE = f"{TABLE}_legacy"
+SEQUENCE = f"{TABLE}_id_seq"
+# 迁移时预先创建的后续月份分区数
+PREMAKE_MONTHS = 3
+
+
+def month_start(value):
+    return timezone.localtime(value).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def create_indexes(schema_editor, model):
+    """重建原有索引，索引名与原表一致"""
+    for field_name in ["inst_id", "created_at"]:
+        schema_editor.execute(schema_editor._create_index_sql(model, fields=[model._meta.get_field(field_name)]))
+    for index in model._meta.indexes:
+        schema_editor.add_index(model, index)
+
+
+def partition_change_record(apps, schema_editor):
+    """
+    将变更记录表转换为按创建时间每月一个分区的分区表
+    分区表的主键必须包含分区键，数据库中主键改为(id, created_at)，ORM仍以id作为主键；
+    id改为显式的序列默认值，不依赖各版本对分区表identity列的支持差异
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    ChangeRecord = apps.get_model("cmdb", "ChangeRecord")
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}")
+        cursor.execute(f"ALTER TABLE {LEGACY_TABLE} RENAME CONSTRAINT {TABLE}_pkey TO {LEGACY_TABLE}_pkey")
+        # 删除原表id的identity或serial默认值及其序列，释放序列名
+        cursor.execute(f"ALTER TABLE {LEGACY_TABLE} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+        cursor.execute(f"ALTER TABLE {LEGACY_TABLE} ALTER COLUMN id DROP DEFAULT")
+        # 由早期版本(serial)创建的表
+        cursor.execute(f"DROP SEQUENCE IF EXISTS {SEQUENCE}")
+        cursor.execute(f"CREATE TABLE {TABLE} (LIKE {LEGACY_TABLE} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)")
+        cursor.execute(f"CREATE SEQUENCE {SEQUENCE} AS bigint OWNED BY {TABLE}.id")
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+        cursor.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id, created_at)")
+
+        cursor.execute(f"SELECT MIN(created_at) FROM {LEGACY_TABLE}")
+        month = month_start(cursor.fetchone()[0] or timezone.now())
+        last_month = add_months(month_start(timezone.now()), PREMAKE_MONTHS)
+        while month <= last_month:
+            cursor.execute(
+                f"CREATE TABLE {TABLE}_p{month:%Y%m} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)",
+                [month, add_months(month, 1)],
+            )
+            month = add_months(month, 1)
+        # 兜底分区，存放尚未创建月份分区的数据
+        cursor.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {LEGACY_TABLE}")
+        cursor.execute(f"SELECT setval('{SEQUENCE}', COALESCE(MAX(id), 0) + 1, false) FROM {TABLE}")
+        cursor.execute(f"DROP TABLE {LEGACY_TABLE}")
+
+    create_indexes(schema_editor, ChangeRecord)
+
+
+def unpartition_change_record(apps, schema_editor):
+    """回滚为普通表，数据复制回单表，主键恢复为id"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    ChangeRecord = apps.get_model("cmdb", "ChangeRecord")
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}")
+        cursor.execute(f"ALTER TABLE {LEGACY_TABLE} RENAME CONSTRAINT {TABLE}_pkey TO {LEGACY_TABLE}_pkey")
+        cursor.execute(f"CREATE TABLE {TABLE} (LIKE {LEGACY_TABLE} INCLUDING DEFAULTS)")
+        cursor.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id)")
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {LEGACY_TABLE}")
+        # 序列改为归属新表，删除分区表时不随之删除
+        cursor.execute(f"ALTER SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id")
+        cursor.execute(f"DROP TABLE {LEGACY_TABLE}")
+
+    create_indexes(schema_editor, ChangeRecord)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cmdb", "0005_changerecord_inst_created_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_change_record, unpartition_change_record),
+        migrations.AddIndex(
+            model_name="changerecord",
+            index=models.Index(fields=["model_id", "created_at"], name="cmdb_change_model_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="changerecord",
+            index=models.Index(fields=["type", "created_at"], name="cmdb_change_type_created_idx"),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:00
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def fill_organization_hash(apps, schema_editor):
+    InstanceCount = apps.get_model("cmdb", "InstanceCount")
+    objs = list(InstanceCount.objects.all())
+    for obj in objs:
+        obj.organization_hash = hashlib.sha256(obj.organization.encode()).hexdigest()
+    InstanceCount.objects.bulk_update(objs, ["organization_hash"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cmdb", "0006_partition_changerecord"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="instancecount",
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name="instancecount",
+            name="organization",
+            field=models.TextField(verbose_name="所属组织"),
+        ),
+        migrations.AddField(
+            model_name="instancecount",
+            name="organization_hash",
+            field=models.CharField(default="", max_length=64, verbose_name="所属组织摘要"),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_organization_hash, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name="instancecount",
+            unique_together={("model_id", "organization_hash")},
+        ),
+    ]
@@ -1,2 +1,3 @@
 from .change_record import *  # noqa
+from .instance_count import *  # noqa
 from .show_field import *  # noqa
@@ -1,5 +1,6 @@
 from django.db import models
 from django.db.models import JSONField
+from django.utils import timezone
 
 CREATE_INST = "create_entity"
 DELETE_INST = "delete_entity"
@@ -8,6 +9,9 @@ UPDATE_INST = "update_entity"
 CREATE_INST_ASST = "create_edge"
 DELETE_INST_ASST = "delete_edge"
 
+# 分区过期删除前写入的实例检查点，after_data 为完整属性，before_data 记录当时的关联，不对外展示
+SNAPSHOT_INST = "snapshot_entity"
+
 OPERATE_TYPE_CHOICES = [
     (CREATE_INST, "创建"),
     (DELETE_INST, "删除"),
@@ -18,6 +22,11 @@ OPERATE_TYPE_CHOICES = [
 
 
 class ChangeRecord(models.Model):
+    """
+    实例变更记录
+    PostgreSQL中按创建时间每月一个分区(见迁移0006)，过期分区由定时任务整体归档并删除
+    """
+
     inst_id = models.BigIntegerField(db_index=True, verbose_name="实例ID")
     model_id = models.CharField(max_length=100, verbose_name="模型ID")
     label = models.CharField(max_length=50, verbose_name="标签ID")
@@ -26,7 +35,19 @@ class ChangeRecord(models.Model):
     )
     before_data = JSONField(default=dict, verbose_name="变更前实例信息")
     after_data = JSONField(default=dict, verbose_name="变更后实例信息")
+    # 为False时before_data/after_data只包含变化的属性，完整数据由最近的快照依次应用变化还原
+    snapshot = models.BooleanField(default=True, verbose_name="是否完整快照")
     operator = models.CharField(max_length=50, default="", verbose_name="创建者")
+    # 变更记录异步批量写入，创建时间取记录产生的时间而非写入数据库的时间
     created_at = models.DateTimeField(
-        auto_now_add=True, db_index=True, verbose_name="创建时间"
+        default=timezone.now, db_index=True, verbose_name="创建时间"
     )
+
+    class Meta:
+        indexes = [
+            # 按实例查询某一时刻之前的变更记录
+            models.Index(fields=["inst_id", "created_at"], name="cmdb_change_inst_created_idx"),
+            # 按模型、变更类型筛选变更记录
+            models.Index(fields=["model_id", "created_at"], name="cmdb_change_model_created_idx"),
+            models.Index(fields=["type", "created_at"], name="cmdb_change_type_created_idx"),
+        ]
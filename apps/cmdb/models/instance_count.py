@@ -0,0 +1,19 @@
+from django.db import models
+
+
+class InstanceCount(models.Model):
+    """
+    实例数量计数
+    按 模型 + 所属组织集合 维护实例数量，organization为排序去重后的组织ID列表的JSON字符串，
+    实例属于多个组织时只计入一次，汇总时不会重复统计；
+    组织较多时organization可能很长，唯一约束建立在其sha256摘要organization_hash上
+    """
+
+    model_id = models.CharField(max_length=100, verbose_name="模型ID")
+    organization = models.TextField(verbose_name="所属组织")
+    organization_hash = models.CharField(max_length=64, verbose_name="所属组织摘要")
+    count = models.BigIntegerField(default=0, verbose_name="实例数量")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        unique_together = ("model_id", "organization_hash")
@@ -1,11 +1,24 @@
 from rest_framework import serializers
 
 from apps.cmdb.models.change_record import ChangeRecord
+from apps.cmdb.utils.change_record import restore_change_records
+
+
+class ChangeRecordListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # 按实例批量还原整页记录，避免逐条查询快照
+        records = list(data.all() if hasattr(data, "all") else data)
+        restore_change_records(records)
+        return super().to_representation(records)
 
 
 class ChangeRecordSerializer(serializers.ModelSerializer):
+    # 为True时记录依赖的完整快照已被清理，before_data/after_data只包含变化的属性
+    partial = serializers.SerializerMethodField()
+
     class Meta:
         model = ChangeRecord
+        list_serializer_class = ChangeRecordListSerializer
         fields = (
             "id",
             "inst_id",
@@ -16,5 +29,13 @@ class ChangeRecordSerializer(serializers.ModelSerializer):
             "after_data",
             "operator",
             "created_at",
+            "partial",
         )
         read_only_fields = ("id", "created_at")
+
+    def get_partial(self, obj):
+        return getattr(obj, "partial", False)
+
+    def to_representation(self, instance):
+        restore_change_records([instance])
+        return super().to_representation(instance)
@@ -0,0 +1,130 @@
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.cmdb.constants import CHANGE_RECORD_REPLAY_CHUNK_SIZE, CHANGE_RECORD_SNAPSHOT_INTERVAL
+from apps.cmdb.models.change_record import CREATE_INST, DELETE_INST, SNAPSHOT_INST, UPDATE_INST, ChangeRecord
+from apps.cmdb.utils.change_record import ASSO_TYPES, STATE_TYPES, after_record, apply_asso_record, apply_state_record
+from apps.core.exceptions.base_app_exception import BaseAppException
+
+
+class ChangeRecordManage(object):
+    @staticmethod
+    def parse_time(value: str) -> datetime:
+        """解析查询时刻，未带时区时按当前时区处理"""
+        at = parse_datetime(value or "")
+        if at is None:
+            raise BaseAppException("time is invalid")
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at)
+        return at
+
+    @staticmethod
+    def instance_associations(inst_id: int, at: datetime):
+        """实例在某一时刻的关联关系"""
+        return ChangeRecordManage.instances_associations([inst_id], at)[inst_id]
+
+    @staticmethod
+    def instances_associations(inst_ids: list, at: datetime):
+        """
+        多个实例在某一时刻的关联关系，返回 {实例ID: [关联信息]}
+        每个实例从该时刻之前最近的创建、删除记录或检查点开始回放之后的关联变更，回放量只与该段时间的关联变更数有关
+        """
+        associations = {inst_id: {} for inst_id in inst_ids}
+        starts = (
+            ChangeRecord.objects.filter(
+                inst_id__in=inst_ids, type__in=[CREATE_INST, DELETE_INST, SNAPSHOT_INST], created_at__lte=at
+            )
+            .order_by("inst_id", "-created_at", "-id")
+            .distinct("inst_id")
+        )
+        condition, started = Q(), set()
+        for start in starts:
+            if start.type == SNAPSHOT_INST:
+                associations[start.inst_id] = {i["edge"]["_id"]: i for i in start.before_data["associations"]}
+            condition |= Q(inst_id=start.inst_id) & after_record(start)
+            started.add(start.inst_id)
+        condition |= Q(inst_id__in=[i for i in inst_ids if i not in started])
+
+        queryset = ChangeRecord.objects.filter(condition, type__in=ASSO_TYPES, created_at__lte=at).order_by(
+            "created_at", "id"
+        )
+        for record in queryset.iterator(chunk_size=CHANGE_RECORD_REPLAY_CHUNK_SIZE):
+            apply_asso_record(associations[record.inst_id], record)
+        return {inst_id: list(i.values()) for inst_id, i in associations.items()}
+
+    @staticmethod
+    def instance_state(inst_id: int, at: datetime):
+        """
+        还原实例在某一时刻的属性与关联
+        从该时刻之前最近的完整快照开始，按顺序应用之后的变化；实例在该时刻不存在时返回None
+        """
+        chain = []
+        queryset = ChangeRecord.objects.filter(
+            inst_id=inst_id, type__in=STATE_TYPES + [DELETE_INST], created_at__lte=at
+        ).order_by("-created_at", "-id")
+        for record in queryset.iterator(chunk_size=CHANGE_RECORD_SNAPSHOT_INTERVAL + 1):
+            chain.append(record)
+            # 删除记录同样为完整快照
+            if record.snapshot:
+                break
+
+        data = None
+        for record in reversed(chain):
+            data = apply_state_record(data, record)
+        if data is None:
+            return None
+
+        return dict(
+            inst_id=inst_id,
+            model_id=chain[0].model_id,
+            data=data,
+            # 快照已被清理时只能得到之后变化过的属性
+            partial=not chain[-1].snapshot,
+            associations=ChangeRecordManage.instance_associations(inst_id, at),
+        )
+
+    @staticmethod
+    def model_snapshot_queryset(model_id: str, at: datetime):
+        """模型下每个实例在某一时刻之前最近的完整快照(删除记录同样为完整快照)，按实例ID排序，供按实例ID分页"""
+        return (
+            ChangeRecord.objects.filter(
+                model_id=model_id, type__in=STATE_TYPES + [DELETE_INST], snapshot=True, created_at__lte=at
+            )
+            .order_by("inst_id", "-created_at", "-id")
+            .distinct("inst_id")
+        )
+
+    @staticmethod
+    def model_instance_states(snapshots: list, at: datetime):
+        """
+        还原一页实例在某一时刻的属性与关联
+        每个实例从 model_snapshot_queryset 得到的快照开始，只应用快照之后的变化；该时刻已删除的实例不返回
+        """
+        snapshots = [i for i in snapshots if i.type != DELETE_INST]
+        if not snapshots:
+            return []
+
+        condition = Q()
+        for snapshot in snapshots:
+            condition |= Q(inst_id=snapshot.inst_id) & after_record(snapshot)
+        queryset = ChangeRecord.objects.filter(condition, type=UPDATE_INST, created_at__lte=at).order_by(
+            "created_at", "id"
+        )
+        states = {i.inst_id: apply_state_record(None, i) for i in snapshots}
+        for record in queryset.iterator(chunk_size=CHANGE_RECORD_REPLAY_CHUNK_SIZE):
+            states[record.inst_id] = apply_state_record(states[record.inst_id], record)
+
+        associations = ChangeRecordManage.instances_associations(list(states), at)
+        return [
+            dict(
+                inst_id=snapshot.inst_id,
+                model_id=snapshot.model_id,
+                data=states[snapshot.inst_id],
+                partial=False,
+                associations=associations[snapshot.inst_id],
+            )
+            for snapshot in snapshots
+        ]
@@ -30,6 +30,30 @@ class CredentialManage(object):
 
         return dict(items=inst_list, count=count)
 
+    @staticmethod
+    def credential_list_by_cursor(
+        credential_type: str, operator: str, page_size: int, cursor: str = None, order: str = None, with_count=False
+    ):
+        """获取凭据列表，游标分页"""
+        params = [
+            {"field": "_creator", "type": "str=", "value": operator},
+            {"field": "credential_type", "type": "str=", "value": credential_type},
+        ]
+        if order and order.startswith("-"):
+            order = f"{order.replace('-', '')} DESC"
+
+        with Neo4jClient() as ag:
+            inst_list, next_cursor, count = ag.query_entity_by_cursor(
+                CREDENTIAL,
+                params,
+                page_size,
+                cursor=cursor,
+                order=order,
+                with_count=with_count,
+            )
+
+        return dict(items=inst_list, count=count, next_cursor=next_cursor)
+
     @staticmethod
     def get_encryption_field(_id, field: str):
         """获取加密字段"""
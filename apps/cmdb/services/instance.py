@@ -1,11 +1,27 @@
-from apps.cmdb.constants import INSTANCE, INSTANCE_ASSOCIATION
+import hashlib
+import json
+from io import BytesIO
+
+from apps.cmdb.constants import (
+    BATCH_WRITE_CHUNK_SIZE,
+    FULLTEXT_PAGE_SIZE,
+    INSTANCE,
+    INSTANCE_ASSOCIATION,
+    ORGANIZATION,
+    ORGANIZATION_MEMBERSHIP_BACKFILL,
+    TOPO_LAZY_DEPTH,
+    TOPO_MAX_DEPTH,
+    TOPO_PAGE_SIZE,
+)
 from apps.cmdb.graph.neo4j import Neo4jClient
 from apps.cmdb.models.change_record import CREATE_INST, CREATE_INST_ASST, DELETE_INST, DELETE_INST_ASST, UPDATE_INST
 from apps.cmdb.models.show_field import ShowField
+from apps.cmdb.services.instance_count import InstanceCountManage
 from apps.cmdb.services.model import ModelManage
 from apps.cmdb.utils.change_record import batch_create_change_record, create_change_record, create_change_record_by_asso
 from apps.cmdb.utils.export import Export
 from apps.cmdb.utils.Import import Import
+from apps.cmdb.utils.model_cache import ModelMetaCache
 from apps.cmdb.utils.permission import PermissionManage
 from apps.core.exceptions.base_app_exception import BaseAppException
 
@@ -61,22 +77,48 @@ class InstanceManage(object):
 
         return inst_list, count
 
+    @staticmethod
+    def instance_list_by_cursor(
+        token: str, model_id: str, params: list, page_size: int, order: str, cursor: str = None, with_count=False
+    ):
+        """实例列表，游标分页"""
+
+        params.append({"field": "model_id", "type": "str=", "value": model_id})
+        if order and order.startswith("-"):
+            order = f"{order.replace('-', '')} DESC"
+
+        permission_params = InstanceManage.get_permission_params(token)
+
+        with Neo4jClient() as ag:
+            inst_list, next_cursor, count = ag.query_entity_by_cursor(
+                INSTANCE,
+                params,
+                page_size,
+                cursor=cursor,
+                order=order,
+                permission_params=permission_params,
+                with_count=with_count,
+            )
+
+        return inst_list, next_cursor, count
+
     @staticmethod
     def instance_create(model_id: str, instance_info: dict, operator: str):
         """创建实例"""
         instance_info.update(model_id=model_id)
-        attrs = ModelManage.search_model_attr(model_id)
-        check_attr_map = dict(is_only={}, is_required={})
-        for attr in attrs:
-            if attr["is_only"]:
-                check_attr_map["is_only"][attr["attr_id"]] = attr["attr_name"]
-            if attr["is_required"]:
-                check_attr_map["is_required"][attr["attr_id"]] = attr["attr_name"]
+        check_attr_map = ModelManage.get_check_attr_map(model_id)
 
         with Neo4jClient() as ag:
-            exist_items, _ = ag.query_entity(INSTANCE, [{"field": "model_id", "type": "str=", "value": model_id}])
+            exist_items = ag.query_unique_collisions(
+                INSTANCE,
+                [{"field": "model_id", "type": "str=", "value": model_id}],
+                check_attr_map["is_only"],
+                [instance_info],
+            )
             result = ag.create_entity(INSTANCE, instance_info, check_attr_map, exist_items, operator)
 
+        InstanceCountManage.change(added=[result])
+
         create_change_record(
             result["_id"],
             result["model_id"],
@@ -95,28 +137,22 @@ class InstanceManage(object):
         if not inst_info:
             raise BaseAppException("实例不存在！")
 
-        model_info = ModelManage.search_model_info(inst_info["model_id"])
-
         InstanceManage.check_instances_permission(token, [inst_info], inst_info["model_id"])
 
-        attrs = ModelManage.parse_attrs(model_info.get("attrs", "[]"))
-        check_attr_map = dict(is_only={}, is_required={}, editable={})
-        for attr in attrs:
-            if attr["is_only"]:
-                check_attr_map["is_only"][attr["attr_id"]] = attr["attr_name"]
-            if attr["is_required"]:
-                check_attr_map["is_required"][attr["attr_id"]] = attr["attr_name"]
-            if attr["editable"]:
-                check_attr_map["editable"][attr["attr_id"]] = attr["attr_name"]
+        check_attr_map = ModelManage.get_check_attr_map(inst_info["model_id"])
 
         with Neo4jClient() as ag:
-            exist_items, _ = ag.query_entity(
+            exist_items = ag.query_unique_collisions(
                 INSTANCE,
                 [{"field": "model_id", "type": "str=", "value": inst_info["model_id"]}],
+                check_attr_map["is_only"],
+                [update_attr],
+                exclude_ids=[inst_id],
             )
-            exist_items = [i for i in exist_items if i["_id"] != inst_id]
             result = ag.set_entity_properties(INSTANCE, [inst_id], update_attr, check_attr_map, exist_items)
 
+        InstanceCountManage.update_organization([inst_info], result)
+
         create_change_record(
             inst_info["_id"],
             inst_info["model_id"],
@@ -142,30 +178,20 @@ class InstanceManage(object):
 
         InstanceManage.check_instances_permission(token, inst_list, model_info["model_id"])
 
-        attrs = ModelManage.parse_attrs(model_info.get("attrs", "[]"))
-        check_attr_map = dict(is_only={}, is_required={}, editable={})
-        for attr in attrs:
-            if attr["is_only"]:
-                check_attr_map["is_only"][attr["attr_id"]] = attr["attr_name"]
-            if attr["is_required"]:
-                check_attr_map["is_required"][attr["attr_id"]] = attr["attr_name"]
-            if attr["editable"]:
-                check_attr_map["editable"][attr["attr_id"]] = attr["attr_name"]
+        check_attr_map = ModelManage.get_check_attr_map(model_info["model_id"])
 
         with Neo4jClient() as ag:
-            exist_items, _ = ag.query_entity(
+            exist_items = ag.query_unique_collisions(
                 INSTANCE,
-                [
-                    {
-                        "field": "model_id",
-                        "type": "str=",
-                        "value": model_info["model_id"],
-                    }
-                ],
+                [{"field": "model_id", "type": "str=", "value": model_info["model_id"]}],
+                check_attr_map["is_only"],
+                [update_attr],
+                exclude_ids=inst_ids,
             )
-            exist_items = [i for i in exist_items if i["_id"] not in inst_ids]
             result = ag.set_entity_properties(INSTANCE, inst_ids, update_attr, check_attr_map, exist_items)
 
+        InstanceCountManage.update_organization(inst_list, result)
+
         after_dict = {i["_id"]: i for i in result}
         change_records = [
             dict(
@@ -193,6 +219,8 @@ class InstanceManage(object):
         with Neo4jClient() as ag:
             ag.batch_delete_entity(INSTANCE, inst_ids)
 
+        InstanceCountManage.change(removed=inst_list)
+
         change_records = [dict(inst_id=i["_id"], model_id=i["model_id"], before_data=i) for i in inst_list]
         batch_create_change_record(INSTANCE, DELETE_INST, change_records, operator=operator)
 
@@ -308,7 +336,7 @@ class InstanceManage(object):
 
         with Neo4jClient() as ag:
             try:
-                edge = ag.create_edge(
+                asso_info = ag.create_edge(
                     INSTANCE_ASSOCIATION,
                     data["src_inst_id"],
                     INSTANCE,
@@ -316,16 +344,16 @@ class InstanceManage(object):
                     INSTANCE,
                     data,
                     "model_asst_id",
+                    return_entity=True,
                 )
             except BaseAppException as e:
                 if e.message == "edge already exists":
                     raise BaseAppException("instance association repetition")
-
-        asso_info = InstanceManage.instance_association_by_asso_id(edge["_id"])
+                raise
 
         create_change_record_by_asso(INSTANCE_ASSOCIATION, CREATE_INST_ASST, asso_info, operator=operator)
 
-        return edge
+        return asso_info["edge"]
 
     @staticmethod
     def instance_association_delete(asso_id: int, operator: str):
@@ -361,49 +389,99 @@ class InstanceManage(object):
 
     @staticmethod
     def download_import_template(model_id: str):
-        """下载导入模板"""
+        """
+        下载导入模板，模板按模型元数据版本缓存
+        用户、组织的下拉选项来自目录缓存，不随模型元数据版本变化，以包含选项的属性摘要区分模板
+        """
         attrs = ModelManage.search_model_attr_v2(model_id)
-        return Export(attrs).export_template()
+        digest = hashlib.sha256(json.dumps(attrs, sort_keys=True, default=str).encode()).hexdigest()
+        template = ModelMetaCache.get_or_set(
+            "import_template",
+            f"{model_id}:{digest}",
+            lambda: Export(attrs).export_template().getvalue(),
+        )
+        return BytesIO(template)
 
     @staticmethod
     def inst_import(model_id: str, file_stream: bytes, operator: str):
-        """实例导入"""
+        """实例导入，按批次写入并逐批返回结果"""
         attrs = ModelManage.search_model_attr_v2(model_id)
-        with Neo4jClient() as ag:
-            exist_items, _ = ag.query_entity(INSTANCE, [{"field": "model_id", "type": "str=", "value": model_id}])
-        results = Import(model_id, attrs, exist_items, operator).import_inst_list(file_stream)
+        for results in Import(model_id, attrs, operator).import_inst_list(file_stream):
+            change_records = [
+                dict(
+                    inst_id=i["data"]["_id"],
+                    model_id=i["data"]["model_id"],
+                    before_data=i["data"],
+                )
+                for i in results
+                if i["success"]
+            ]
+            batch_create_change_record(INSTANCE, CREATE_INST, change_records, operator=operator)
+            InstanceCountManage.change(added=[i["data"] for i in results if i["success"]])
 
-        change_records = [
-            dict(
-                inst_id=i["data"]["_id"],
-                model_id=i["data"]["model_id"],
-                before_data=i["data"],
-            )
-            for i in results
-            if i["success"]
-        ]
-        batch_create_change_record(INSTANCE, CREATE_INST, change_records, operator=operator)
+            yield results
 
-        return results
+    @staticmethod
+    def sync_organization_membership(chunk_size: int = BATCH_WRITE_CHUNK_SIZE):
+        """按实例的所属组织分批重建实例与组织节点的关系，返回处理的实例数量"""
+        count, chunk = 0, []
+        with Neo4jClient() as ag:
+            for entity in ag.iter_entity(INSTANCE, [], chunk_size=chunk_size):
+                chunk.append(entity)
+                if len(chunk) >= chunk_size:
+                    ag.sync_organization_membership(chunk)
+                    count += len(chunk)
+                    chunk = []
+            if chunk:
+                ag.sync_organization_membership(chunk)
+                count += len(chunk)
+            # 全部实例处理完成后才允许按组织节点过滤权限
+            ag.set_backfill_marker(ORGANIZATION_MEMBERSHIP_BACKFILL)
+        PermissionManage.clear_membership_ready()
+        return count
 
     @staticmethod
-    def inst_export(model_id: str, ids: list):
-        """实例导出"""
-        attrs = ModelManage.search_model_attr_v2(model_id)
+    def iter_export_inst(model_id: str, ids: list):
+        """分批读取要导出的实例"""
         with Neo4jClient() as ag:
             if ids:
-                inst_list = ag.query_entity_by_ids(ids)
+                yield from ag.iter_entity_by_ids(ids)
             else:
-                inst_list, _ = ag.query_entity(INSTANCE, [{"field": "model_id", "type": "str=", "value": model_id}])
-        return Export(attrs).export_inst_list(inst_list)
+                yield from ag.iter_entity(INSTANCE, [{"field": "model_id", "type": "str=", "value": model_id}])
+
+    @staticmethod
+    def inst_export(model_id: str, ids: list):
+        """实例导出，返回临时文件流"""
+        attrs = ModelManage.search_model_attr_v2(model_id)
+        return Export(attrs).export_inst_list(InstanceManage.iter_export_inst(model_id, ids))
 
     @staticmethod
-    def topo_search(inst_id: int):
+    def topo_search(inst_id: int, max_depth: int = TOPO_MAX_DEPTH, max_children: int = None):
         """拓扑查询"""
         with Neo4jClient() as ag:
-            result = ag.query_topo(INSTANCE, inst_id)
+            result = ag.query_topo(INSTANCE, inst_id, max_depth, max_children)
         return result
 
+    @staticmethod
+    def topo_search_lazy(inst_id: int, depth: int = TOPO_LAZY_DEPTH, page_size: int = TOPO_PAGE_SIZE):
+        """增量拓扑查询，返回前depth层"""
+        with Neo4jClient() as ag:
+            result = ag.query_topo_lazy(INSTANCE, inst_id, depth, page_size)
+        return result
+
+    @staticmethod
+    def topo_expand(
+        inst_id: int, model_asst_id: str, direction: str = "src", page_size: int = TOPO_PAGE_SIZE, cursor: str = None
+    ):
+        """展开拓扑节点某种关联的子节点，direction: src 下游，dst 上游"""
+        if direction not in {"src", "dst"}:
+            raise BaseAppException("direction must be src or dst")
+        with Neo4jClient() as ag:
+            children, next_cursor = ag.topo_children(
+                INSTANCE, inst_id, model_asst_id, direction == "src", page_size, cursor
+            )
+        return dict(items=children, next_cursor=next_cursor)
+
     @staticmethod
     def create_or_update(data: dict):
         if not data["show_fields"]:
@@ -423,15 +501,22 @@ class InstanceManage(object):
 
     @staticmethod
     def model_inst_count(token):
+        """模型实例数量，由维护的计数汇总，不扫描图数据库"""
         permission_params = InstanceManage.get_permission_params(token)
-        with Neo4jClient() as ag:
-            data = ag.entity_count(INSTANCE, "model_id", [], permission_params=permission_params)
-        return data
+        # 超管无权限条件，统计全部
+        group_ids = None
+        for param in permission_params:
+            if param["field"] == ORGANIZATION:
+                group_ids = param["value"]
+        return InstanceCountManage.model_inst_count(group_ids)
 
     @staticmethod
-    def fulltext_search(token, search: str):
-        """全文检索"""
+    def fulltext_search(token, search: str, model_id: str = None, page: int = 1, page_size: int = FULLTEXT_PAGE_SIZE):
+        """全文检索，基于全文索引按相关度排序分页，并返回各模型的命中数"""
         permission_params = InstanceManage.get_permission_params(token)
+        _page = dict(skip=(page - 1) * page_size, limit=page_size)
         with Neo4jClient() as ag:
-            data = ag.full_text(search, permission_params=permission_params)
-        return data
+            items, count, model_counts = ag.full_text_search(
+                search, model_id=model_id, page=_page, permission_params=permission_params
+            )
+        return dict(count=count, items=items, model_counts=model_counts)
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+
+from apps.cmdb.constants import INSTANCE, ORGANIZATION
+from apps.cmdb.graph.neo4j import Neo4jClient
+from apps.cmdb.models.instance_count import InstanceCount
+
+logger = logging.getLogger("app")
+
+
+class InstanceCountManage(object):
+    @staticmethod
+    def organization_key(organization):
+        """将实例的所属组织转换为计数键"""
+        if organization is None or organization == "":
+            organization = []
+        elif not isinstance(organization, list):
+            organization = [organization]
+        return json.dumps(sorted(set(organization), key=str))
+
+    @staticmethod
+    def organization_hash(organization_key: str):
+        """计数键的摘要，用于唯一约束与查询"""
+        return hashlib.sha256(organization_key.encode()).hexdigest()
+
+    @staticmethod
+    def change(added: list = (), removed: list = ()):
+        """
+        根据新增与移除的实例增量更新计数
+        计数更新失败不影响实例的写入，只记录日志，由定时校准任务修正
+        """
+        deltas = Counter()
+        for instance in added:
+            deltas[(instance["model_id"], InstanceCountManage.organization_key(instance.get(ORGANIZATION)))] += 1
+        for instance in removed:
+            deltas[(instance["model_id"], InstanceCountManage.organization_key(instance.get(ORGANIZATION)))] -= 1
+
+        try:
+            # 按键排序更新，避免并发更新时死锁
+            for (model_id, organization), delta in sorted(deltas.items()):
+                if not delta:
+                    continue
+                obj, _ = InstanceCount.objects.get_or_create(
+                    model_id=model_id,
+                    organization_hash=InstanceCountManage.organization_hash(organization),
+                    defaults={"organization": organization},
+                )
+                InstanceCount.objects.filter(id=obj.id).update(count=F("count") + delta)
+        except Exception:
+            logger.exception("instance count update failed")
+
+    @staticmethod
+    def update_organization(before_list: list, after_list: list):
+        """实例更新后，所属组织发生变化时迁移计数"""
+        before_map = {i["_id"]: i for i in before_list}
+        added, removed = [], []
+        for after in after_list:
+            before = before_map.get(after["_id"])
+            if not before:
+                continue
+            before_key = InstanceCountManage.organization_key(before.get(ORGANIZATION))
+            if before_key == InstanceCountManage.organization_key(after.get(ORGANIZATION)):
+                continue
+            added.append(after)
+            removed.append(before)
+        InstanceCountManage.change(added, removed)
+
+    @staticmethod
+    def model_inst_count(group_ids: list = None):
+        """
+        汇总各模型的实例数量
+        group_ids为None时统计全部，否则只统计所属组织与group_ids有交集的实例
+        """
+        group_ids = set(group_ids) if group_ids is not None else None
+        result = Counter()
+        for obj in InstanceCount.objects.filter(count__gt=0).values("model_id", "organization", "count"):
+            if group_ids is not None and not group_ids & set(json.loads(obj["organization"])):
+                continue
+            result[obj["model_id"]] += obj["count"]
+        return dict(result)
+
+    @staticmethod
+    def reconcile():
+        """以图数据库为准校准计数，返回被修正的计数"""
+        with Neo4jClient() as ag:
+            data = ag.entity_group_count(INSTANCE, ["model_id", ORGANIZATION])
+
+        actual = Counter()
+        for item in data:
+            actual[(item["model_id"], InstanceCountManage.organization_key(item[ORGANIZATION]))] += item["count"]
+
+        corrected = []
+        with transaction.atomic():
+            exist_map = {(i.model_id, i.organization): i for i in InstanceCount.objects.select_for_update()}
+            for key, obj in exist_map.items():
+                count = actual.get(key, 0)
+                if obj.count == count:
+                    continue
+                corrected.append(dict(model_id=key[0], organization=key[1], before=obj.count, after=count))
+                if count:
+                    obj.count = count
+                    obj.save(update_fields=["count", "updated_at"])
+                else:
+                    obj.delete()
+
+            create_list = []
+            for (model_id, organization), count in actual.items():
+                if (model_id, organization) in exist_map:
+                    continue
+                corrected.append(dict(model_id=model_id, organization=organization, before=0, after=count))
+                create_list.append(
+                    InstanceCount(
+                        model_id=model_id,
+                        organization=organization,
+                        organization_hash=InstanceCountManage.organization_hash(organization),
+                        count=count,
+                    )
+                )
+            InstanceCount.objects.bulk_create(create_list)
+
+        return corrected
@@ -1,4 +1,5 @@
 import json
+import logging
 
 from apps.cmdb.constants import (
     CLASSIFICATION,
@@ -15,8 +16,13 @@ from apps.cmdb.constants import (
 from apps.cmdb.graph.neo4j import Neo4jClient
 from apps.cmdb.language.service import SettingLanguage
 from apps.cmdb.services.classification import ClassificationManage
+from apps.cmdb.services.schema import SchemaManage
+from apps.cmdb.utils.model_cache import ModelMetaCache
 from apps.core.exceptions.base_app_exception import BaseAppException
-from apps.core.utils.keycloak_client import KeyCloakClient
+from apps.core.utils.organization import OrganizationClosure
+from apps.core.utils.user_directory import user_option_cache
+
+logger = logging.getLogger("app")
 
 
 class ModelManage(object):
@@ -43,6 +49,7 @@ class ModelManage(object):
                 ),
                 "classification_model_asst_id",
             )
+        ModelMetaCache.bump_version()
         return result
 
     @staticmethod
@@ -52,6 +59,7 @@ class ModelManage(object):
         """
         with Neo4jClient() as ag:
             ag.batch_delete_entity(MODEL, [id])
+        ModelMetaCache.bump_version()
 
     @staticmethod
     def update_model(id: int, data: dict):
@@ -62,6 +70,7 @@ class ModelManage(object):
         with Neo4jClient() as ag:
             exist_items, _ = ag.query_entity(MODEL, [{"field": "model_id", "type": "str<>", "value": model_id}])
             model = ag.set_entity_properties(MODEL, [id], data, UPDATE_MODEL_CHECK_ATTR_MAP, exist_items)
+        ModelMetaCache.bump_version()
         return model[0]
 
     @staticmethod
@@ -99,6 +108,9 @@ class ModelManage(object):
             attrs.append(attr_info)
             result = ag.set_entity_properties(MODEL, [model_info["_id"]], dict(attrs=json.dumps(attrs)), {}, [], False)
 
+        ModelMetaCache.bump_version()
+        ModelManage.schedule_graph_schema_sync([attr_info["attr_id"]])
+
         attrs = ModelManage.parse_attrs(result[0].get("attrs", "[]"))
 
         attr = None
@@ -136,6 +148,9 @@ class ModelManage(object):
 
             result = ag.set_entity_properties(MODEL, [model_info["_id"]], dict(attrs=json.dumps(attrs)), {}, [], False)
 
+        # 可修改的字段不包含唯一性与属性类型，不影响索引与约束
+        ModelMetaCache.bump_version()
+
         attrs = ModelManage.parse_attrs(result[0].get("attrs", "[]"))
 
         attr = None
@@ -172,78 +187,131 @@ class ModelManage(object):
             model_params = [{"field": "model_id", "type": "str=", "value": model_id}]
             ag.remove_entitys_properties(INSTANCE, model_params, [attr_id])
 
+        ModelMetaCache.bump_version()
+        ModelManage.schedule_graph_schema_sync([attr_id])
+
         return ModelManage.parse_attrs(result[0].get("attrs", "[]"))
 
+    @staticmethod
+    def get_models_with_attrs():
+        """查询所有模型，并解析模型属性"""
+        with Neo4jClient() as ag:
+            models, _ = ag.query_entity(MODEL, [])
+        for model in models:
+            model["attrs"] = ModelManage.parse_attrs(model.get("attrs", "[]"))
+        return models
+
+    @staticmethod
+    def sync_graph_schema(attr_ids: list = None):
+        """根据模型属性同步图数据库的索引与约束，attr_ids 不为空时只同步这些属性相关的索引与约束"""
+        try:
+            return SchemaManage.sync_schema(ModelManage.get_models_with_attrs(), attr_ids)
+        except Exception:
+            logger.exception("sync graph schema failed")
+            return None
+
+    @staticmethod
+    def schedule_graph_schema_sync(attr_ids: list):
+        """
+        异步同步模型属性相关的索引与约束，创建索引/约束在数据量大时耗时较长，不阻塞模型属性的变更
+        投递失败或同步失败时由周期全量同步任务补偿
+        """
+        # 任务模块依赖ModelManage，在此处导入避免循环导入
+        from apps.cmdb.tasks.graph_schema_task import sync_graph_schema
+
+        try:
+            sync_graph_schema.delay(attr_ids)
+        except Exception:
+            logger.exception("schedule graph schema sync failed")
+
+    @staticmethod
+    def graph_schema_status():
+        """查询图数据库的索引与约束"""
+        return SchemaManage.schema_status(ModelManage.get_models_with_attrs())
+
     @staticmethod
     def search_model_info(model_id: str):
         """
         查询模型详情
         """
-        query_data = {"field": "model_id", "type": "str=", "value": model_id}
-        with Neo4jClient() as ag:
-            models, _ = ag.query_entity(MODEL, [query_data])
-        if len(models) == 0:
-            return {}
-        return models[0]
+
+        def query_model_info():
+            query_data = {"field": "model_id", "type": "str=", "value": model_id}
+            with Neo4jClient() as ag:
+                models, _ = ag.query_entity(MODEL, [query_data])
+            return models[0] if models else {}
+
+        return ModelMetaCache.get_or_set("info", model_id, query_model_info)
 
     @staticmethod
-    def get_organization_option(items: list, result: list):
-        for item in items:
-            result.append(
-                dict(
-                    id=item["id"],
-                    name=item["path"],
-                    is_default=False,
-                    type="str",
-                )
-            )
-            if item["subGroups"]:
-                ModelManage.get_organization_option(item["subGroups"], result)
+    def search_model_parsed_attrs(model_id: str):
+        """查询模型解析后的属性列表(缓存)"""
+        return ModelMetaCache.get_or_set(
+            "attrs",
+            model_id,
+            lambda: ModelManage.parse_attrs(ModelManage.search_model_info(model_id).get("attrs", "[]")),
+        )
+
+    @staticmethod
+    def get_check_attr_map(model_id: str):
+        """模型实例的校验属性映射(缓存): 唯一、必填、可编辑"""
+
+        def build_check_attr_map():
+            check_attr_map = dict(is_only={}, is_required={}, editable={})
+            for attr in ModelManage.search_model_attr(model_id):
+                if attr["is_only"]:
+                    check_attr_map["is_only"][attr["attr_id"]] = attr["attr_name"]
+                if attr["is_required"]:
+                    check_attr_map["is_required"][attr["attr_id"]] = attr["attr_name"]
+                if attr["editable"]:
+                    check_attr_map["editable"][attr["attr_id"]] = attr["attr_name"]
+            return check_attr_map
+
+        return ModelMetaCache.get_or_set("check_attr_map", model_id, build_check_attr_map)
+
+    @staticmethod
+    def get_organization_option():
+        """扁平化的组织选项，取自缓存的组织闭包"""
+        return list(OrganizationClosure.get().options)
+
+    @staticmethod
+    def get_user_option():
+        """用户选项，取自用户目录缓存"""
+        return list(user_option_cache.get())
 
     @staticmethod
     def search_model_attr(model_id: str, language: str = "en"):
         """
         查询模型属性
         """
-        model_info = ModelManage.search_model_info(model_id)
-        attrs = ModelManage.parse_attrs(model_info.get("attrs", "[]"))
-        lan = SettingLanguage(language)
-        model_attr = lan.get_val("ATTR", model_id)
-        for attr in attrs:
-            if model_attr:
-                attr["attr_name"] = model_attr.get(attr["attr_id"]) or attr["attr_name"]
-        return attrs
+
+        def translate_attrs():
+            attrs = ModelManage.search_model_parsed_attrs(model_id)
+            lan = SettingLanguage(language)
+            model_attr = lan.get_val("ATTR", model_id)
+            for attr in attrs:
+                if model_attr:
+                    attr["attr_name"] = model_attr.get(attr["attr_id"]) or attr["attr_name"]
+            return attrs
+
+        return ModelMetaCache.get_or_set(f"attrs_{language}", model_id, translate_attrs)
 
     @staticmethod
     def search_model_attr_v2(model_id: str):
         """
         查询模型属性
         """
-        model_info = ModelManage.search_model_info(model_id)
-        attrs = ModelManage.parse_attrs(model_info.get("attrs", "[]"))
+        attrs = ModelManage.search_model_parsed_attrs(model_id)
         attr_types = {attr["attr_type"] for attr in attrs}
 
         if ORGANIZATION in attr_types:
-            groups = KeyCloakClient().realm_client.get_groups({"search": ""})
-            # 获取默认的第一个根组织
-            groups = groups if groups else []
-            option = []
-            ModelManage.get_organization_option(groups, option)
+            option = ModelManage.get_organization_option()
             for attr in attrs:
                 if attr["attr_type"] == ORGANIZATION:
                     attr.update(option=option)
 
         if USER in attr_types:
-            users = KeyCloakClient().realm_client.get_users()
-            option = [
-                dict(
-                    id=user["username"],
-                    name=user["username"],
-                    is_default=False,
-                    type="str",
-                )
-                for user in users
-            ]
+            option = ModelManage.get_user_option()
             for attr in attrs:
                 if attr["attr_type"] == USER:
                     attr.update(option=option)
@@ -271,6 +339,7 @@ class ModelManage(object):
                     raise BaseAppException("model association repetition")
                 else:
                     raise BaseAppException(e.message)
+        ModelMetaCache.bump_version()
         return edge
 
     @staticmethod
@@ -280,36 +349,41 @@ class ModelManage(object):
         """
         with Neo4jClient() as ag:
             ag.delete_edge(id)
+        ModelMetaCache.bump_version()
 
     @staticmethod
     def model_association_info_search(model_asst_id: str):
         """
         查询模型关联详情
         """
-        with Neo4jClient() as ag:
-            query_data = {
-                "field": "model_asst_id",
-                "type": "str=",
-                "value": model_asst_id,
-            }
-            edges = ag.query_edge(MODEL_ASSOCIATION, [query_data])
-        if len(edges) == 0:
-            return {}
-        return edges[0]
+
+        def query_association_info():
+            with Neo4jClient() as ag:
+                query_data = {
+                    "field": "model_asst_id",
+                    "type": "str=",
+                    "value": model_asst_id,
+                }
+                edges = ag.query_edge(MODEL_ASSOCIATION, [query_data])
+            return edges[0] if edges else {}
+
+        return ModelMetaCache.get_or_set("association", model_asst_id, query_association_info)
 
     @staticmethod
     def model_association_search(model_id: str):
         """
         查询模型所有的关联
         """
-        query_list = [
-            {"field": "src_model_id", "type": "str=", "value": model_id},
-            {"field": "dst_model_id", "type": "str=", "value": model_id},
-        ]
-        with Neo4jClient() as ag:
-            edges = ag.query_edge(MODEL_ASSOCIATION, query_list, param_type="OR")
 
-        return edges
+        def query_associations():
+            query_list = [
+                {"field": "src_model_id", "type": "str=", "value": model_id},
+                {"field": "dst_model_id", "type": "str=", "value": model_id},
+            ]
+            with Neo4jClient() as ag:
+                return ag.query_edge(MODEL_ASSOCIATION, query_list, param_type="OR")
+
+        return ModelMetaCache.get_or_set("associations", model_id, query_associations)
 
     @staticmethod
     def check_model_exist_association(model_id):
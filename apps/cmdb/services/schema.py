@@ -0,0 +1,156 @@
+from apps.cmdb.constants import (
+    EDGE_INDEX_FIELDS,
+    FULLTEXT_ATTR_TYPES,
+    FULLTEXT_INDEX_NAME,
+    GRAPH_SCHEMA_PREFIX,
+    INSTANCE,
+    NODE_INDEX_FIELDS,
+    ORGANIZATION_NODE,
+)
+from apps.cmdb.graph.neo4j import Neo4jClient
+
+INDEX = "index"
+CONSTRAINT = "constraint"
+FULLTEXT = "fulltext"
+
+
+class SchemaManage(object):
+    @staticmethod
+    def schema_name(kind: str, label: str, properties: list):
+        """生成索引/约束名称"""
+        kind_str = "uniq" if kind == CONSTRAINT else "idx"
+        return f"{GRAPH_SCHEMA_PREFIX}_{kind_str}_{label}_{'_'.join(properties)}"
+
+    @staticmethod
+    def desired_schema(models: list):
+        """
+        根据模型属性元数据计算应存在的索引与约束
+        models: 模型列表，attrs为解析后的属性列表
+        实例共用一个标签，唯一约束无法按模型区分，所以只有在所有定义了该属性的模型中都为is_only时，
+        才建立 (model_id, attr) 复合唯一约束，否则建立 (model_id, attr) 复合索引
+        """
+        schema = {}
+
+        def add(kind, label, properties, is_edge=False):
+            name = SchemaManage.schema_name(kind, label, properties)
+            schema[name] = dict(kind=kind, label=label, properties=properties, is_edge=is_edge)
+
+        for label, fields in NODE_INDEX_FIELDS.items():
+            for field in fields:
+                add(INDEX, label, [field])
+
+        # 组织节点按id合并(MERGE)与过滤，唯一约束同时提供索引
+        add(CONSTRAINT, ORGANIZATION_NODE, ["id"])
+
+        for label, fields in EDGE_INDEX_FIELDS.items():
+            for field in fields:
+                add(INDEX, label, [field], is_edge=True)
+
+        attr_only_map = {}
+        for model in models:
+            for attr in model.get("attrs", []):
+                if attr["attr_id"] == "model_id":
+                    continue
+                only_list = attr_only_map.setdefault(attr["attr_id"], [])
+                only_list.append(bool(attr.get("is_only")))
+
+        for attr_id, only_list in attr_only_map.items():
+            kind = CONSTRAINT if all(only_list) else INDEX
+            add(kind, INSTANCE, ["model_id", attr_id])
+
+        # 所有模型的字符串属性共用一个实例全文索引
+        fulltext_attrs = sorted(
+            {
+                attr["attr_id"]
+                for model in models
+                for attr in model.get("attrs", [])
+                if attr["attr_type"] in FULLTEXT_ATTR_TYPES
+            }
+        )
+        if fulltext_attrs:
+            schema[FULLTEXT_INDEX_NAME] = dict(kind=FULLTEXT, label=INSTANCE, properties=fulltext_attrs, is_edge=False)
+
+        return schema
+
+    @staticmethod
+    def schema_status(models: list):
+        """查询图数据库当前的索引与约束，以及缺失的受管对象"""
+        desired = SchemaManage.desired_schema(models)
+        with Neo4jClient() as ag:
+            indexes = ag.show_indexes()
+            constraints = ag.show_constraints()
+
+        exist_names = {i["name"] for i in indexes} | {i["name"] for i in constraints}
+        missing = [dict(name=name, **spec) for name, spec in desired.items() if name not in exist_names]
+        return dict(indexes=indexes, constraints=constraints, missing=missing)
+
+    @staticmethod
+    def attr_schema_names(attr_ids: list):
+        """模型属性相关的受管对象名称：(model_id, attr) 复合唯一约束或复合索引，以及实例全文索引"""
+        names = {FULLTEXT_INDEX_NAME}
+        for attr_id in attr_ids:
+            names.add(SchemaManage.schema_name(CONSTRAINT, INSTANCE, ["model_id", attr_id]))
+            names.add(SchemaManage.schema_name(INDEX, INSTANCE, ["model_id", attr_id]))
+        return names
+
+    @staticmethod
+    def sync_schema(models: list, attr_ids: list = None):
+        """
+        同步索引与约束: 删除不再需要的受管对象，创建缺失的对象
+        唯一约束创建失败(如已有重复数据)时，退化为创建复合索引
+        attr_ids 不为空时只同步这些模型属性相关的对象
+        """
+        desired = SchemaManage.desired_schema(models)
+        result = dict(created=[], dropped=[], failed=[])
+        scope = SchemaManage.attr_schema_names(attr_ids) if attr_ids else None
+
+        def in_scope(name):
+            return scope is None or name in scope
+
+        with Neo4jClient() as ag:
+            exist_constraints = {i["name"] for i in ag.show_constraints()}
+            exist_indexes = {i["name"]: i for i in ag.show_indexes()}
+
+            # 先删除约束，约束所属的索引会一同删除
+            for name in exist_constraints:
+                if name.startswith(GRAPH_SCHEMA_PREFIX) and name not in desired and in_scope(name):
+                    ag.drop_constraint(name)
+                    result["dropped"].append(name)
+
+            for name, index_info in list(exist_indexes.items()):
+                if index_info.get("owningConstraint") or name in exist_constraints:
+                    continue
+                if not name.startswith(GRAPH_SCHEMA_PREFIX) or not in_scope(name):
+                    continue
+                # 全文索引的属性无法修改，属性变化时删除重建
+                stale = name not in desired or (
+                    desired[name]["kind"] == FULLTEXT
+                    and sorted(index_info.get("properties") or []) != desired[name]["properties"]
+                )
+                if stale:
+                    ag.drop_index(name)
+                    exist_indexes.pop(name)
+                    result["dropped"].append(name)
+
+            for name, spec in desired.items():
+                if name in exist_constraints or name in exist_indexes or not in_scope(name):
+                    continue
+                try:
+                    if spec["kind"] == CONSTRAINT:
+                        ag.create_unique_constraint(name, spec["label"], spec["properties"])
+                    elif spec["kind"] == FULLTEXT:
+                        ag.create_fulltext_index(name, spec["label"], spec["properties"])
+                    else:
+                        ag.create_index(name, spec["label"], spec["properties"], spec["is_edge"])
+                    result["created"].append(name)
+                except Exception as e:
+                    result["failed"].append(dict(name=name, error=str(e)))
+                    if spec["kind"] != CONSTRAINT:
+                        continue
+                    index_name = SchemaManage.schema_name(INDEX, spec["label"], spec["properties"])
+                    if index_name in exist_indexes:
+                        continue
+                    ag.create_index(index_name, spec["label"], spec["properties"])
+                    result["created"].append(index_name)
+
+        return result
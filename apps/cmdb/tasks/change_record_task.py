@@ -0,0 +1,39 @@
+import logging
+
+from celery import shared_task
+
+from apps.cmdb.constants import CHANGE_RECORD_PARTITION_PREMAKE_MONTHS
+from apps.cmdb.utils.change_record_partition import ChangeRecordPartition
+from apps.cmdb.utils.change_record_writer import ChangeRecordWriter
+from config.default import CHANGE_RECORD_ARCHIVE, CHANGE_RECORD_ARCHIVE_DIR, CHANGE_RECORD_RETENTION_MONTHS
+
+logger = logging.getLogger("app")
+
+
+@shared_task
+def replay_change_record():
+    """
+    补写磁盘上遗留的变更记录(写入失败或进程退出前未写入的记录)
+    :return:
+    """
+    ChangeRecordWriter.instance().replay()
+
+
+@shared_task
+def maintain_change_record_partition():
+    """
+    维护变更记录月分区：创建后续月份的分区，归档并删除超出保留期的分区
+    :return:
+    """
+    if not ChangeRecordPartition.is_partitioned():
+        return []
+    created = ChangeRecordPartition.ensure_partitions(CHANGE_RECORD_PARTITION_PREMAKE_MONTHS)
+    if created:
+        logger.info(f"change record partitions created: {created}")
+    if CHANGE_RECORD_RETENTION_MONTHS <= 0:
+        return []
+    archive_dir = CHANGE_RECORD_ARCHIVE_DIR if CHANGE_RECORD_ARCHIVE else ""
+    expired = ChangeRecordPartition.expire(CHANGE_RECORD_RETENTION_MONTHS, archive_dir)
+    if expired:
+        logger.info(f"change record partitions expired: {expired}")
+    return expired
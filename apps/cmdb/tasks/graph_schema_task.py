@@ -0,0 +1,20 @@
+import logging
+
+from celery import shared_task
+
+from apps.cmdb.services.model import ModelManage
+
+logger = logging.getLogger("app")
+
+
+@shared_task
+def sync_graph_schema(attr_ids: list = None):
+    """
+    根据模型属性同步图数据库的索引与约束
+    :param attr_ids: 只同步这些模型属性相关的索引与约束，为空时全量同步
+    :return:
+    """
+    result = ModelManage.sync_graph_schema(attr_ids)
+    if result and (result["created"] or result["dropped"] or result["failed"]):
+        logger.info(f"graph schema synced: {result}")
+    return result
@@ -0,0 +1,19 @@
+import logging
+
+from celery import shared_task
+
+from apps.cmdb.services.instance_count import InstanceCountManage
+
+logger = logging.getLogger("app")
+
+
+@shared_task
+def reconcile_instance_count():
+    """
+    定期校准实例计数，修正增量更新失败等原因造成的偏差
+    :return:
+    """
+    corrected = InstanceCountManage.reconcile()
+    if corrected:
+        logger.info(f"instance count corrected: {corrected}")
+    return len(corrected)
@@ -1,3 +1,124 @@
-# from django.test import TestCase
+from datetime import timedelta
+from unittest import skipUnless
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.cmdb.models.change_record import (
+    CREATE_INST,
+    CREATE_INST_ASST,
+    DELETE_INST,
+    SNAPSHOT_INST,
+    UPDATE_INST,
+    ChangeRecord,
+)
+from apps.cmdb.services.change_record import ChangeRecordManage
+from apps.cmdb.utils.change_record import restore_change_records
+from apps.cmdb.utils.change_record_partition import ChangeRecordPartition
+
+
+def create_record(created_at, _type=UPDATE_INST, inst_id=1, before_data=None, after_data=None, snapshot=True):
+    return ChangeRecord.objects.create(
+        inst_id=inst_id,
+        model_id="host",
+        label="instance",
+        type=_type,
+        before_data=before_data or {},
+        after_data=after_data or {},
+        snapshot=snapshot,
+        created_at=created_at,
+    )
+
+
+@skipUnless(connection.vendor == "postgresql", "change record partitions require PostgreSQL")
+class ChangeRecordPartitionTestCase(TestCase):
+    def setUp(self):
+        # 保留2个月时，3个月前的分区过期，2个月前的分区保留
+        self.expired_month = ChangeRecordPartition.add_months(ChangeRecordPartition.month_start(), -3)
+        self.kept_month = ChangeRecordPartition.add_months(self.expired_month, 1)
+        ChangeRecordPartition.create_partition(self.expired_month)
+        ChangeRecordPartition.create_partition(self.kept_month)
+
+    def test_restore_delta_after_expire(self):
+        day = timedelta(days=1)
+        edge = {"src": {"_id": 1}, "edge": {"_id": 10}, "dst": {"_id": 2}}
+        create_record(self.expired_month + day, CREATE_INST, after_data={"inst_name": "a", "ip": "1"})
+        create_record(self.expired_month + 2 * day, before_data={"ip": "1"}, after_data={"ip": "2"}, snapshot=False)
+        create_record(self.expired_month + 3 * day, CREATE_INST_ASST, after_data=edge)
+        # 已删除的实例不需要检查点
+        create_record(self.expired_month + day, CREATE_INST, inst_id=2, after_data={"inst_name": "b"})
+        create_record(self.expired_month + 2 * day, DELETE_INST, inst_id=2, before_data={"inst_name": "b"})
+        delta = create_record(
+            self.kept_month + day, before_data={"inst_name": "a"}, after_data={"inst_name": "c"}, snapshot=False
+        )
+
+        expired = ChangeRecordPartition.expire(retention_months=2)
+
+        self.assertEqual(expired, [ChangeRecordPartition.partition_name(self.expired_month)])
+        checkpoints = ChangeRecord.objects.filter(type=SNAPSHOT_INST)
+        self.assertEqual([i.inst_id for i in checkpoints], [1])
+
+        delta = ChangeRecord.objects.get(id=delta.id)
+        restore_change_records([delta])
+        self.assertFalse(getattr(delta, "partial", False))
+        self.assertEqual(delta.before_data, {"inst_name": "a", "ip": "2"})
+        self.assertEqual(delta.after_data, {"inst_name": "c", "ip": "2"})
+
+        state = ChangeRecordManage.instance_state(1, self.kept_month + 2 * day)
+        self.assertEqual(state["data"], {"inst_name": "c", "ip": "2"})
+        self.assertEqual(state["associations"], [edge])
+        self.assertIsNone(ChangeRecordManage.instance_state(2, self.kept_month + 2 * day))
+
+    def test_restore_delta_without_snapshot(self):
+        delta = create_record(
+            self.kept_month + timedelta(days=1), before_data={"ip": "1"}, after_data={"ip": "2"}, snapshot=False
+        )
+        restore_change_records([delta])
+        self.assertTrue(delta.partial)
+        self.assertEqual(delta.after_data, {"ip": "2"})
+
+
+@skipUnless(connection.vendor == "postgresql", "change records are partitioned on PostgreSQL")
+class ChangeRecordStateTestCase(TestCase):
+    def test_associations_start_from_create(self):
+        now, second = timezone.now(), timedelta(seconds=1)
+        old_edge = {"src": {"_id": 1}, "edge": {"_id": 10}, "dst": {"_id": 2}}
+        new_edge = {"src": {"_id": 1}, "edge": {"_id": 11}, "dst": {"_id": 3}}
+        create_record(now - 5 * second, CREATE_INST, after_data={"inst_name": "a"})
+        create_record(now - 4 * second, CREATE_INST_ASST, after_data=old_edge)
+        create_record(now - 3 * second, DELETE_INST, before_data={"inst_name": "a"})
+        # 实例ID被重新使用，之前的关联不属于新实例
+        create_record(now - 2 * second, CREATE_INST, after_data={"inst_name": "b"})
+        create_record(now - second, CREATE_INST_ASST, after_data=new_edge)
+
+        state = ChangeRecordManage.instance_state(1, now)
+        self.assertEqual(state["data"], {"inst_name": "b"})
+        self.assertFalse(state["partial"])
+        self.assertEqual(state["associations"], [new_edge])
+        self.assertEqual(ChangeRecordManage.instance_associations(1, now - 4 * second), [old_edge])
+
+    def test_model_states_start_from_latest_snapshot(self):
+        now, second = timezone.now(), timedelta(seconds=1)
+        create_record(now - 5 * second, CREATE_INST, after_data={"inst_name": "a", "ip": "1"})
+        create_record(now - 4 * second, before_data={"ip": "1"}, after_data={"ip": "2"}, snapshot=False)
+        create_record(now - 3 * second, after_data={"inst_name": "a", "ip": "3"})
+        create_record(now - 2 * second, before_data={"ip": "3"}, after_data={"ip": "4"}, snapshot=False)
+        create_record(now - 5 * second, CREATE_INST, inst_id=2, after_data={"inst_name": "b"})
+        create_record(now - 4 * second, DELETE_INST, inst_id=2, before_data={"inst_name": "b"})
+        create_record(now - 5 * second, CREATE_INST, inst_id=3, after_data={"inst_name": "c"})
+        create_record(now + second, inst_id=3, before_data={"inst_name": "c"}, after_data={"inst_name": "d"})
+
+        snapshots = list(ChangeRecordManage.model_snapshot_queryset("host", now))
+        self.assertEqual(
+            [(i.inst_id, i.type) for i in snapshots], [(1, UPDATE_INST), (2, DELETE_INST), (3, CREATE_INST)]
+        )
+
+        states = ChangeRecordManage.model_instance_states(snapshots, now)
+        self.assertEqual(
+            [(i["inst_id"], i["data"]) for i in states],
+            [(1, {"inst_name": "a", "ip": "4"}), (3, {"inst_name": "c"})],
+        )
+        # 按实例ID游标翻页
+        snapshots = ChangeRecordManage.model_snapshot_queryset("host", now).filter(inst_id__gt=1)
+        self.assertEqual([i.inst_id for i in snapshots[:1]], [2])
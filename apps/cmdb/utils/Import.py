@@ -2,19 +2,19 @@ import ast
 
 import openpyxl
 
-from apps.cmdb.constants import INSTANCE, NEED_CONVERSION_TYPE, ORGANIZATION, USER
+from apps.cmdb.constants import BATCH_WRITE_CHUNK_SIZE, INSTANCE, NEED_CONVERSION_TYPE, ORGANIZATION, USER
 from apps.cmdb.graph.neo4j import Neo4jClient
 
 
 class Import:
-    def __init__(self, model_id, attrs, exist_items, operator):
+    def __init__(self, model_id, attrs, operator, chunk_size=BATCH_WRITE_CHUNK_SIZE):
         self.model_id = model_id
         self.attrs = attrs
-        self.exist_items = exist_items
         self.operator = operator
+        self.chunk_size = chunk_size
 
     def format_excel_data(self, excel_meta: bytes):
-        """格式化excel"""
+        """格式化excel，逐行生成实例数据"""
 
         need_val_to_id_field_map, need_update_type_field_map = {}, {}
 
@@ -26,54 +26,69 @@ class Import:
             if attr_info["attr_type"] in {ORGANIZATION, USER}:
                 need_val_to_id_field_map[attr_info["attr_id"]] = {i["name"]: i["id"] for i in attr_info["option"]}
 
-        # 读取临时文件
-        wb = openpyxl.load_workbook(excel_meta)
-        # 获取第一个工作表
-        sheet1 = wb.worksheets[0]
-        # 获取键
-        keys = [cell.value for cell in sheet1[2]]
-        result = []
-        # 从第4行第1列开始遍历
-        for row in sheet1.iter_rows(min_row=3, min_col=0):
-            # 创建字典
-            item = {"model_id": self.model_id}
-            # 遍历每一列
-            for i, cell in enumerate(row):
-                try:
-                    value = ast.literal_eval(cell.value)
-                except Exception:
-                    value = cell.value
-
-                if not value:
+        # 以只读模式读取临时文件，按行惰性解析
+        wb = openpyxl.load_workbook(excel_meta, read_only=True)
+        try:
+            # 获取第一个工作表
+            sheet1 = wb.worksheets[0]
+            # 获取键
+            keys = next(sheet1.iter_rows(min_row=2, max_row=2, values_only=True), ())
+            # 从第3行开始遍历
+            for row in sheet1.iter_rows(min_row=3, values_only=True):
+                # 跳过空行
+                if not any(i not in (None, "") for i in row):
                     continue
-
-                # 将需要类型转换的键和值存入字典
-                if keys[i] in need_update_type_field_map:
-                    method = NEED_CONVERSION_TYPE[need_update_type_field_map[keys[i]]]
-                    item[keys[i]] = method(value)
-                    continue
-
-                # 将需要枚举字段name与id反转的建和值存入字典
-                if keys[i] in need_val_to_id_field_map:
-                    if type(value) != list:
-                        value_list = [value]
-                    else:
-                        value_list = value
-                    enum_id = [need_val_to_id_field_map[keys[i]].get(j) for j in value_list]
-                    if enum_id:
-                        item[keys[i]] = enum_id
-                    continue
-
-                # 将键和值存入字典
-                item[keys[i]] = value
-            # 将字典添加到结果列表中
-            if not item:
-                continue
-            result.append(item)
-        return result
-
-    def inst_list_save(self, inst_list):
-        """实例列表保存"""
+                # 创建字典
+                item = {"model_id": self.model_id}
+                # 遍历每一列
+                for i, cell_value in enumerate(row):
+                    if i >= len(keys) or not keys[i]:
+                        continue
+
+                    try:
+                        value = ast.literal_eval(cell_value)
+                    except Exception:
+                        value = cell_value
+
+                    if not value:
+                        continue
+
+                    # 将需要类型转换的键和值存入字典
+                    if keys[i] in need_update_type_field_map:
+                        method = NEED_CONVERSION_TYPE[need_update_type_field_map[keys[i]]]
+                        item[keys[i]] = method(value)
+                        continue
+
+                    # 将需要枚举字段name与id反转的建和值存入字典
+                    if keys[i] in need_val_to_id_field_map:
+                        if type(value) != list:
+                            value_list = [value]
+                        else:
+                            value_list = value
+                        enum_id = [need_val_to_id_field_map[keys[i]].get(j) for j in value_list]
+                        if enum_id:
+                            item[keys[i]] = enum_id
+                        continue
+
+                    # 将键和值存入字典
+                    item[keys[i]] = value
+                yield item
+        finally:
+            wb.close()
+
+    def iter_chunks(self, inst_iter):
+        """将实例按批次分组"""
+        chunk = []
+        for item in inst_iter:
+            chunk.append(item)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def inst_list_save(self, inst_list, index_offset=0):
+        """实例列表保存，一个批次在一个事务中提交"""
 
         check_attr_map = dict(is_only={}, is_required={})
         for attr in self.attrs:
@@ -83,11 +98,21 @@ class Import:
                 check_attr_map["is_required"][attr["attr_id"]] = attr["attr_name"]
 
         with Neo4jClient() as ag:
-            result = ag.batch_create_entity(INSTANCE, inst_list, check_attr_map, self.exist_items, self.operator)
+            # 只查询与导入数据唯一属性冲突的实例
+            exist_items = ag.query_unique_collisions(
+                INSTANCE,
+                [{"field": "model_id", "type": "str=", "value": self.model_id}],
+                check_attr_map["is_only"],
+                inst_list,
+            )
+            result = ag.batch_create_entity(
+                INSTANCE, inst_list, check_attr_map, exist_items, self.operator, index_offset=index_offset
+            )
         return result
 
     def import_inst_list(self, file_stream: bytes):
-        """将excel主机数据导入"""
-        inst_list = self.format_excel_data(file_stream)
-        result = self.inst_list_save(inst_list)
-        return result
+        """将excel主机数据导入，边解析边按批次写入，逐批返回结果"""
+        index_offset = 0
+        for inst_list in self.iter_chunks(self.format_excel_data(file_stream)):
+            yield self.inst_list_save(inst_list, index_offset)
+            index_offset += len(inst_list)
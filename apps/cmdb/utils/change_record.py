@@ -1,4 +1,193 @@
-from apps.cmdb.models.change_record import CREATE_INST_ASST, ChangeRecord
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.cmdb.constants import (
+    CHANGE_RECORD_REPLAY_CHUNK_SIZE,
+    CHANGE_RECORD_SEQ_CACHE_KEY,
+    CHANGE_RECORD_SEQ_CACHE_TTL,
+    CHANGE_RECORD_SNAPSHOT_INTERVAL,
+)
+from apps.cmdb.models.change_record import (
+    CREATE_INST,
+    CREATE_INST_ASST,
+    DELETE_INST,
+    DELETE_INST_ASST,
+    SNAPSHOT_INST,
+    UPDATE_INST,
+    ChangeRecord,
+)
+from apps.cmdb.utils.change_record_writer import ChangeRecordWriter
+
+# 记录实例状态的变更类型，按时间顺序组成快照与变化链
+STATE_TYPES = [CREATE_INST, UPDATE_INST, SNAPSHOT_INST]
+# 关联关系的变更类型
+ASSO_TYPES = [CREATE_INST_ASST, DELETE_INST_ASST]
+
+
+def diff_data(before_data: dict, after_data: dict):
+    """计算实例修改前后变化的属性，返回变化属性修改前的值与修改后的值，被移除的属性只出现在修改前"""
+    keys = {k for k in before_data.keys() | after_data.keys() if before_data.get(k, ...) != after_data.get(k, ...)}
+    return (
+        {k: before_data[k] for k in keys if k in before_data},
+        {k: after_data[k] for k in keys if k in after_data},
+    )
+
+
+def apply_delta(data: dict, before_delta: dict, after_delta: dict):
+    """将变化应用到实例数据上，返回新的实例数据"""
+    result = {k: v for k, v in data.items() if k not in before_delta}
+    result.update(after_delta)
+    return result
+
+
+def apply_state_record(data, record: ChangeRecord):
+    """将一条实例变更记录应用到实例数据上，返回新的实例数据，实例已删除时返回None"""
+    if record.type == DELETE_INST:
+        return None
+    if record.snapshot:
+        return dict(record.after_data or record.before_data)
+    return apply_delta(data or {}, record.before_data, record.after_data)
+
+
+def apply_asso_record(associations: dict, record: ChangeRecord):
+    """将一条关联变更记录应用到 关联ID -> 关联信息 的字典上"""
+    if record.type == CREATE_INST_ASST:
+        associations[record.after_data["edge"]["_id"]] = record.after_data
+    else:
+        associations.pop(record.before_data["edge"]["_id"], None)
+
+
+def seq_cache_key(inst_id):
+    return f"{CHANGE_RECORD_SEQ_CACHE_KEY}:{inst_id}"
+
+
+def encode_update_records(change_records: list):
+    """
+    将实例修改记录编码为只包含变化属性的记录
+    每个实例每隔 CHANGE_RECORD_SNAPSHOT_INTERVAL 条修改记录保存一次完整快照，缓存丢失时同样保存完整快照
+    """
+    keys = {i["inst_id"]: seq_cache_key(i["inst_id"]) for i in change_records}
+    seq_map = cache.get_many(keys.values())
+    for change_record in change_records:
+        key = keys[change_record["inst_id"]]
+        seq = seq_map.get(key)
+        if seq is None or seq + 1 >= CHANGE_RECORD_SNAPSHOT_INTERVAL or not change_record.get("before_data"):
+            seq_map[key] = 0
+            continue
+        seq_map[key] = seq + 1
+        change_record["before_data"], change_record["after_data"] = diff_data(
+            change_record["before_data"], change_record.get("after_data") or {}
+        )
+        change_record["snapshot"] = False
+    cache.set_many(seq_map, CHANGE_RECORD_SEQ_CACHE_TTL)
+
+
+def track_snapshot_seq(_type, change_records: list):
+    """维护实例距上次完整快照的修改次数：创建记录即为完整快照，删除后不再需要"""
+    if _type == UPDATE_INST:
+        encode_update_records(change_records)
+    elif _type == CREATE_INST:
+        cache.set_many({seq_cache_key(i["inst_id"]): 0 for i in change_records}, CHANGE_RECORD_SEQ_CACHE_TTL)
+    elif _type == DELETE_INST:
+        cache.delete_many([seq_cache_key(i["inst_id"]) for i in change_records])
+
+
+def record_key(record: ChangeRecord):
+    return record.created_at, record.id
+
+
+def after_record(record: ChangeRecord):
+    """按(创建时间, ID)顺序在该记录之后的查询条件"""
+    return Q(created_at__gt=record.created_at) | Q(created_at=record.created_at, id__gt=record.id)
+
+
+def restore_change_records(records: list):
+    """
+    还原只包含变化属性的记录为完整的变更前后数据(仅修改内存中的对象)
+    按实例从最近的完整快照开始依次应用变化；找不到快照的记录不还原，partial 置为True
+    """
+    inst_records = {}
+    for record in records:
+        if record.snapshot or getattr(record, "restored", False):
+            continue
+        inst_records.setdefault(record.inst_id, []).append(record)
+
+    for inst_id, delta_records in inst_records.items():
+        restore_inst_change_records(inst_id, delta_records)
+
+
+def restore_inst_change_records(inst_id: int, delta_records: list):
+    """还原单个实例的变更记录"""
+    targets = {i.id: i for i in delta_records}
+    first, last = min(delta_records, key=record_key), max(delta_records, key=record_key)
+
+    # 从最后一条需要还原的记录向前读取，直到第一条需要还原的记录之前的完整快照
+    chain = []
+    queryset = ChangeRecord.objects.filter(
+        inst_id=inst_id, type__in=STATE_TYPES, created_at__lte=last.created_at
+    ).order_by("-created_at", "-id")
+    for record in queryset.iterator(chunk_size=CHANGE_RECORD_SNAPSHOT_INTERVAL + 1):
+        if record_key(record) > record_key(last):
+            continue
+        chain.append(record)
+        if record.snapshot and record_key(record) < record_key(first):
+            break
+
+    # 快照已被清理时无法还原，这些记录保持只包含变化属性，并标记为不完整
+    data = None
+    for record in reversed(chain):
+        target = targets.get(record.id)
+        if not record.snapshot and data is None:
+            if target is not None:
+                target.restored, target.partial = True, True
+            continue
+        before_data = data
+        data = apply_state_record(data, record)
+        if target is not None:
+            target.before_data, target.after_data, target.restored = before_data, data, True
+
+
+def compact_change_records(batch_size: int = 1000):
+    """
+    将历史的完整修改记录按批次转换为只包含变化属性的记录，保留与写入时相同间隔的完整快照
+    按(创建时间, ID)顺序游标读取，可重复执行
+    """
+    seq_map, cursor, converted = {}, None, 0
+    queryset = ChangeRecord.objects.filter(type__in=STATE_TYPES + [DELETE_INST]).order_by("created_at", "id")
+    while True:
+        batch_queryset = queryset
+        if cursor is not None:
+            batch_queryset = queryset.filter(Q(created_at__gt=cursor[0]) | Q(created_at=cursor[0], id__gt=cursor[1]))
+        records = list(batch_queryset[:batch_size])
+        if not records:
+            break
+        cursor = record_key(records[-1])
+
+        update_records = []
+        for record in records:
+            if record.type == DELETE_INST:
+                seq_map.pop(record.inst_id, None)
+                continue
+            seq = seq_map.get(record.inst_id)
+            if not record.snapshot:
+                # 已转换过的记录
+                seq_map[record.inst_id] = (seq or 0) + 1
+                continue
+            if record.type != UPDATE_INST or seq is None or seq + 1 >= CHANGE_RECORD_SNAPSHOT_INTERVAL:
+                seq_map[record.inst_id] = 0
+                continue
+            seq_map[record.inst_id] = seq + 1
+            record.before_data, record.after_data = diff_data(record.before_data, record.after_data)
+            record.snapshot = False
+            update_records.append(record)
+
+        with transaction.atomic():
+            ChangeRecord.objects.bulk_update(update_records, ["before_data", "after_data", "snapshot"])
+        converted += len(update_records)
+
+    return converted
 
 
 def create_change_record(inst_id, model_id, label, _type, before_data=None, after_data=None, operator=""):
@@ -8,21 +197,28 @@ def create_change_record(inst_id, model_id, label, _type, before_data=None, afte
         change_data["before_data"] = before_data
     if after_data:
         change_data["after_data"] = after_data
-    ChangeRecord.objects.create(inst_id=inst_id, model_id=model_id, label=label, type=_type, **change_data)
+    change_records = [
+        dict(inst_id=inst_id, model_id=model_id, label=label, type=_type, created_at=timezone.now(), **change_data)
+    ]
+    track_snapshot_seq(_type, change_records)
+    ChangeRecordWriter.instance().enqueue(change_records)
 
 
 def batch_create_change_record(label, _type, change_records, operator=""):
     """创建实例变更记录"""
+    created_at = timezone.now()
     batch_change_data = [
-        ChangeRecord(label=label, type=_type, operator=operator, **change_record) for change_record in change_records
+        dict(label=label, type=_type, operator=operator, created_at=created_at, **change_record)
+        for change_record in change_records
     ]
-    ChangeRecord.objects.bulk_create(batch_change_data)
+    track_snapshot_seq(_type, batch_change_data)
+    ChangeRecordWriter.instance().enqueue(batch_change_data)
 
 
 def create_change_record_by_asso(label, _type, data, operator=""):
     """创建关联关系变更记录"""
 
-    change_data = {"operator": operator}
+    change_data = {"operator": operator, "created_at": timezone.now()}
 
     if _type == CREATE_INST_ASST:
         change_data["after_data"] = data
@@ -30,9 +226,53 @@ def create_change_record_by_asso(label, _type, data, operator=""):
         change_data["before_data"] = data
 
     batch_change_data = [
-        ChangeRecord(inst_id=inst_info["_id"], model_id=inst_info["model_id"], label=label, type=_type, **change_data)
+        dict(inst_id=inst_info["_id"], model_id=inst_info["model_id"], label=label, type=_type, **change_data)
         for inst_info in [data["src"], data["dst"]]
         if inst_info.get("model_id")
     ]
 
-    ChangeRecord.objects.bulk_create(batch_change_data)
+    ChangeRecordWriter.instance().enqueue(batch_change_data)
+
+
+def build_checkpoints(start, end):
+    """
+    回放[start, end)内的变更记录，为时间段结束时仍存在的实例生成检查点记录(创建时间为end)
+    用于删除该时间段的记录前保留之后的变化记录与关联还原所需的完整数据
+    """
+    queryset = ChangeRecord.objects.filter(created_at__gte=start, created_at__lt=end).order_by(
+        "inst_id", "created_at", "id"
+    )
+    inst_id, data, associations, state_record = None, None, {}, None
+    for record in queryset.iterator(chunk_size=CHANGE_RECORD_REPLAY_CHUNK_SIZE):
+        if record.inst_id != inst_id:
+            if data is not None:
+                yield checkpoint_record(state_record, data, associations, end)
+            inst_id, data, associations, state_record = record.inst_id, None, {}, None
+
+        if record.type in ASSO_TYPES:
+            apply_asso_record(associations, record)
+            continue
+        # 变化记录之前的快照已被清理时无法得到完整数据，不生成检查点
+        if not record.snapshot and data is None:
+            continue
+        data, state_record = apply_state_record(data, record), record
+        if record.type == SNAPSHOT_INST:
+            associations = {i["edge"]["_id"]: i for i in record.before_data.get("associations", [])}
+        elif record.type != UPDATE_INST:
+            associations = {}
+
+    if data is not None:
+        yield checkpoint_record(state_record, data, associations, end)
+
+
+def checkpoint_record(state_record: ChangeRecord, data: dict, associations: dict, created_at):
+    return ChangeRecord(
+        inst_id=state_record.inst_id,
+        model_id=state_record.model_id,
+        label=state_record.label,
+        type=SNAPSHOT_INST,
+        before_data={"associations": list(associations.values())},
+        after_data=data,
+        snapshot=True,
+        created_at=created_at,
+    )
@@ -0,0 +1,152 @@
+import gzip
+import logging
+import os
+import re
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.cmdb.models.change_record import ChangeRecord
+from apps.cmdb.utils.change_record import build_checkpoints
+
+logger = logging.getLogger("app")
+
+
+class ChangeRecordPartition(object):
+    """
+    变更记录月分区管理(PostgreSQL)
+    分区名为 {表名}_pYYYYMM，按当前时区的自然月划分；另有默认分区存放未创建月份分区的数据
+    """
+
+    table = ChangeRecord._meta.db_table
+    default_partition = f"{table}_default"
+    # 归档时每次从数据库读取的行数
+    archive_chunk_size = 2000
+
+    @staticmethod
+    def month_start(value=None):
+        return timezone.localtime(value).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def add_months(month, months: int):
+        index = month.year * 12 + month.month - 1 + months
+        return month.replace(year=index // 12, month=index % 12 + 1)
+
+    @classmethod
+    def partition_name(cls, month):
+        return f"{cls.table}_p{month:%Y%m}"
+
+    @classmethod
+    def is_partitioned(cls):
+        if connection.vendor != "postgresql":
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT EXISTS(SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+                "WHERE c.relname = %s)",
+                [cls.table],
+            )
+            return cursor.fetchone()[0]
+
+    @classmethod
+    def partitions(cls):
+        """已有的月分区，返回 [(分区名, 月份开始时间)]，按月份排序"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = %s",
+                [cls.table],
+            )
+            names = [i[0] for i in cursor.fetchall()]
+
+        result = []
+        for name in names:
+            matched = re.fullmatch(rf"{cls.table}_p(\d{{4}})(\d{{2}})", name)
+            if matched:
+                month = cls.month_start().replace(year=int(matched.group(1)), month=int(matched.group(2)))
+                result.append((name, month))
+        return sorted(result, key=lambda i: i[1])
+
+    @classmethod
+    def create_partition(cls, month):
+        """创建月分区，默认分区中已有该月份的数据时先移入新分区再挂载"""
+        name, end = cls.partition_name(month), cls.add_months(month, 1)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {name} (LIKE {cls.table} INCLUDING DEFAULTS)")
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {cls.default_partition} WHERE created_at >= %s AND created_at < %s "
+                f"RETURNING *) INSERT INTO {name} SELECT * FROM moved",
+                [month, end],
+            )
+            cursor.execute(
+                f"ALTER TABLE {cls.table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", [month, end]
+            )
+        return name
+
+    @classmethod
+    def ensure_partitions(cls, months_ahead: int):
+        """确保当前月及之后months_ahead个月的分区存在"""
+        exist_names = {i[0] for i in cls.partitions()}
+        current = cls.month_start()
+        created = []
+        for i in range(months_ahead + 1):
+            month = cls.add_months(current, i)
+            if cls.partition_name(month) not in exist_names:
+                created.append(cls.create_partition(month))
+        return created
+
+    @classmethod
+    def archive_partition(cls, name: str, archive_dir: str):
+        """将分区的数据按行导出为gzip压缩的JSONL文件，写完后再重命名，避免留下不完整的归档"""
+        os.makedirs(archive_dir, exist_ok=True)
+        path = os.path.join(archive_dir, f"{name}.jsonl.gz")
+        tmp_path = f"{path}.tmp"
+        # 服务端游标需要在事务中使用
+        with transaction.atomic(), connection.chunked_cursor() as cursor:
+            cursor.execute(f"SELECT row_to_json(t)::text FROM {name} t ORDER BY created_at, id")
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                while True:
+                    rows = cursor.fetchmany(cls.archive_chunk_size)
+                    if not rows:
+                        break
+                    f.writelines(f"{i[0]}\n" for i in rows)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def drop_partition(cls, name: str):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {name}")
+
+    @classmethod
+    def save_checkpoints(cls, month):
+        """为该月结束时仍存在的实例写入检查点，检查点的创建时间为下月初"""
+        checkpoints, count = [], 0
+        for checkpoint in build_checkpoints(month, cls.add_months(month, 1)):
+            checkpoints.append(checkpoint)
+            if len(checkpoints) >= cls.archive_chunk_size:
+                ChangeRecord.objects.bulk_create(checkpoints)
+                count, checkpoints = count + len(checkpoints), []
+        ChangeRecord.objects.bulk_create(checkpoints)
+        return count + len(checkpoints)
+
+    @classmethod
+    def expire(cls, retention_months: int, archive_dir: str = ""):
+        """
+        删除整月都早于保留期的分区，直接删除分区表而非逐行删除
+        archive_dir 非空时先归档，归档失败的分区不删除
+        按月份从早到晚删除，删除前为仍存在的实例写入检查点，之后月份的变化记录与关联仍可还原
+        """
+        cutoff = cls.add_months(cls.month_start(), -retention_months)
+        expired = []
+        for name, month in cls.partitions():
+            if cls.add_months(month, 1) > cutoff:
+                continue
+            if archive_dir:
+                path = cls.archive_partition(name, archive_dir)
+                logger.info(f"change record partition {name} archived to {path}")
+            with transaction.atomic():
+                cls.save_checkpoints(month)
+                cls.drop_partition(name)
+            expired.append(name)
+        return expired
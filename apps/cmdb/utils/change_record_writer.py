@@ -0,0 +1,200 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+
+from apps.cmdb.models.change_record import ChangeRecord
+from config.default import (
+    CHANGE_RECORD_ASYNC,
+    CHANGE_RECORD_FLUSH_INTERVAL,
+    CHANGE_RECORD_FLUSH_SIZE,
+    CHANGE_RECORD_SPILL_DIR,
+)
+
+logger = logging.getLogger("app")
+
+# 段文件状态: 写入中 -> 批量写入数据库中 -> (写入失败)待补写 -> 被某个进程认领补写
+ACTIVE_SUFFIX = ".active"
+FLUSHING_SUFFIX = ".flushing"
+PENDING_SUFFIX = ".pending"
+CLAIMED_SUFFIX = ".claimed"
+
+
+class ChangeRecordWriter:
+    """
+    变更记录异步批量写入(write-behind)
+    记录入队时先追加到本进程的本地段文件，再放入内存缓冲；后台线程在缓冲达到条数阈值或时间间隔到达时
+    将缓冲的记录 bulk_create 写入数据库，成功后删除段文件。
+    写入失败或进程异常退出时段文件保留在磁盘上(.pending)，之后的刷新周期或其他进程会重新写入，
+    保证每条记录至少写入一次(极端情况下可能重复)
+    未开启 CHANGE_RECORD_ASYNC(默认)时直接同步写入；开启后记录在刷新前查询不到，最多延迟一个刷新间隔
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(
+        self,
+        spill_dir: str = CHANGE_RECORD_SPILL_DIR,
+        flush_size: int = CHANGE_RECORD_FLUSH_SIZE,
+        flush_interval: float = CHANGE_RECORD_FLUSH_INTERVAL,
+    ):
+        self.spill_dir = spill_dir
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.event = threading.Event()
+        self.buffer = []
+        self.segment = None
+        self.segment_path = None
+        self.thread = None
+        self.pid = None
+
+    @classmethod
+    def instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+                atexit.register(cls._instance.flush)
+            return cls._instance
+
+    def ensure_started(self):
+        """在当前进程启动后台刷新线程(fork出的子进程需要重新启动)"""
+        if self.pid == os.getpid() and self.thread and self.thread.is_alive():
+            return
+        self.pid = os.getpid()
+        self.buffer, self.segment, self.segment_path = [], None, None
+        os.makedirs(self.spill_dir, exist_ok=True)
+        # 本进程尚未打开段文件，同pid的文件只能是pid被复用前遗留的
+        self.recover(startup=True)
+        self.thread = threading.Thread(target=self.run, name="change-record-writer", daemon=True)
+        self.thread.start()
+
+    def open_segment(self):
+        self.segment_path = os.path.join(self.spill_dir, f"{self.pid}-{time.time_ns()}.jsonl{ACTIVE_SUFFIX}")
+        self.segment = open(self.segment_path, "a", encoding="utf-8")
+
+    def enqueue(self, records: list):
+        """
+        记录入队
+        records: ChangeRecord的字段字典列表
+        """
+        if not records:
+            return
+        if not CHANGE_RECORD_ASYNC:
+            self.write(records)
+            return
+
+        with self.lock:
+            self.ensure_started()
+            if self.segment is None:
+                self.open_segment()
+            self.segment.write("".join(json.dumps(i, cls=DjangoJSONEncoder) + "\n" for i in records))
+            self.segment.flush()
+            self.buffer.extend(records)
+            if len(self.buffer) >= self.flush_size:
+                self.event.set()
+
+    def run(self):
+        while True:
+            self.event.wait(self.flush_interval)
+            self.event.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("change record flush failed")
+
+    def flush(self):
+        """写入缓冲中的记录，并重试之前写入失败的段文件"""
+        with self.flush_lock:
+            with self.lock:
+                records, self.buffer = self.buffer, []
+                segment, segment_path = self.segment, self.segment_path
+                self.segment, self.segment_path = None, None
+
+            if segment is not None:
+                segment.close()
+                # 写入期间使用补写不会读取的后缀，只有写入失败时才转为待补写
+                base_path = segment_path[: -len(ACTIVE_SUFFIX)]
+                flushing_path = base_path + FLUSHING_SUFFIX
+                os.rename(segment_path, flushing_path)
+                try:
+                    self.write(records)
+                except Exception:
+                    os.rename(flushing_path, base_path + PENDING_SUFFIX)
+                    logger.exception(f"change record write failed, spilled to {base_path + PENDING_SUFFIX}")
+                    return
+                os.remove(flushing_path)
+
+            self.replay_pending()
+
+    def write(self, records: list):
+        close_old_connections()
+        ChangeRecord.objects.bulk_create([ChangeRecord(**i) for i in records], batch_size=self.flush_size)
+
+    def replay_pending(self):
+        """
+        重新写入磁盘上待补写的段文件
+        读取前先通过原子重命名认领，重命名失败说明已被其他进程认领，避免多个进程重复写入
+        """
+        for pending_path in sorted(glob.glob(os.path.join(self.spill_dir, f"*{PENDING_SUFFIX}"))):
+            claimed_path = pending_path[: -len(PENDING_SUFFIX)] + f"{CLAIMED_SUFFIX}.{os.getpid()}"
+            try:
+                os.rename(pending_path, claimed_path)
+            except OSError:
+                continue
+            try:
+                with open(claimed_path, encoding="utf-8") as f:
+                    records = [json.loads(line) for line in f if line.strip()]
+                self.write(records)
+                os.remove(claimed_path)
+            except Exception:
+                os.rename(claimed_path, pending_path)
+                logger.exception(f"change record replay failed: {pending_path}")
+                return
+
+    def replay(self):
+        """处理本机磁盘上遗留的变更记录，供周期任务调用，兜底已退出进程未写入的记录"""
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self.recover()
+        self.replay_pending()
+
+    def recover(self, startup: bool = False):
+        """
+        处理遗留文件: 已退出进程的写入中、批量写入中的段文件，以及认领后未完成的文件，均转为待补写
+        startup: 是否为本进程启动时调用
+        """
+        for path in glob.glob(os.path.join(self.spill_dir, "*")):
+            name = os.path.basename(path)
+            if name.endswith(ACTIVE_SUFFIX) or name.endswith(FLUSHING_SUFFIX):
+                pid, target = name.split("-", 1)[0], os.path.splitext(path)[0] + PENDING_SUFFIX
+            elif CLAIMED_SUFFIX + "." in name:
+                pid, target = name.rsplit(".", 1)[-1], path[: path.rindex(CLAIMED_SUFFIX)] + PENDING_SUFFIX
+            else:
+                continue
+            if pid.isdigit() and self.process_alive(int(pid), startup):
+                continue
+            try:
+                os.rename(path, target)
+            except OSError:
+                # 已被其他进程处理
+                continue
+
+    @staticmethod
+    def process_alive(pid: int, startup: bool = False):
+        if pid == os.getpid():
+            return not startup
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
@@ -0,0 +1,22 @@
+import base64
+import json
+
+from apps.core.exceptions.base_app_exception import BaseAppException
+
+
+class Cursor:
+    """分页游标，对 (排序字段值, ID) 做不透明编码"""
+
+    @staticmethod
+    def encode(order_value, _id: int):
+        data = json.dumps({"v": order_value, "id": _id}, separators=(",", ":"), default=str)
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    @staticmethod
+    def decode(cursor: str):
+        """返回 (排序字段值, ID)"""
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            return data["v"], int(data["id"])
+        except Exception:
+            raise BaseAppException("invalid cursor")
@@ -1,6 +1,8 @@
+import tempfile
 from io import BytesIO
 
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import PatternFill
 from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.datavalidation import DataValidation
@@ -12,15 +14,20 @@ class Export:
     def __init__(self, attrs):
         self.attrs = attrs
 
-    def set_row_color(self, sheet, row_num, color):
-        """行添加颜色"""
-        for cell in sheet[row_num]:
-            cell.fill = PatternFill(start_color=color, end_color=color, fill_type="solid")
+    def color_row(self, sheet, values, color):
+        """生成带颜色的行"""
+        fill = PatternFill(start_color=color, end_color=color, fill_type="solid")
+        row = []
+        for value in values:
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.fill = fill
+            row.append(cell)
+        return row
 
     def generate_header(self):
-        """创建Excel文件, 设置属性与样式"""
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
+        """创建Excel文件(只写模式, 行数据写入临时文件而不常驻内存), 设置属性与样式"""
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
         sheet.sheet_format.defaultColWidth = 20
         sheet.sheet_format.defaultRowHeight = 15
         attrs_name, attrs_id, index = [], [], 0
@@ -31,16 +38,14 @@ class Export:
             attrs_id.append(attr_info["attr_id"])
             index += 1
             if attr_info["attr_type"] == ENUM:
-                sheet.add_data_validation(
+                sheet.data_validations.append(
                     self.set_enum_validation_by_sheet_data(workbook, attr_info["attr_name"], attr_info["option"], index)
                 )
 
-        sheet.append(attrs_name)
-        sheet.append(attrs_id)
-        self.set_row_color(sheet, 1, "92D050")
-        self.set_row_color(sheet, 2, "C6EFCE")
+        sheet.append(self.color_row(sheet, attrs_name, "92D050"))
+        sheet.append(self.color_row(sheet, attrs_id, "C6EFCE"))
 
-        return workbook
+        return workbook, sheet
 
     def return_bytesio(self, workbook):
         """返回一个文件流"""
@@ -49,18 +54,25 @@ class Export:
         file_stream.seek(0)
         return file_stream
 
+    def return_tempfile(self, workbook):
+        """返回一个临时文件流, 用于大文件的流式下载"""
+        file_stream = tempfile.TemporaryFile()
+        workbook.save(file_stream)
+        file_stream.seek(0)
+        return file_stream
+
     def set_enum_validation_by_sheet_data(self, workbook, filed_name, option, index):
         """设置枚举值, 通过sheet数据, 单选"""
         value_list = [i["name"] for i in option]
 
         # 将枚举数据放入sheet页
         filed_sheet = workbook.create_sheet(title=filed_name)
-        for r, v in enumerate(value_list, start=1):
-            filed_sheet.cell(row=r, column=1, value=v)
+        for v in value_list:
+            filed_sheet.append([v])
 
         # 创建 DataValidation 对象
         col = get_column_letter(index)
-        last_row = len(filed_sheet["A"])
+        last_row = max(len(value_list), 1)
         dv = DataValidation(type="list", formula1=f"='{filed_sheet.title}'!$A$1:$A{last_row}")
         dv.sqref = f"{col}3:{col}999"
 
@@ -68,12 +80,15 @@ class Export:
 
     def export_template(self):
         """导出模板"""
-        workbook = self.generate_header()
+        workbook, _ = self.generate_header()
         return self.return_bytesio(workbook)
 
     def export_inst_list(self, inst_list):
-        """导出实例列表"""
-        workbook = self.generate_header()
+        """
+        导出实例列表
+        inst_list: 实例的可迭代对象(如按批次读取图数据库的生成器)，逐行写入，内存占用与行数无关
+        """
+        workbook, sheet = self.generate_header()
         # 找出枚举属性
         enum_field_dict = {
             attr_info["attr_id"]: {i["id"]: i["name"] for i in attr_info["option"]}
@@ -89,5 +104,5 @@ class Export:
                     )
                     continue
                 sheet_data.append(inst_info.get(attr["attr_id"]))
-            workbook.active.append(sheet_data)
-        return self.return_bytesio(workbook)
+            sheet.append(sheet_data)
+        return self.return_tempfile(workbook)
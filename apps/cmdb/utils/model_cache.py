@@ -0,0 +1,101 @@
+import copy
+import logging
+import threading
+import time
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from apps.cmdb.constants import MODEL_CACHE_LOCAL_TTL, MODEL_CACHE_TTL
+
+logger = logging.getLogger("app")
+
+
+class ModelMetaCache:
+    """
+    模型元数据缓存(模型详情、解析后的属性、校验属性映射、模型关联)
+    所有缓存键都带有全局版本号，模型、属性、关联发生任何写入时递增版本号，旧版本的缓存随之失效；
+    版本号与数据存放在Django缓存中，多个worker共享；进程内再保留一份当前版本的数据，避免重复反序列化，
+    每次读取都先取共享的版本号校验进程内数据
+    Django缓存不是多进程共享的后端(如未配置redis时的locmem)时，其他worker无法感知版本变更，
+    缓存时间缩短为 MODEL_CACHE_LOCAL_TTL，其他worker的变更最多延迟该时间生效，且不保留进程内数据
+    读取结果均为深拷贝，调用方可以任意修改
+    """
+
+    version_key = "cmdb_model_meta:version"
+    local = {}
+    local_version = None
+    lock = threading.Lock()
+
+    @staticmethod
+    def shared():
+        """缓存后端是否在多个worker间共享"""
+        # cache 为代理对象，需取实际的缓存后端判断类型
+        return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+    @classmethod
+    def check_backend(cls):
+        """启动时检查缓存后端，非共享后端时提示模型元数据的变更在其他worker中会延迟生效"""
+        if not cls.shared():
+            logger.warning(
+                "model meta cache backend is not shared between workers, "
+                f"changes made by other workers take up to {MODEL_CACHE_LOCAL_TTL}s to be visible, "
+                "configure REDIS_CACHE_URL to avoid it"
+            )
+
+    @classmethod
+    def init_version(cls):
+        """
+        初始化版本号
+        版本号被清除后若从固定值重新开始，可能与仍未过期的旧版本缓存重合，因此以当前时间(纳秒)作为初始值
+        """
+        cache.add(cls.version_key, time.time_ns(), None)
+
+    @classmethod
+    def get_version(cls):
+        version = cache.get(cls.version_key)
+        if version is None:
+            cls.init_version()
+            version = cache.get(cls.version_key)
+        return version
+
+    @classmethod
+    def bump_version(cls):
+        """模型元数据发生变更"""
+        try:
+            cache.incr(cls.version_key)
+        except ValueError:
+            # 版本号不存在(缓存被清空)时重新初始化
+            cls.init_version()
+            cache.incr(cls.version_key)
+        with cls.lock:
+            cls.local, cls.local_version = {}, None
+
+    @classmethod
+    def get_or_set(cls, kind: str, key: str, builder):
+        """读取缓存，未命中时调用builder生成并写入"""
+        version = cls.get_version()
+        cache_key = f"cmdb_model_meta:{version}:{kind}:{key}"
+        if not cls.shared():
+            value = cache.get(cache_key)
+            if value is None:
+                value = builder()
+                cache.set(cache_key, value, MODEL_CACHE_LOCAL_TTL)
+            return copy.deepcopy(value)
+
+        with cls.lock:
+            if cls.local_version != version:
+                cls.local, cls.local_version = {}, version
+            if cache_key in cls.local:
+                return copy.deepcopy(cls.local[cache_key])
+
+        value = cache.get(cache_key)
+        if value is None:
+            value = builder()
+            cache.set(cache_key, value, MODEL_CACHE_TTL)
+
+        with cls.lock:
+            if cls.local_version == version:
+                cls.local[cache_key] = value
+        return copy.deepcopy(value)
@@ -1,10 +1,19 @@
-from apps.cmdb.constants import ORGANIZATION
-from apps.cmdb.graph.format_type import FORMAT_TYPE
+from django.core.cache import cache
+
+from apps.cmdb.constants import (
+    BACKFILL_MARKER_CACHE_KEY,
+    BACKFILL_PENDING_CACHE_TTL,
+    ORGANIZATION,
+    ORGANIZATION_MEMBERSHIP_BACKFILL,
+)
+from apps.cmdb.graph.neo4j import Neo4jClient
 from apps.core.utils.user_group import Group
 from apps.core.utils.keycloak_client import KeyCloakClient
 
 
 class PermissionManage:
+    membership_cache_key = f"{BACKFILL_MARKER_CACHE_KEY}:{ORGANIZATION_MEMBERSHIP_BACKFILL}"
+
     def __init__(self, token):
         self.token = token
         self.keycloak_client = KeyCloakClient()
@@ -12,9 +21,26 @@ class PermissionManage:
     def get_group_params(self):
         """获取组织条件，用于列表页查询"""
         group_ids = Group(self.token).get_user_group_and_subgroup_ids()
-        method = FORMAT_TYPE.get("list[]")
-        params = method({"field": ORGANIZATION, "value": group_ids})
-        return params
+        if not self.membership_ready():
+            # 实例与组织节点的关系回填完成前，按实例的组织属性过滤
+            return [{"field": ORGANIZATION, "type": "list[]", "value": group_ids}]
+        # org[] 条件通过实例与组织节点的关系匹配，可以走组织ID的索引
+        return [{"field": ORGANIZATION, "type": "org[]", "value": group_ids}]
+
+    @classmethod
+    def membership_ready(cls):
+        """实例与组织节点的关系是否已回填完成，完成后永久缓存，未完成时短时间缓存"""
+        ready = cache.get(cls.membership_cache_key)
+        if ready is None:
+            with Neo4jClient() as ag:
+                ready = ag.has_backfill_marker(ORGANIZATION_MEMBERSHIP_BACKFILL)
+            cache.set(cls.membership_cache_key, ready, None if ready else BACKFILL_PENDING_CACHE_TTL)
+        return ready
+
+    @classmethod
+    def clear_membership_ready(cls):
+        """回填完成后清除缓存的状态，使组织节点过滤立即生效"""
+        cache.delete(cls.membership_cache_key)
 
     def get_permission_params(self):
         """获取条件，用于列表页查询"""
@@ -24,7 +50,7 @@ class PermissionManage:
 
         # 判断是否为超管, 超管返回空条件
         if "admin" in roles:
-            return ""
+            return []
 
         # 获取用户组织条件
         params = self.get_group_params()
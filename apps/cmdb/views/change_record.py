@@ -3,17 +3,35 @@ from rest_framework.decorators import action
 
 from apps.cmdb.filters.change_record import ChangeRecordFilter
 from apps.cmdb.language.service import SettingLanguage
-from apps.cmdb.models.change_record import OPERATE_TYPE_CHOICES, ChangeRecord
+from apps.cmdb.models.change_record import OPERATE_TYPE_CHOICES, SNAPSHOT_INST, ChangeRecord
 from apps.cmdb.serializers.change_record import ChangeRecordSerializer
+from apps.cmdb.services.change_record import ChangeRecordManage
+from apps.core.exceptions.base_app_exception import BaseAppException
 from apps.core.utils.web_utils import WebUtils
-from config.drf.pagination import CustomPageNumberPagination
+from config.drf.pagination import CursorCountPagination
+
+
+class InstanceStatePagination(CursorCountPagination):
+    """
+    按实例ID游标分页，总是使用游标
+    查询集为按实例ID去重(DISTINCT ON)的快照，已按 inst_id 排序，分页时不再改变排序
+    该时刻已删除的实例不返回，一页的实例数可能少于page_size
+    """
+
+    ordering = ("inst_id",)
+    cursor_only = True
+
+    def order_queryset(self, queryset):
+        return queryset
 
 
 class ChangeRecordViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = ChangeRecord.objects.all().order_by("-created_at")
+    # 检查点仅用于还原，不作为变更记录展示
+    queryset = ChangeRecord.objects.exclude(type=SNAPSHOT_INST).order_by("-created_at", "-id")
     serializer_class = ChangeRecordSerializer
     filterset_class = ChangeRecordFilter
-    pagination_class = CustomPageNumberPagination
+    # 传入cursor参数时按(created_at, id)游标分页，总数默认取估算值
+    pagination_class = CursorCountPagination
 
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
@@ -30,3 +48,22 @@ class ChangeRecordViewSet(viewsets.ReadOnlyModelViewSet):
         for key in result:
             result[key] = lan.get_val("ChangeRecordType", key) or result[key]
         return WebUtils.response_success(result)
+
+    @action(methods=["get"], detail=False, url_path=r"instance_state/(?P<inst_id>\d+)")
+    def instance_state(self, request, inst_id: str):
+        """实例在time时刻的属性与关联"""
+        at = ChangeRecordManage.parse_time(request.GET.get("time"))
+        result = ChangeRecordManage.instance_state(int(inst_id), at)
+        if result is None:
+            raise BaseAppException("实例在该时刻不存在！")
+        return WebUtils.response_success(result)
+
+    @action(methods=["get"], detail=False, url_path=r"model_state/(?P<model_id>.+?)")
+    def model_state(self, request, model_id: str):
+        """模型下实例在time时刻的属性与关联，按实例ID游标分页"""
+        at = ChangeRecordManage.parse_time(request.GET.get("time"))
+        paginator = InstanceStatePagination()
+        snapshots = paginator.paginate_queryset(
+            ChangeRecordManage.model_snapshot_queryset(model_id, at), request, view=self
+        )
+        return paginator.get_paginated_response(ChangeRecordManage.model_instance_states(snapshots, at))
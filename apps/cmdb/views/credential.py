@@ -54,11 +54,30 @@ class CredentialViewSet(viewsets.ViewSet):
                 openapi.IN_QUERY,
                 description="凭据类型",
                 type=openapi.TYPE_STRING,
-            )
+            ),
+            openapi.Parameter(
+                "cursor",
+                openapi.IN_QUERY,
+                description="游标，传入该参数(首页为空)时使用游标分页，忽略page",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "with_count", openapi.IN_QUERY, description="游标分页时是否统计总数", type=openapi.TYPE_BOOLEAN
+            ),
         ],
     )
     def list(self, request):
         credential_type = request.GET.get("credential_type")
+        if "cursor" in request.GET:
+            result = CredentialManage.credential_list_by_cursor(
+                credential_type,
+                request.user.username,
+                int(request.GET.get("page_size", 10)),
+                cursor=request.GET.get("cursor"),
+                order=request.GET.get("order"),
+                with_count=request.GET.get("with_count") in {"true", "True", "1"},
+            )
+            return WebUtils.response_success(result)
         result = CredentialManage.credential_list(
             credential_type,
             request.user.username,
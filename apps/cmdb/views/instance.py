@@ -1,14 +1,41 @@
-from django.http import HttpResponse
+import itertools
+from wsgiref.util import FileWrapper
+
+from django.http import HttpResponse, StreamingHttpResponse
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import viewsets
 from rest_framework.decorators import action
 
+from apps.cmdb.constants import (
+    EXPORT_STREAM_BLOCK_SIZE,
+    FULLTEXT_PAGE_SIZE,
+    TOPO_LAZY_DEPTH,
+    TOPO_MAX_CHILDREN,
+    TOPO_MAX_DEPTH,
+    TOPO_MAX_PAGE_SIZE,
+    TOPO_PAGE_SIZE,
+)
 from apps.cmdb.services.instance import InstanceManage
+from apps.core.exceptions.base_app_exception import BaseAppException
 from apps.core.utils.web_utils import WebUtils
 from config.default import AUTH_TOKEN_HEADER_NAME
 
 
+def query_int(request, name: str, default, max_value: int):
+    """读取正整数查询参数，未传时取默认值，超过上限时取上限，不是正整数时抛出异常"""
+    value = request.GET.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise BaseAppException(f"{name} must be a positive integer")
+    if value < 1:
+        raise BaseAppException(f"{name} must be a positive integer")
+    return min(value, max_value)
+
+
 class InstanceViewSet(viewsets.ViewSet):
     @swagger_auto_schema(
         operation_id="instance_list",
@@ -26,6 +53,10 @@ class InstanceViewSet(viewsets.ViewSet):
                 "order": openapi.Schema(type=openapi.TYPE_STRING, description="排序"),
                 "model_id": openapi.Schema(type=openapi.TYPE_STRING, description="模型ID"),
                 "role": openapi.Schema(type=openapi.TYPE_STRING, description="角色"),
+                "cursor": openapi.Schema(
+                    type=openapi.TYPE_STRING, description="游标，传入该字段(首页为空)时使用游标分页，忽略page"
+                ),
+                "with_count": openapi.Schema(type=openapi.TYPE_BOOLEAN, description="游标分页时是否统计总数"),
             },
             required=["model_id"],
         ),
@@ -33,6 +64,17 @@ class InstanceViewSet(viewsets.ViewSet):
     @action(methods=["post"], detail=False)
     def search(self, request):
         page, page_size = int(request.data.get("page", 1)), int(request.data.get("page_size", 10))
+        if "cursor" in request.data:
+            insts, next_cursor, count = InstanceManage.instance_list_by_cursor(
+                request.META.get(AUTH_TOKEN_HEADER_NAME).split("Bearer ")[-1],
+                request.data["model_id"],
+                request.data.get("query_list", []),
+                page_size,
+                request.data.get("order", ""),
+                cursor=request.data.get("cursor"),
+                with_count=request.data.get("with_count", False),
+            )
+            return WebUtils.response_success(dict(insts=insts, count=count, next_cursor=next_cursor))
         insts, count = InstanceManage.instance_list(
             request.META.get(AUTH_TOKEN_HEADER_NAME).split("Bearer ")[-1],
             request.data["model_id"],
@@ -271,12 +313,14 @@ class InstanceViewSet(viewsets.ViewSet):
     )
     @action(methods=["post"], detail=False, url_path=r"(?P<model_id>.+?)/inst_import")
     def inst_import(self, request, model_id):
-        result = InstanceManage.inst_import(
+        results = InstanceManage.inst_import(
             model_id,
             request.data.get("file").file,
             request.user.username,
         )
-        return WebUtils.response_success(result)
+        # 先处理第一批，使文件格式等错误仍以普通错误响应返回
+        first_result = next(results, [])
+        return WebUtils.response_success_stream(itertools.chain([first_result], results))
 
     @swagger_auto_schema(
         operation_id="inst_export",
@@ -296,9 +340,12 @@ class InstanceViewSet(viewsets.ViewSet):
     )
     @action(methods=["post"], detail=False, url_path=r"(?P<model_id>.+?)/inst_export")
     def inst_export(self, request, model_id):
-        response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        # 导出文件按块流式返回，不整体读入内存
+        response = StreamingHttpResponse(
+            FileWrapper(InstanceManage.inst_export(model_id, request.data), EXPORT_STREAM_BLOCK_SIZE),
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
         response["Content-Disposition"] = f"attachment;filename={f'{model_id}_import_template.xlsx'}"
-        response.write(InstanceManage.inst_export(model_id, request.data).read())
         return response
 
     @swagger_auto_schema(
@@ -309,6 +356,8 @@ class InstanceViewSet(viewsets.ViewSet):
             properties={
                 "search": openapi.Schema(type=openapi.TYPE_STRING, description="检索内容"),
                 "model_id": openapi.Schema(type=openapi.TYPE_STRING, description="模型ID"),
+                "page": openapi.Schema(type=openapi.TYPE_INTEGER, description="第几页"),
+                "page_size": openapi.Schema(type=openapi.TYPE_INTEGER, description="每页条目数"),
             },
             required=["search"],
         ),
@@ -316,7 +365,11 @@ class InstanceViewSet(viewsets.ViewSet):
     @action(methods=["post"], detail=False)
     def fulltext_search(self, request):
         result = InstanceManage.fulltext_search(
-            request.META.get(AUTH_TOKEN_HEADER_NAME).split("Bearer ")[-1], request.data.get("search", "")
+            request.META.get(AUTH_TOKEN_HEADER_NAME).split("Bearer ")[-1],
+            request.data.get("search", ""),
+            model_id=request.data.get("model_id"),
+            page=int(request.data.get("page", 1)),
+            page_size=int(request.data.get("page_size", FULLTEXT_PAGE_SIZE)),
         )
         return WebUtils.response_success(result)
 
@@ -331,15 +384,76 @@ class InstanceViewSet(viewsets.ViewSet):
                 type=openapi.TYPE_STRING,
             ),
             openapi.Parameter("inst_id", openapi.IN_PATH, description="实例ID", type=openapi.TYPE_NUMBER),
+            openapi.Parameter("depth", openapi.IN_QUERY, description="最大层级", type=openapi.TYPE_INTEGER),
+            openapi.Parameter(
+                "max_children", openapi.IN_QUERY, description="每个节点最多子节点数", type=openapi.TYPE_INTEGER
+            ),
         ],
     )
     @action(
         detail=False,
         methods=["get"],
-        url_path=r"topo_search/(?P<model_id>.+?)/(?P<inst_id>.+?)",
+        url_path=r"topo_search/(?P<model_id>.+?)/(?P<inst_id>\d+)",
     )
     def topo_search(self, request, model_id: str, inst_id: int):
-        result = InstanceManage.topo_search(int(inst_id))
+        result = InstanceManage.topo_search(
+            int(inst_id),
+            query_int(request, "depth", TOPO_MAX_DEPTH, TOPO_MAX_DEPTH),
+            query_int(request, "max_children", None, TOPO_MAX_CHILDREN),
+        )
+        return WebUtils.response_success(result)
+
+    @swagger_auto_schema(
+        operation_id="topo_search_lazy",
+        operation_description="增量拓扑查询，返回前N层及每个节点各关联的子节点数量与继续展开的游标",
+        manual_parameters=[
+            openapi.Parameter("model_id", openapi.IN_PATH, description="模型ID", type=openapi.TYPE_STRING),
+            openapi.Parameter("inst_id", openapi.IN_PATH, description="实例ID", type=openapi.TYPE_NUMBER),
+            openapi.Parameter("depth", openapi.IN_QUERY, description="返回的层级", type=openapi.TYPE_INTEGER),
+            openapi.Parameter(
+                "page_size", openapi.IN_QUERY, description="每个节点每种关联返回的子节点数", type=openapi.TYPE_INTEGER
+            ),
+        ],
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path=r"topo_search_lazy/(?P<model_id>.+?)/(?P<inst_id>\d+)",
+    )
+    def topo_search_lazy(self, request, model_id: str, inst_id: int):
+        result = InstanceManage.topo_search_lazy(
+            int(inst_id),
+            query_int(request, "depth", TOPO_LAZY_DEPTH, TOPO_MAX_DEPTH),
+            query_int(request, "page_size", TOPO_PAGE_SIZE, TOPO_MAX_PAGE_SIZE),
+        )
+        return WebUtils.response_success(result)
+
+    @swagger_auto_schema(
+        operation_id="topo_expand",
+        operation_description="展开拓扑节点某种关联的子节点",
+        manual_parameters=[
+            openapi.Parameter("inst_id", openapi.IN_PATH, description="实例ID", type=openapi.TYPE_NUMBER),
+            openapi.Parameter("model_asst_id", openapi.IN_QUERY, description="模型关联ID", type=openapi.TYPE_STRING),
+            openapi.Parameter(
+                "direction", openapi.IN_QUERY, description="src 下游，dst 上游", type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter("page_size", openapi.IN_QUERY, description="每页子节点数", type=openapi.TYPE_INTEGER),
+            openapi.Parameter("cursor", openapi.IN_QUERY, description="继续展开的游标", type=openapi.TYPE_STRING),
+        ],
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path=r"topo_expand/(?P<inst_id>\d+)",
+    )
+    def topo_expand(self, request, inst_id: int):
+        result = InstanceManage.topo_expand(
+            int(inst_id),
+            request.GET.get("model_asst_id", ""),
+            request.GET.get("direction", "src"),
+            query_int(request, "page_size", TOPO_PAGE_SIZE, TOPO_MAX_PAGE_SIZE),
+            request.GET.get("cursor"),
+        )
         return WebUtils.response_success(result)
 
     @swagger_auto_schema(
@@ -31,7 +31,7 @@ class KeycloakAuthBackend(ModelBackend):
         if user_info.get("locale"):
             translation.activate(user_info["locale"])
         roles = user_info["realm_access"]["roles"]
-        groups = client.get_user_groups(user_info["sub"], "admin" in roles)
+        groups = client.get_user_groups(user_info["sub"], "admin" in roles, token)
         return self.set_user_info(groups, roles, user_info)
 
     @staticmethod
@@ -0,0 +1,12 @@
+from celery import shared_task
+
+from apps.core.utils.organization import OrganizationClosure
+
+
+@shared_task
+def refresh_organization_closure():
+    """
+    定期刷新组织层级闭包缓存
+    :return:
+    """
+    OrganizationClosure.refresh()
@@ -0,0 +1,122 @@
+from unittest import TestCase
+
+from Crypto.PublicKey import RSA
+from jose import jwk, jwt
+
+from apps.core.utils.jwt_verifier import JwksCache, JwtVerifier
+
+ISSUER = "https://keycloak.test/realms/weops"
+AUDIENCE = "weops_lite"
+
+
+def generate_key(kid: str):
+    """生成RSA密钥对，返回 (私钥PEM, 公钥JWK)"""
+    private_key = RSA.generate(2048)
+    private_pem = private_key.export_key().decode()
+    public_pem = private_key.publickey().export_key().decode()
+    public_jwk = jwk.construct(public_pem, "RS256").to_dict()
+    public_jwk.update(kid=kid, use="sig", alg="RS256")
+    return private_pem, public_jwk
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class StubFetcher:
+    """模拟Keycloak的JWKS接口，记录拉取次数"""
+
+    def __init__(self, keys: list):
+        self.keys = keys
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {"keys": list(self.keys)}
+
+
+class JwtVerifierTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.private_pem, cls.public_jwk = generate_key("key-1")
+        cls.other_private_pem, cls.other_public_jwk = generate_key("key-2")
+
+    def setUp(self):
+        self.now = 1700000000
+        self.clock = FakeClock(self.now)
+        self.monotonic = FakeClock(1000)
+        self.fetcher = StubFetcher([self.public_jwk])
+        self.jwks = JwksCache(self.fetcher, refresh_interval=3600, min_refresh_interval=10, clock=self.monotonic)
+        self.verifier = JwtVerifier(self.jwks, issuer=ISSUER, audience=AUDIENCE, clock=self.clock)
+
+    def sign(self, private_pem=None, kid="key-1", **claims):
+        payload = {
+            "iss": ISSUER,
+            "aud": AUDIENCE,
+            "sub": "user-id",
+            "preferred_username": "admin",
+            "iat": self.now,
+            "exp": self.now + 300,
+        }
+        payload.update(claims)
+        return jwt.encode(payload, private_pem or self.private_pem, algorithm="RS256", headers={"kid": kid})
+
+    def test_valid_token(self):
+        claims = self.verifier.verify(self.sign())
+        self.assertTrue(claims["active"])
+        self.assertEqual(claims["username"], "admin")
+        self.assertEqual(claims["realm_access"], {"roles": []})
+        self.assertEqual(self.fetcher.calls, 1)
+
+    def test_expired_token(self):
+        token = self.sign()
+        self.clock.now = self.now + 301
+        self.assertEqual(self.verifier.verify(token), {"active": False})
+
+    def test_expired_token_within_leeway(self):
+        verifier = JwtVerifier(self.jwks, issuer=ISSUER, audience=AUDIENCE, leeway=30, clock=self.clock)
+        token = self.sign()
+        self.clock.now = self.now + 320
+        self.assertTrue(verifier.verify(token)["active"])
+
+    def test_wrong_signature(self):
+        # 使用另一把私钥签名，但声明为已知的kid
+        token = self.sign(private_pem=self.other_private_pem)
+        self.assertEqual(self.verifier.verify(token), {"active": False})
+
+    def test_wrong_audience(self):
+        self.assertEqual(self.verifier.verify(self.sign(aud="other_client")), {"active": False})
+
+    def test_wrong_issuer(self):
+        self.assertEqual(self.verifier.verify(self.sign(iss="https://evil.test/realms/weops")), {"active": False})
+
+    def test_unknown_kid_refreshes_once(self):
+        self.assertTrue(self.verifier.verify(self.sign())["active"])
+        self.assertEqual(self.fetcher.calls, 1)
+
+        # 密钥轮换后，未知kid在最小间隔之后触发一次重新拉取
+        self.fetcher.keys = [self.public_jwk, self.other_public_jwk]
+        self.monotonic.now += 10
+        token = self.sign(private_pem=self.other_private_pem, kid="key-2")
+        self.assertTrue(self.verifier.verify(token)["active"])
+        self.assertEqual(self.fetcher.calls, 2)
+
+    def test_unknown_kid_respects_refresh_floor(self):
+        self.assertTrue(self.verifier.verify(self.sign())["active"])
+
+        # 最小间隔内的未知kid不触发拉取
+        self.monotonic.now += 5
+        token = self.sign(private_pem=self.other_private_pem, kid="forged")
+        self.assertEqual(self.verifier.verify(token), {"active": False})
+        self.assertEqual(self.verifier.verify(token), {"active": False})
+        self.assertEqual(self.fetcher.calls, 1)
+
+        # 超过最小间隔后只拉取一次，之后仍在间隔内的请求不再拉取
+        self.monotonic.now += 5
+        self.assertEqual(self.verifier.verify(token), {"active": False})
+        self.assertEqual(self.verifier.verify(token), {"active": False})
+        self.assertEqual(self.fetcher.calls, 2)
@@ -20,17 +20,17 @@ class CeleryUtils:
         """
         if crontab:
             minute, hour, day_of_month, month_of_year, day_of_week = crontab.split()
-            kwargs = dict(
+            schedule_kwargs = dict(
                 minute=minute,
                 hour=hour,
                 day_of_month=day_of_month,
                 month_of_year=month_of_year,
                 day_of_week=day_of_week,
             )
-            schedule, _ = CrontabSchedule.objects.get_or_create(**kwargs, defaults=kwargs)
+            schedule, _ = CrontabSchedule.objects.get_or_create(**schedule_kwargs, defaults=schedule_kwargs)
         elif interval:
-            kwargs = dict(every=interval, period="seconds")
-            schedule, _ = IntervalSchedule.objects.get_or_create(**kwargs, defaults=kwargs)
+            schedule_kwargs = dict(every=interval, period="seconds")
+            schedule, _ = IntervalSchedule.objects.get_or_create(**schedule_kwargs, defaults=schedule_kwargs)
         else:
             raise ValueError("Either crontab or interval must be provided")
 
@@ -40,7 +40,8 @@ class CeleryUtils:
             args=json.dumps(args) if args else "[]",
             kwargs=json.dumps(kwargs) if kwargs else "{}",
             enabled=enabled,
-            schedule=schedule,
+            crontab=schedule if crontab else None,
+            interval=schedule if interval else None,
         )
         PeriodicTask.objects.update_or_create(name=name, defaults=defaults)
 
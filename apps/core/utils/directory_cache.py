@@ -0,0 +1,49 @@
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger("app")
+
+
+class DirectoryCache:
+    """
+    目录数据(用户、组织等)缓存
+    数据超过refresh_after秒后仍直接返回旧数据，同时在后台线程中刷新；超过ttl秒或不存在时同步加载
+    后台刷新通过缓存锁保证同一时间只有一个worker在刷新
+    """
+
+    def __init__(self, key: str, loader, ttl: int, refresh_after: int = None):
+        self.key = key
+        self.loader = loader
+        self.ttl = ttl
+        self.refresh_after = refresh_after if refresh_after is not None else ttl // 2
+
+    def refresh(self):
+        data = self.loader()
+        cache.set(self.key, dict(data=data, refreshed_at=time.time()), self.ttl)
+        return data
+
+    def refresh_in_background(self):
+        lock_key = f"{self.key}:refreshing"
+        if not cache.add(lock_key, 1, self.ttl):
+            return
+
+        def run():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception(f"refresh directory cache {self.key} failed")
+            finally:
+                cache.delete(lock_key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def get(self):
+        value = cache.get(self.key)
+        if value is None:
+            return self.refresh()
+        if time.time() - value["refreshed_at"] >= self.refresh_after:
+            self.refresh_in_background()
+        return value["data"]
@@ -4,10 +4,16 @@ from keycloak import KeycloakAdmin, KeycloakOpenID
 from singleton_decorator import singleton
 
 from apps.core.entities.user_token_entit import UserTokenEntity
+from apps.core.utils.jwt_verifier import JwksCache, JwtVerifier
+from apps.core.utils.token_cache import TokenCache
 from config.default import (
     KEYCLOAK_ADMIN_PASSWORD,
     KEYCLOAK_ADMIN_USERNAME,
     KEYCLOAK_CLIENT_ID,
+    KEYCLOAK_JWKS_REFRESH_INTERVAL,
+    KEYCLOAK_JWT_AUDIENCE,
+    KEYCLOAK_JWT_ISSUER,
+    KEYCLOAK_JWT_VERIFY_OFFLINE,
     KEYCLOAK_REALM,
     KEYCLOAK_URL_API,
 )
@@ -31,6 +37,7 @@ class KeyCloakClient:
         )
         self.client_secret_key, self.client_id = None, None
         self.openid_client = None
+        self.jwt_verifier = None
         self.logger = logging.getLogger(__name__)
 
     def get_openid_client(self):
@@ -43,6 +50,13 @@ class KeyCloakClient:
             )
         return self.openid_client
 
+    def get_jwt_verifier(self):
+        """离线令牌校验器，公钥集从域的certs接口获取并缓存"""
+        if self.jwt_verifier is None:
+            jwks = JwksCache(lambda: self.get_openid_client().certs(), KEYCLOAK_JWKS_REFRESH_INTERVAL)
+            self.jwt_verifier = JwtVerifier(jwks, issuer=KEYCLOAK_JWT_ISSUER, audience=KEYCLOAK_JWT_AUDIENCE)
+        return self.jwt_verifier
+
     def set_client_secret_and_id(self):
         """设置域id与secret"""
         client_secret_key, client_id = None, None
@@ -69,10 +83,25 @@ class KeyCloakClient:
     def get_realm_client(self):
         return self.realm_client
 
-    def token_is_valid(self, token) -> (bool, dict):
-        try:
+    def introspect(self, token: str) -> dict:
+        """
+        token内省，有效的结果按token缓存，同一token在有效期内只请求一次
+        开启离线校验时使用域公钥校验签名，角色等信息直接取自令牌声明
+        """
+        token = TokenCache.normalize(token)
+        if KEYCLOAK_JWT_VERIFY_OFFLINE:
+            return self.get_jwt_verifier().verify(token)
+        token_info = TokenCache.get(token, "introspect")
+        if token_info is None:
             openid_client = self.get_openid_client()
             token_info = openid_client.introspect(token)
+            if token_info.get("active"):
+                TokenCache.set(token, "introspect", token_info, token_info.get("exp"))
+        return token_info
+
+    def token_is_valid(self, token) -> (bool, dict):
+        try:
+            token_info = self.introspect(token)
             if token_info.get("active"):
                 return True, token_info
             else:
@@ -81,13 +110,17 @@ class KeyCloakClient:
             return False, {}
 
     def get_userinfo(self, token: str):
-        openid_client = self.get_openid_client()
-        return openid_client.userinfo(token)
+        token = TokenCache.normalize(token)
+        userinfo = TokenCache.get(token, "userinfo")
+        if userinfo is None:
+            openid_client = self.get_openid_client()
+            userinfo = openid_client.userinfo(token)
+            TokenCache.set(token, "userinfo", userinfo, self.introspect(token).get("exp"))
+        return userinfo
 
     def get_roles(self, token: str) -> list:
         try:
-            openid_client = self.get_openid_client()
-            token_info = openid_client.introspect(token)
+            token_info = self.introspect(token)
             return token_info["realm_access"]["roles"]
         except Exception:
             self.logger.error("获取用户角色失败")
@@ -95,8 +128,7 @@ class KeyCloakClient:
 
     def is_super_admin(self, token: str) -> bool:
         try:
-            openid_client = self.get_openid_client()
-            token_info = openid_client.introspect(token)
+            token_info = self.introspect(token)
             return "admin" in token_info["realm_access"]["roles"]
         except:  # noqa
             return False
@@ -118,10 +150,27 @@ class KeyCloakClient:
             self.logger.error(e)
             return UserTokenEntity(token=None, error_message="用户名密码不匹配", success=False)
 
-    def get_user_groups(self, sub, is_admin):
+    def get_user_groups(self, sub, is_admin, token: str = None):
+        """用户组织，传入token时按token缓存"""
+        cache_kind = f"user_groups:{int(bool(is_admin))}"
+        return_data = TokenCache.get(token, cache_kind)
+        if return_data is not None:
+            return return_data
+
         if is_admin:
             res = self.realm_client.get_groups()
         else:
             res = self.realm_client.get_user_groups(sub)
         return_data = [{"id": i["id"], "name": i["name"]} for i in res]
+        if token:
+            TokenCache.set(token, cache_kind, return_data, self.introspect(token).get("exp"))
         return return_data
+
+    def get_token_user_groups(self, token: str) -> list:
+        """token所属用户直接加入的组织(完整信息，含子组)，按token缓存"""
+        user_groups = TokenCache.get(token, "realm_user_groups")
+        if user_groups is None:
+            userinfo = self.get_userinfo(token)
+            user_groups = self.realm_client.get_user_groups(userinfo["sub"])
+            TokenCache.set(token, "realm_user_groups", user_groups, self.introspect(token).get("exp"))
+        return user_groups
@@ -0,0 +1,67 @@
+from django.core.cache import cache
+
+from apps.core.utils.keycloak_client import KeyCloakClient
+from config.default import ORGANIZATION_CACHE_TTL
+
+
+class OrganizationClosure:
+    """
+    组织层级闭包
+    由Keycloak组织树一次性计算出 组织 -> 所有后代(含自身)、组织 -> 所有祖先 的映射，以及扁平化的组织选项，
+    结果缓存并定期刷新，查询用户组织及其子组织时只需查表
+    """
+
+    cache_key = "organization_closure"
+
+    def __init__(self, descendants: dict, ancestors: dict, options: list):
+        self.descendants = descendants
+        self.ancestors = ancestors
+        self.options = options
+
+    @staticmethod
+    def build(groups: list):
+        """按先序遍历组织树(迭代，不递归)，计算闭包"""
+        descendants, ancestors, options = {}, {}, []
+        stack = [(group, []) for group in reversed(groups)]
+        while stack:
+            group, parent_ids = stack.pop()
+            group_id = group["id"]
+            ancestors[group_id] = parent_ids
+            descendants.setdefault(group_id, []).append(group_id)
+            for parent_id in parent_ids:
+                descendants[parent_id].append(group_id)
+            options.append(dict(id=group_id, name=group["path"], is_default=False, type="str"))
+            child_parent_ids = parent_ids + [group_id]
+            stack.extend((sub_group, child_parent_ids) for sub_group in reversed(group.get("subGroups") or []))
+        return OrganizationClosure(descendants, ancestors, options)
+
+    @classmethod
+    def refresh(cls):
+        """从Keycloak拉取组织树并刷新缓存"""
+        groups = KeyCloakClient().realm_client.get_groups({"search": ""}) or []
+        closure = cls.build(groups)
+        cache.set(
+            cls.cache_key,
+            dict(descendants=closure.descendants, ancestors=closure.ancestors, options=closure.options),
+            ORGANIZATION_CACHE_TTL,
+        )
+        return closure
+
+    @classmethod
+    def get(cls):
+        """读取缓存的闭包，缓存过期时重新计算"""
+        data = cache.get(cls.cache_key)
+        if data is None:
+            return cls.refresh()
+        return OrganizationClosure(**data)
+
+    def get_descendant_ids(self, group_ids: list):
+        """组织及其所有子组织的ID，未知的组织只返回自身"""
+        result = set()
+        for group_id in group_ids:
+            result.update(self.descendants.get(group_id, [group_id]))
+        return list(result)
+
+    def get_ancestor_ids(self, group_id: str):
+        """组织的所有祖先ID，由根到父"""
+        return list(self.ancestors.get(group_id, []))
@@ -0,0 +1,49 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+
+from config.default import KEYCLOAK_TOKEN_CACHE_TTL
+
+
+class TokenCache:
+    """
+    按token缓存内省结果、用户组织等数据
+    键为token的哈希值，不在缓存中保存token原文；过期时间不超过token自身的exp
+    """
+
+    prefix = "keycloak_token"
+
+    @staticmethod
+    def normalize(token: str):
+        return token.split("Bearer ")[-1] if token else token
+
+    @classmethod
+    def cache_key(cls, token: str, kind: str):
+        token_hash = hashlib.sha256(cls.normalize(token).encode()).hexdigest()
+        return f"{cls.prefix}:{kind}:{token_hash}"
+
+    @staticmethod
+    def get_timeout(exp=None):
+        """缓存时间，不超过token的剩余有效期"""
+        timeout = KEYCLOAK_TOKEN_CACHE_TTL
+        if exp:
+            timeout = min(timeout, int(exp - time.time()))
+        return timeout
+
+    @classmethod
+    def get(cls, token: str, kind: str):
+        if not token:
+            return None
+        return cache.get(cls.cache_key(token, kind))
+
+    @classmethod
+    def set(cls, token: str, kind: str, value, exp=None):
+        timeout = cls.get_timeout(exp)
+        if not token or timeout <= 0:
+            return
+        cache.set(cls.cache_key(token, kind), value, timeout)
+
+    @classmethod
+    def delete(cls, token: str, kind: str):
+        cache.delete(cls.cache_key(token, kind))
@@ -0,0 +1,12 @@
+from apps.core.utils.directory_cache import DirectoryCache
+from apps.core.utils.keycloak_client import KeyCloakClient
+from config.default import USER_DIRECTORY_CACHE_TTL
+
+
+def load_user_options():
+    users = KeyCloakClient().realm_client.get_users()
+    return [dict(id=user["username"], name=user["username"], is_default=False, type="str") for user in users]
+
+
+# 用户选项列表(用于用户类型的属性)
+user_option_cache = DirectoryCache("keycloak_user_options", load_user_options, USER_DIRECTORY_CACHE_TTL)
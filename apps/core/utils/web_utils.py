@@ -1,12 +1,45 @@
-from django.http import JsonResponse
+import json
+import logging
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework import status
 
+from apps.core.exceptions.base_app_exception import BaseAppException
+
+logger = logging.getLogger("app")
+
 
 class WebUtils:
     @staticmethod
     def response_success(response_data={}):
         return JsonResponse({"data": response_data, "result": True, "message": ""}, status=status.HTTP_200_OK)
 
+    @staticmethod
+    def response_success_stream(chunks):
+        """
+        流式返回成功结果，响应结构与response_success一致，data为列表
+        chunks: 每次产出一批数据(列表)的可迭代对象
+        产出数据时出错，响应状态码已无法修改，结果以 result 为 false 及错误信息结束，data 为出错前已返回的数据
+        """
+
+        def stream():
+            yield '{"data": ['
+            is_first = True
+            try:
+                for chunk in chunks:
+                    for item in chunk:
+                        yield ("" if is_first else ",") + json.dumps(item, cls=DjangoJSONEncoder)
+                        is_first = False
+            except Exception as e:
+                logger.exception("stream response failed")
+                message = e.message if isinstance(e, BaseAppException) else "系统异常,请联系管理员处理"
+                yield f'], "result": false, "message": {json.dumps(message)}}}'
+                return
+            yield '], "result": true, "message": ""}'
+
+        return StreamingHttpResponse(stream(), content_type="application/json", status=status.HTTP_200_OK)
+
     @staticmethod
     def response_error(response_data={}, error_message="", status_code=status.HTTP_400_BAD_REQUEST):
         return JsonResponse({"data": response_data, "result": False, "message": error_message}, status=status_code)
@@ -55,7 +55,12 @@ INSTALLED_APPS += tuple(f"apps.{app}" for app in app_folders)
 
 ASGI_APPLICATION = "asgi.application"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
-CELERY_IMPORTS = ()
+CELERY_IMPORTS = (
+    "apps.cmdb.tasks.instance_count_task",
+    "apps.cmdb.tasks.change_record_task",
+    "apps.cmdb.tasks.graph_schema_task",
+    "apps.core.tasks.organization_task",
+)
 
 MIDDLEWARE = (
     "django.middleware.security.SecurityMiddleware",
@@ -194,6 +199,19 @@ KEYCLOAK_REALM = os.getenv("KEYCLOAK_REALM")
 KEYCLOAK_CLIENT_ID = os.getenv("KEYCLOAK_CLIENT_ID")
 KEYCLOAK_ADMIN_USERNAME = os.getenv("KEYCLOAK_ADMIN_USERNAME")
 KEYCLOAK_ADMIN_PASSWORD = os.getenv("KEYCLOAK_ADMIN_PASSWORD")
+# token内省结果等的最长缓存时间(秒)，实际不超过token的有效期
+KEYCLOAK_TOKEN_CACHE_TTL = int(os.getenv("KEYCLOAK_TOKEN_CACHE_TTL", 300))
+# 是否使用域公钥离线校验访问令牌，开启后不再请求内省接口
+KEYCLOAK_JWT_VERIFY_OFFLINE = os.getenv("KEYCLOAK_JWT_VERIFY_OFFLINE", "False").lower() == "true"
+# 域公钥的定时刷新间隔(秒)
+KEYCLOAK_JWKS_REFRESH_INTERVAL = int(os.getenv("KEYCLOAK_JWKS_REFRESH_INTERVAL", 3600))
+# 离线校验时的签发者与受众，为空时不校验
+KEYCLOAK_JWT_ISSUER = os.getenv("KEYCLOAK_JWT_ISSUER") or None
+KEYCLOAK_JWT_AUDIENCE = os.getenv("KEYCLOAK_JWT_AUDIENCE") or None
+# 组织层级闭包的缓存时间(秒)，由定时任务提前刷新
+ORGANIZATION_CACHE_TTL = int(os.getenv("ORGANIZATION_CACHE_TTL", 600))
+# 用户目录的缓存时间(秒)，超过一半时间后在后台刷新
+USER_DIRECTORY_CACHE_TTL = int(os.getenv("USER_DIRECTORY_CACHE_TTL", 600))
 # 日志配置
 if DEBUG:
     log_dir = os.path.join(os.path.dirname(BASE_DIR), "logs", APP_CODE)
@@ -204,6 +222,22 @@ else:
 if not os.path.exists(log_dir):
     os.makedirs(log_dir)
 
+# 变更记录异步写入配置: 缓冲条数或间隔(秒)达到阈值时批量写入，写入前先追加到本地磁盘，保证至少写入一次
+# 默认同步写入；开启异步后变更记录最多延迟 CHANGE_RECORD_FLUSH_INTERVAL 秒才能查询到，
+# 写入失败后补写时极端情况下可能产生重复记录
+CHANGE_RECORD_ASYNC = os.getenv("CHANGE_RECORD_ASYNC", "False").lower() == "true"
+CHANGE_RECORD_FLUSH_SIZE = int(os.getenv("CHANGE_RECORD_FLUSH_SIZE", 500))
+CHANGE_RECORD_FLUSH_INTERVAL = float(os.getenv("CHANGE_RECORD_FLUSH_INTERVAL", 2))
+if DEBUG:
+    spool_dir = os.path.join(os.path.dirname(BASE_DIR), "spool", APP_CODE)
+else:
+    spool_dir = os.path.join(os.getenv("SPOOL_DIR", "/data/apps/spool/"), APP_CODE)
+CHANGE_RECORD_SPILL_DIR = os.getenv("CHANGE_RECORD_SPILL_DIR") or os.path.join(spool_dir, "change_records")
+# 变更记录按月分区保留的月数(0为不清理)，过期分区整体归档为压缩的JSONL文件后删除
+CHANGE_RECORD_RETENTION_MONTHS = int(os.getenv("CHANGE_RECORD_RETENTION_MONTHS", 12))
+CHANGE_RECORD_ARCHIVE = os.getenv("CHANGE_RECORD_ARCHIVE", "True").lower() == "true"
+CHANGE_RECORD_ARCHIVE_DIR = os.getenv("CHANGE_RECORD_ARCHIVE_DIR") or os.path.join(spool_dir, "change_record_archive")
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
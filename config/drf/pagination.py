@@ -10,6 +10,12 @@ REST_FRAMEWORK = {
 
 """
 
+import base64
+import json
+
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
@@ -33,3 +39,84 @@ class CustomPageNumberPagination(PageNumberPagination):
                 ]
             )
         )
+
+
+class CursorCountPagination(CustomPageNumberPagination):
+    """
+    游标分页，请求参数包含 cursor(首页传空)时按 ordering 做键集分页，不使用OFFSET，否则按页码分页
+    总数默认取数据库执行计划的估算行数，with_count=true 时精确统计，返回结构仍为 {count, items}，另附 next_cursor
+    """
+
+    cursor_query_param = "cursor"
+    count_query_param = "with_count"
+    # 排序字段，最后一个字段需唯一
+    ordering = ("-created_at", "-id")
+    # 为True时不传cursor参数也按游标分页
+    cursor_only = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_only or self.cursor_query_param in request.GET
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        if request.GET.get(self.count_query_param, "").lower() == "true":
+            self.count = queryset.count()
+        else:
+            self.count = self.estimate_count(queryset)
+
+        queryset = self.order_queryset(queryset)
+        cursor = request.GET.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.cursor_filter(self.decode_cursor(cursor)))
+
+        # 多取一条判断是否还有下一页
+        items = list(queryset[: page_size + 1])
+        self.next_cursor = self.encode_cursor(items[page_size - 1]) if len(items) > page_size else None
+        return items[:page_size]
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(dict(count=self.count, items=data, next_cursor=self.next_cursor))
+
+    def order_queryset(self, queryset):
+        return queryset.order_by(*self.ordering)
+
+    @staticmethod
+    def estimate_count(queryset):
+        """PostgreSQL执行计划的估算行数，不扫描数据"""
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return queryset.count()
+        sql, params = queryset.order_by().query.get_compiler(using=queryset.db).as_sql()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def cursor_filter(self, values):
+        """按排序字段构造 (a, b) < (va, vb) 形式的键集条件"""
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            lookup = "lt" if field.startswith("-") else "gt"
+            prefix = {f.lstrip("-"): values[i] for i, f in enumerate(self.ordering[:index])}
+            condition |= Q(**prefix, **{f"{field.lstrip('-')}__{lookup}": values[index]})
+        return condition
+
+    def encode_cursor(self, obj):
+        # 时间字段使用str保留微秒精度
+        values = [getattr(obj, i.lstrip("-")) for i in self.ordering]
+        data = json.dumps(values, separators=(",", ":"), default=str)
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        except Exception:
+            raise NotFound("Invalid cursor")
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound("Invalid cursor")
+        return values